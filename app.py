@@ -1,17 +1,22 @@
-from flask import Flask, render_template, request, jsonify, url_for, redirect, flash
+from flask import Flask, render_template, request, jsonify, url_for, redirect, flash, Response, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user, AnonymousUserMixin
 from datetime import datetime
-try:
-    from zoneinfo import ZoneInfo  # Python 3.9+
-except Exception:
-    ZoneInfo = None
-from utils.twse import get_stock_basic_info, get_market_summary, get_stock_name, get_stock_chart_data
+from utils.twse import get_stock_basic_info, get_stock_basic_info_many, get_market_summary, get_stock_name, get_stock_chart_data, is_known_missing
 from utils.news import get_yahoo_stock_top_news
+from utils.trading_calendar import is_market_open, now_taipei
+from utils.symbols import lookup_code
+from utils.cache_gc import start_cache_gc
+from utils.screener_table import start_screener_table_job
+from utils.refresher import start_refresher
+from utils.leader import run_as_leader
+from sqlalchemy import func
 
 
 from database import db, User, Watchlist, SearchHistory, PriceAlert
 from forms import LoginForm, RegisterForm, ProfileForm, ChangePasswordForm, WatchlistForm, PriceAlertForm
 import os
+import threading
+import json
 import secrets
 
 # 載入環境變數
@@ -24,6 +29,8 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY') or secrets.token_hex(16)
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL') or 'sqlite:///stock_app.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# 管理員帳號（逗號分隔的使用者名稱），可使用快取統計等管理 API
+app.config['ADMIN_USERNAMES'] = {name.strip() for name in os.environ.get('ADMIN_USERNAMES', '').split(',') if name.strip()}
 
 # 初始化擴展
 db.init_app(app)
@@ -33,21 +40,75 @@ login_manager.login_view = 'login'
 login_manager.login_message = '請先登入以訪問此頁面'
 login_manager.login_message_category = 'info'
 
+# 首頁與 /api/popular 顯示的熱門股票（啟動暖機與背景更新也會預先取得）
+HOME_POPULAR_CODES = ['2330', '0050', '0056', '006208', '2317', '2454', '2412', '00878']
+API_POPULAR_CODES = ['2330', '0050', '0056', '2317', '2454', '2882', '2412', '00878']
+
 @login_manager.user_loader
 def load_user(user_id):
     return db.session.get(User, int(user_id))
 
+
+def collect_hot_set():
+    """盤中背景更新的熱門股票：熱門股、有啟用到價提醒的股票、所有自選股"""
+    hot_set = {'popular': HOME_POPULAR_CODES + API_POPULAR_CODES, 'alerts': [], 'watchlist': []}
+    with app.app_context():
+        hot_set['alerts'] = [row.stock_code for row in
+                             db.session.query(PriceAlert.stock_code)
+                             .filter(PriceAlert.is_active.is_(True), PriceAlert.is_triggered.is_(False))
+                             .distinct()]
+        hot_set['watchlist'] = [row.stock_code for row in
+                                db.session.query(Watchlist.stock_code)
+                                .group_by(Watchlist.stock_code)
+                                .order_by(func.count(Watchlist.id).desc())]
+    return hot_set
+
+
+# 背景工作只在實際服務請求的行程啟動（debug 模式的 reloader 監看行程不處理請求，不會啟動）
+_background_lock = threading.Lock()
+_background_started = False
+
+
+def _start_leader_jobs():
+    """主導行程的背景工作：快取空間回收與統計快照、盤中熱門資料背景更新、全市場選股指標表排程"""
+    start_cache_gc()
+    start_refresher(collect_hot_set)
+    from utils.stock_screener import StockScreener
+    start_screener_table_job(StockScreener().build_screening_table)
+
+
+def start_background_jobs():
+    """
+    啟動服務行程的背景工作（重複呼叫不會重複啟動）：快取空間回收與統計快照、
+    盤中熱門資料到期前背景更新、全市場選股指標表排程（盤中定期、收盤定稿後與股票代碼主檔更新時重新計算）
+    不論以 start.py、python app.py、flask run 或 WSGI 伺服器啟動，都在第一個請求時啟動；
+    多個服務行程（例如 gunicorn 多個 worker）時只由取得 cache/ 檔案鎖的主導行程執行，
+    其他行程等主導行程結束後接手
+    """
+    global _background_started
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+    run_as_leader(_start_leader_jobs)
+
+
+@app.before_request
+def ensure_background_jobs():
+    start_background_jobs()
+
 @app.route('/')
 def home():
     """首頁 - 股票搜尋和大盤資訊"""
     try:
         # 獲取大盤摘要
         market_info = get_market_summary()
-        # 過濾不顯示項目：指數名稱、無效成交量
+        market_stale = bool((market_info or {}).get('_stale'))
+        # 過濾不顯示項目：指數名稱、無效成交量、內部標記
         try:
             filtered_market_info = {}
             for k, v in (market_info or {}).items():
-                if k == '指數名稱':
+                if k == '指數名稱' or k.startswith('_'):
                     continue
                 if k == '成交量' and (v in [None, '', 'N/A', '-', '0', 0]):
                     continue
@@ -57,12 +118,19 @@ def home():
             pass
         
         # 熱門股票列表 - 使用真實API數據
-        popular_codes = ['2330', '0050', '0056', '006208', '2317', '2454', '2412', '00878']
+        popular_codes = HOME_POPULAR_CODES
         popular_stocks = []
         
+        # 單次批次請求取得所有熱門股票（快取命中者不再請求）
+        try:
+            popular_quotes = get_stock_basic_info_many(popular_codes)
+        except Exception as batch_error:
+            print(f"批次獲取熱門股票失敗: {batch_error}")
+            popular_quotes = {}
+        
         for code in popular_codes:
             try:
-                stock_info = get_stock_basic_info(code)
+                stock_info = popular_quotes.get(code)
                 if stock_info and not stock_info.get('錯誤'):
                     popular_stocks.append({
                         'code': code,
@@ -70,7 +138,8 @@ def home():
                         'price': stock_info.get('收盤價', stock_info.get('即時股價', 'N/A')),
                         'change': stock_info.get('漲跌價差', 'N/A'),
                         'change_percent': stock_info.get('漲跌幅', 'N/A'),
-                        'volume': stock_info.get('成交量', 'N/A')
+                        'volume': stock_info.get('成交量', 'N/A'),
+                        'stale': bool(stock_info.get('_stale'))
                     })
                 else:
                     # 如果API失敗，使用基本信息
@@ -100,18 +169,16 @@ def home():
         except Exception as _:
             market_news = []
 
-        # 台北時區時間與市場開盤狀態（週一至週五 09:00-13:30）
-        now_tpe = datetime.now(ZoneInfo('Asia/Taipei')) if ZoneInfo else datetime.now()
+        # 台北時區時間與市場開盤狀態（交易日 09:00-13:30，排除休市日）
+        now_tpe = now_taipei()
         try:
-            is_weekday = now_tpe.weekday() < 5
-            open_time = now_tpe.replace(hour=9, minute=0, second=0, microsecond=0)
-            close_time = now_tpe.replace(hour=13, minute=30, second=0, microsecond=0)
-            market_open = is_weekday and open_time <= now_tpe <= close_time
+            market_open = is_market_open(now_tpe)
         except Exception:
             market_open = False
 
         return render_template('home.html', 
                              market_info=market_info,
+                             market_stale=market_stale,
                              popular_stocks=popular_stocks,
                              market_news=market_news,
                              market_open=market_open,
@@ -124,7 +191,7 @@ def home():
                              popular_stocks=[],
                              market_news=[],
                              market_open=False,
-                             current_time=datetime.now(ZoneInfo('Asia/Taipei')) if ZoneInfo else datetime.now())
+                             current_time=now_taipei())
 
 
 @app.route('/stock')
@@ -160,6 +227,10 @@ def stock_page():
         if stock_code in name_to_code:
             stock_code = name_to_code[stock_code]
             print(f"✅ 中文名稱轉換: {stock_code}")
+        elif lookup_code(stock_code):
+            # 股票代碼主檔反查
+            stock_code = lookup_code(stock_code)
+            print(f"✅ 中文名稱轉換: {stock_code}")
     
     # 檢查是否為英文名稱，如果是則進行轉換
     elif not re.match(r'^[0-9]+$', stock_code):
@@ -173,6 +244,16 @@ def stock_page():
         if stock_code in english_to_code:
             stock_code = english_to_code[stock_code]
             print(f"✅ 英文名稱轉換: {stock_code}")
+        elif lookup_code(stock_code):
+            stock_code = lookup_code(stock_code)
+            print(f"✅ 英文名稱轉換: {stock_code}")
+
+    # 近期查無資料的代碼直接回應，不再查詢資料來源
+    if is_known_missing(stock_code):
+        return render_template('stock.html',
+                             stock_code=stock_code,
+                             stock_info=None,
+                             error=f'查無股票代碼 {stock_code} 的資料')
 
     try:
         # 獲取股票資訊
@@ -490,14 +571,21 @@ def watchlist():
     """自選股列表"""
     watchlist_items = db.session.query(Watchlist).filter_by(user_id=current_user.id).order_by(Watchlist.created_at.desc()).all()
     
-    # 獲取即時股價
+    # 獲取即時股價（批次請求）
+    try:
+        watchlist_quotes = get_stock_basic_info_many([item.stock_code for item in watchlist_items])
+    except Exception as e:
+        print(f"批次獲取自選股股價失敗: {e}")
+        watchlist_quotes = {}
+    
     for item in watchlist_items:
         try:
-            stock_info = get_stock_basic_info(item.stock_code)
+            stock_info = watchlist_quotes.get(item.stock_code)
             if stock_info and not stock_info.get('錯誤'):
                 item.current_price = stock_info.get('即時股價', stock_info.get('收盤價'))
                 item.change = stock_info.get('漲跌價差')
                 item.change_percent = stock_info.get('漲跌幅')
+                item.stale = bool(stock_info.get('_stale'))
         except:
             item.current_price = 'N/A'
             item.change = 'N/A'
@@ -521,6 +609,11 @@ def add_to_watchlist():
         flash('請輸入股票代號', 'warning')
         return redirect(url_for('watchlist'))
     
+    # 近期查無資料的代碼直接拒絕
+    if is_known_missing(stock_code):
+        flash('無法找到此股票代號', 'danger')
+        return redirect(url_for('watchlist'))
+    
     # 檢查會員限制
     features = current_user.get_membership_features()
     if features.get('watchlist_limit'):
@@ -581,6 +674,13 @@ def remove_from_watchlist(item_id):
 @app.route('/api/stock/<stock_code>')
 def api_stock(stock_code):
     """API: 獲取個股資訊"""
+    if is_known_missing(stock_code):
+        return jsonify({
+            'success': False,
+            'error': f'查無股票代碼 {stock_code} 的資料',
+            'timestamp': datetime.now().isoformat()
+        }), 404
+    
     try:
         stock_info = get_stock_basic_info(stock_code)
         
@@ -588,6 +688,7 @@ def api_stock(stock_code):
             return jsonify({
                 'success': True,
                 'data': stock_info,
+                'stale': bool(stock_info.get('_stale')),
                 'timestamp': datetime.now().isoformat()
             })
         else:
@@ -649,6 +750,7 @@ def api_market():
         return jsonify({
             'success': True,
             'data': market_info,
+            'stale': bool((market_info or {}).get('_stale')),
             'timestamp': datetime.now().isoformat()
         })
         
@@ -664,19 +766,21 @@ def api_market():
 def api_popular():
     """API: 獲取熱門股票清單"""
     try:
-        popular_codes = ['2330', '0050', '0056', '2317', '2454', '2882', '2412', '00878']
+        popular_codes = API_POPULAR_CODES
         popular_stocks = []
+        popular_quotes = get_stock_basic_info_many(popular_codes)
         
         for code in popular_codes:
             try:
-                stock_info = get_stock_basic_info(code)
+                stock_info = popular_quotes.get(code)
                 if stock_info and not stock_info.get('錯誤'):
                     popular_stocks.append({
                         'code': code,
                         'name': stock_info.get('股票名稱', get_stock_name(code)),
                         'price': stock_info.get('收盤價', 'N/A'),
                         'change': stock_info.get('漲跌價差', 'N/A'),
-                        'change_percent': stock_info.get('漲跌幅', 'N/A')
+                        'change_percent': stock_info.get('漲跌幅', 'N/A'),
+                        'stale': bool(stock_info.get('_stale'))
                     })
             except:
                 # 如果個別股票失敗，跳過
@@ -710,6 +814,12 @@ def api_add_to_watchlist():
                 'message': '股票代碼不能為空'
             })
         
+        if is_known_missing(stock_code):
+            return jsonify({
+                'success': False,
+                'message': '無法找到此股票代號'
+            })
+        
         # 檢查是否已存在
         existing = db.session.query(Watchlist).filter_by(
             user_id=current_user.id,
@@ -751,54 +861,28 @@ def api_add_to_watchlist():
 
 @app.route('/api/screener', methods=['POST'])
 def api_stock_screener():
-    """API: 股票選股 - Windows 兼容版"""
+    """API: 股票選股 - 只篩選排程預先計算的全市場指標表，不向上游發出請求"""
     try:
         from utils.stock_screener import StockScreener
-        import threading
-        import time
+        from utils.screener_table import get_screener_table
         
         data = request.get_json() or {}
         criteria = data.get('criteria', {})
         
         print(f"🔍 收到選股請求，條件: {criteria}")
         
-        # 創建選股器實例
-        screener = StockScreener()
-        
-        # 使用線程實現超時控制（Windows 兼容）
-        results = []
-        exception_occurred = None
-        
-        def run_screening():
-            try:
-                nonlocal results
-                results = screener.screen_stocks(criteria)
-            except Exception as e:
-                nonlocal exception_occurred
-                exception_occurred = e
-        
-        # 啟動篩選線程
-        screening_thread = threading.Thread(target=run_screening)
-        screening_thread.daemon = True
-        screening_thread.start()
-        
-        # 等待結果或超時（60秒）
-        screening_thread.join(timeout=60)
-        
-        if screening_thread.is_alive():
-            print("⏰ 選股處理超時")
+        table = get_screener_table()
+        if not table:
             return jsonify({
                 'success': False,
-                'error': '處理時間過長，請稍後再試或調整篩選條件',
+                'error': '選股資料建立中，請稍後再試',
                 'timestamp': datetime.now().isoformat()
-            }), 408
-        
-        if exception_occurred:
-            raise exception_occurred
+            }), 503
         
-        # 確保結果是有效的
-        if not isinstance(results, list):
-            results = []
+        # 創建選股器實例
+        screener = StockScreener()
+        results = screener.screen_stocks(criteria)
+        total_count = len(results)
         
         # 限制回傳結果數量（避免回應過大）
         max_results = 30
@@ -811,8 +895,11 @@ def api_stock_screener():
             'success': True,
             'results': results,
             'total_count': len(results),
+            'matched_count': total_count,
+            'universe_count': len(table['rows']),
             'criteria': criteria,
             'message': f'成功篩選出 {len(results)} 支股票',
+            'data_time': datetime.fromtimestamp(table['built_at']).isoformat(),
             'timestamp': datetime.now().isoformat()
         })
         
@@ -833,6 +920,69 @@ def api_stock_screener():
         }), 500
 
 
+@app.route('/api/screener/stream')
+def api_stock_screener_stream():
+    """
+    API: 股票選股（Server-Sent Events）- 邊篩選邊推送
+    依序送出 progress（處理進度）、match（符合條件的股票，最多前 N 筆）與 done（依評分排序的前 N 筆摘要）事件，
+    選股指標表尚未建立時 done 事件的 success 為 False
+    篩選條件以查詢參數傳入：min_rsi、max_rsi、min_score、price_trend、volume_filter
+    """
+    from utils.stock_screener import StockScreener
+    
+    criteria = dict(StockScreener.DEFAULT_CRITERIA)
+    for field in ('min_rsi', 'max_rsi', 'min_score'):
+        value = request.args.get(field, type=float)
+        if value is not None:
+            criteria[field] = value
+    criteria['price_trend'] = request.args.get('price_trend', criteria['price_trend'])
+    criteria['volume_filter'] = request.args.get('volume_filter', '').lower() in ('1', 'true', 'on')
+    max_results = 30
+    
+    print(f"🔍 收到串流選股請求，條件: {criteria}")
+    
+    def sse(event, data):
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    
+    def generate():
+        try:
+            streamed = 0
+            for event, data in StockScreener().iter_screening(criteria):
+                if event == 'match':
+                    # 逐筆推送的結果只送前 max_results 筆（寬鬆條件可能符合數千支），其餘只計入進度
+                    if streamed < max_results:
+                        streamed += 1
+                        yield sse(event, data)
+                elif event == 'done':
+                    if not data['built_at']:
+                        yield sse('done', {
+                            'success': False,
+                            'error': '選股資料建立中，請稍後再試',
+                            'timestamp': datetime.now().isoformat()
+                        })
+                        return
+                    results = data['results'][:max_results]
+                    yield sse('done', {
+                        'success': True,
+                        'results': results,
+                        'total_count': len(results),
+                        'matched_count': data['matched'],
+                        'universe_count': data['total'],
+                        'criteria': criteria,
+                        'message': f'成功篩選出 {data["matched"]} 支股票',
+                        'data_time': datetime.fromtimestamp(data['built_at']).isoformat(),
+                        'timestamp': datetime.now().isoformat()
+                    })
+                else:
+                    yield sse(event, data)
+        except Exception as e:
+            print(f"串流選股錯誤: {e}")
+            yield sse('error', {'success': False, 'error': f'選股處理失敗: {str(e)}'})
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/api/screener/strategies')
 def api_screener_strategies():
     """API: 獲取預設選股策略"""
@@ -858,6 +1008,36 @@ def api_screener_strategies():
 
 
 
+@app.route('/api/admin/cache/stats')
+@login_required
+def api_admin_cache_stats():
+    """API: 快取統計（僅限管理員）"""
+    if current_user.username not in app.config['ADMIN_USERNAMES']:
+        return jsonify({
+            'success': False,
+            'error': '權限不足',
+            'timestamp': datetime.now().isoformat()
+        }), 403
+    
+    try:
+        from utils.cache_stats import collect_cache_report
+        
+        top = request.args.get('top', 10, type=int)
+        return jsonify({
+            'success': True,
+            'stats': collect_cache_report(top_keys=max(0, min(top, 100))),
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        print(f"快取統計錯誤: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+
 # === 錯誤處理 ===
 
 @app.errorhandler(404)
@@ -16,6 +16,9 @@ from pathlib import Path
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
+# 移除本腳本所在的 database/ 目錄，避免 database/utils 蓋過專案的 utils 模組
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path = [path for path in sys.path if os.path.abspath(path or '.') != script_dir]
 
 # 設置工作目錄為專案根目錄
 os.chdir(parent_dir)
@@ -253,8 +256,47 @@ def show_stats():
         print(f"❌ 統計資訊獲取失敗: {e}")
         return False
 
+def show_cache_stats():
+    """顯示快取統計（讀取服務行程寫出的快照，沒有快照時只顯示快取資料庫內容）"""
+    print("📦 快取統計資訊...")
+    
+    try:
+        from utils.cache_stats import load_stats_snapshot, collect_cache_report, format_cache_report
+        
+        report = load_stats_snapshot()
+        if report is None:
+            print("⚠️ 尚無服務行程的統計快照，命中計數與最常讀取的 key 無資料")
+            report = collect_cache_report()
+        
+        print("-" * 50)
+        print(format_cache_report(report))
+        print("-" * 50)
+        return True
+        
+    except Exception as e:
+        print(f"❌ 快取統計獲取失敗: {e}")
+        return False
+
+# 命令列子命令：python database/manage.py <子命令>
+COMMANDS = {
+    'init': init_database,
+    'view': view_database,
+    'backup': backup_database,
+    'reset': reset_database,
+    'stats': show_stats,
+    'cache-stats': show_cache_stats,
+}
+
 def main():
     """主函數"""
+    if len(sys.argv) > 1:
+        command = COMMANDS.get(sys.argv[1])
+        if command is None:
+            print(f"❌ 未知的子命令: {sys.argv[1]}（可用: {', '.join(COMMANDS)}）")
+            sys.exit(2)
+        sys.exit(0 if command() else 1)
+    
+
     print("🗄️ 資料庫管理工具")
     print("=" * 50)
     
@@ -265,9 +307,10 @@ def main():
         print("3. 備份資料庫")
         print("4. 重設資料庫")
         print("5. 顯示統計資訊")
+        print("6. 顯示快取統計")
         print("0. 退出")
         
-        choice = input("\n請輸入選項 (0-5): ").strip()
+        choice = input("\n請輸入選項 (0-6): ").strip()
         
         if choice == '0':
             print("👋 再見！")
@@ -282,6 +325,8 @@ def main():
             reset_database()
         elif choice == '5':
             show_stats()
+        elif choice == '6':
+            show_cache_stats()
         else:
             print("❌ 無效選項，請重新輸入")
 
@@ -6,10 +6,36 @@
 
 import os
 import sys
+import threading
 
 # 確保可以導入app模組
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from app import app, db
+from sqlalchemy import func
+from app import app, db, HOME_POPULAR_CODES, API_POPULAR_CODES, start_background_jobs
+from database import Watchlist
+from utils.trading_calendar import holidays_outdated, refresh_holidays
+from utils.symbols import symbols_outdated, refresh_symbols
+from utils.warmup import warm_up_cache
+
+# 暖機時取自選股中關注人數最多的前 N 檔
+WATCHLIST_TOP_N = 50
+
+
+def collect_warmup_codes():
+    """暖機要預先取得的股票：熱門股、自選股關注最多的股票（選股的全市場資料由指標表排程工作取得）"""
+    codes = HOME_POPULAR_CODES + API_POPULAR_CODES
+    try:
+        with app.app_context():
+            rows = (db.session.query(Watchlist.stock_code, func.count(Watchlist.id).label('watchers'))
+                    .group_by(Watchlist.stock_code)
+                    .order_by(func.count(Watchlist.id).desc())
+                    .limit(WATCHLIST_TOP_N)
+                    .all())
+            codes += [row.stock_code for row in rows]
+    except Exception as e:
+        print(f"⚠️ 無法讀取自選股清單: {e}")
+    return codes
+
 
 def main():
     """主啟動函數"""
@@ -31,6 +57,23 @@ def main():
         print(f"❌ 資料庫初始化錯誤: {e}")
         return
     
+    # 休市日與股票代碼主檔過期時在背景批次更新，只在實際服務請求的行程下載一次
+    # （debug 模式的 reloader 監看行程不處理請求；交易日曆決定快取有效期限，名稱查詢只讀本地主檔）
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        if holidays_outdated():
+            threading.Thread(target=refresh_holidays, daemon=True).start()
+        if symbols_outdated():
+            threading.Thread(target=refresh_symbols, daemon=True).start()
+    
+    # 快取暖機（debug 模式的 reloader 子行程不重複執行，快取資料庫由兩者共用）
+    if os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        warm_up_cache(collect_warmup_codes())
+    
+    # 快取空間回收、統計快照、熱門資料背景更新與選股指標表（見 app.start_background_jobs），
+    # 只在實際服務請求的 reloader 子行程啟動（監看行程只有暖機流量，寫出的統計會覆蓋服務行程的快照）
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_jobs()
+    
     # 顯示功能特色
     print("\n📊 功能特色:")
     print("  • 即時股價查詢")
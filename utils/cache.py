@@ -0,0 +1,232 @@
+"""
+統一的分 namespace 快取 API
+各類資料（報價、圖表、分析、大盤、新聞、名稱、負快取）各自一個 namespace，
+有自己的 TTL 與過期資料（stale）策略，並記錄命中、未命中、過期等計數，作為調整 TTL 的依據。
+讀取順序：記憶體層（LRU + TTL）→ SQLite 快取資料庫；寫入時兩者同步寫入（write-through）。
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+
+from utils.cache_store import get_store
+from utils.memory_cache import LRUCache
+from utils.trading_calendar import calendar_expiry
+
+# 各 namespace 的快取策略
+#   ttl: 不依交易日曆時的有效秒數
+#   session_ttl: 依交易日曆時的盤中有效秒數（None 表示不依交易日曆）；非交易時段有效到下一個開盤
+#   stale_window: 到期後仍可先回傳舊資料、同時背景更新的秒數（0 表示不提供過期資料）
+NAMESPACE_POLICIES = {
+    'quotes':   {'ttl': 300, 'session_ttl': 60, 'stale_window': 600},
+    'charts':   {'ttl': 300, 'session_ttl': 300, 'stale_window': 0},
+    'analysis': {'ttl': 300, 'session_ttl': 300, 'stale_window': 3600},  # 過期後比對輸入指紋，未變動則延長
+    'market':   {'ttl': 300, 'session_ttl': 60, 'stale_window': 600},
+    'news':     {'ttl': 300, 'session_ttl': None, 'stale_window': 1800},
+    'names':    {'ttl': 86400, 'session_ttl': None, 'stale_window': 0},  # 主檔中沒有的代碼，由上游報價取得的名稱
+    'missing':  {'ttl': 180, 'session_ttl': None, 'stale_window': 0},  # 查無資料的代碼（負快取）
+}
+
+# 所有 namespace 共用的記憶體層，key 為 (namespace, key)
+_memory = LRUCache()
+
+# 每個 namespace 最多記錄存取次數的 key 數，超過時只保留存取最多的一半
+ACCESS_TRACK_LIMIT = 5000
+
+
+class CacheNamespace:
+    """單一 namespace 的快取操作與計數"""
+
+    def __init__(self, name, ttl, session_ttl=None, stale_window=0):
+        self.name = name
+        self.ttl = ttl
+        self.session_ttl = session_ttl
+        self.stale_window = stale_window
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'expired': 0, 'stale': 0, 'sets': 0}
+        self._access = Counter()  # 各 key 的讀取次數
+
+    def _count(self, counter, amount=1, key=None):
+        with self._lock:
+            self.counters[counter] += amount
+            if key is not None:
+                self._access[key] += 1
+                if len(self._access) > ACCESS_TRACK_LIMIT:
+                    self._access = Counter(dict(self._access.most_common(ACCESS_TRACK_LIMIT // 2)))
+
+    def expiry(self, ttl=None):
+        """計算新寫入項目的到期時間（epoch 秒）"""
+        if ttl is not None:
+            return time.time() + ttl
+        if self.session_ttl is not None:
+            return calendar_expiry(self.session_ttl).timestamp()
+        return time.time() + self.ttl
+
+    def _remember(self, key, expires_at, data):
+        """放入記憶體層，保留到過期資料也不能再使用為止"""
+        _memory.set((self.name, key), (expires_at, data), ttl=expires_at + self.stale_window - time.time())
+
+    def _classify(self, key, record):
+        """依到期時間判斷 (資料, 是否過期) 並計數，超過 stale_window 時回傳 (None, False)"""
+        if record is None:
+            self._count('misses', key=key)
+            return None, False
+        expires_at, data = record
+        overdue = time.time() - expires_at
+        if overdue < 0:
+            self._count('hits', key=key)
+            return data, False
+        if overdue < self.stale_window:
+            self._count('stale', key=key)
+            return data, True
+        self._count('expired', key=key)
+        return None, False
+
+    def get_entry(self, key):
+        """
+        讀取快取（先查記憶體層，未命中才讀取資料庫）
+        :return: (資料, 是否過期)；未過期回傳 (資料, False)，過期但仍在 stale_window 內回傳 (資料, True)，
+                 其餘回傳 (None, False)。回傳的是共用物件，修改前請先複製
+        """
+        record = _memory.get((self.name, key))
+        if record is None:
+            try:
+                row = get_store().get(self.name, key)
+            except Exception as e:
+                print(f"❌ 讀取快取失敗 {self.name}/{key}: {e}")
+                row = None
+            if row is not None:
+                data, expires_at = row
+                record = (expires_at, data)
+                self._remember(key, expires_at, data)
+        return self._classify(key, record)
+
+    def get(self, key):
+        """讀取未過期的快取，否則回傳 None"""
+        data, is_stale = self.get_entry(key)
+        return None if is_stale else data
+
+    def get_many(self, keys):
+        """
+        批次讀取（記憶體層未命中者以一次資料庫查詢取得）
+        :return: {key: (資料, 是否過期)}，只包含可使用的項目
+        """
+        records = {}
+        pending = []
+        for key in keys:
+            record = _memory.get((self.name, key))
+            if record is None:
+                pending.append(key)
+            else:
+                records[key] = record
+
+        if pending:
+            try:
+                for key, (data, expires_at) in get_store().get_many(self.name, pending).items():
+                    records[key] = (expires_at, data)
+                    self._remember(key, expires_at, data)
+            except Exception as e:
+                print(f"❌ 批次讀取快取失敗 {self.name}: {e}")
+
+        entries = {}
+        for key in keys:
+            data, is_stale = self._classify(key, records.get(key))
+            if data is not None:
+                entries[key] = (data, is_stale)
+        return entries
+
+    def expiry_many(self, keys):
+        """
+        各 key 目前的到期時間（不計入命中統計，供背景更新判斷是否即將到期）
+        :return: {key: 到期時間 epoch 秒}，不存在的 key 不會出現在結果中
+        """
+        expiries = {}
+        pending = []
+        for key in keys:
+            record = _memory.peek((self.name, key))
+            if record is None:
+                pending.append(key)
+            else:
+                expiries[key] = record[0]
+        if pending:
+            try:
+                expiries.update(get_store().expiry_many(self.name, pending))
+            except Exception as e:
+                print(f"❌ 讀取快取到期時間失敗 {self.name}: {e}")
+        return expiries
+
+    def set(self, key, data, ttl=None):
+        """
+        寫入快取（同時寫入記憶體層與資料庫）
+        :param ttl: 指定有效秒數，不使用 namespace 的 TTL 策略
+        """
+        expires_at = self.expiry(ttl)
+        self._remember(key, expires_at, data)
+        self._count('sets')
+        try:
+            get_store().set(self.name, key, data, expires_at)
+        except Exception as e:
+            print(f"❌ 儲存快取失敗 {self.name}/{key}: {e}")
+
+    def delete(self, key):
+        _memory.delete((self.name, key))
+        try:
+            get_store().delete(self.name, key)
+        except Exception as e:
+            print(f"❌ 刪除快取失敗 {self.name}/{key}: {e}")
+
+    def stats(self):
+        """命中計數與命中率"""
+        with self._lock:
+            counters = dict(self.counters)
+        lookups = counters['hits'] + counters['misses'] + counters['expired'] + counters['stale']
+        counters['hit_ratio'] = round(counters['hits'] / lookups, 3) if lookups else None
+        return counters
+
+    def top_keys(self, count=10):
+        """讀取次數最多的 key：[(key, 次數)]"""
+        with self._lock:
+            return self._access.most_common(count)
+
+    def reset_stats(self):
+        with self._lock:
+            for counter in self.counters:
+                self.counters[counter] = 0
+            self._access.clear()
+
+
+_namespaces = {name: CacheNamespace(name, **policy) for name, policy in NAMESPACE_POLICIES.items()}
+
+
+def namespace(name):
+    """取得 namespace（未定義的名稱使用預設 TTL 建立）"""
+    ns = _namespaces.get(name)
+    if ns is None:
+        ns = _namespaces.setdefault(name, CacheNamespace(name, ttl=300))
+    return ns
+
+
+def fingerprint(data):
+    """資料內容的指紋（JSON 正規化後的 SHA-1），用於判斷衍生快取的輸入是否變動"""
+    payload = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def get_cache_stats():
+    """所有 namespace 的命中計數"""
+    return {name: ns.stats() for name, ns in list(_namespaces.items())}
+
+
+def get_memory_stats():
+    """記憶體層的容量與命中統計"""
+    return _memory.stats()
+
+
+quotes = namespace('quotes')
+charts = namespace('charts')
+analysis = namespace('analysis')
+market = namespace('market')
+news = namespace('news')
+names = namespace('names')
+missing = namespace('missing')
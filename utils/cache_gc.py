@@ -0,0 +1,114 @@
+"""
+快取空間回收（GC）
+定期在背景清理快取資料庫：先刪除已過期（含過期資料寬限期）的項目，
+若仍超過項目數或位元組預算，再依最近存取時間淘汰最舊的項目（LRU），並回報回收量。
+同時清除舊版一個 key 一個 JSON 檔的快取檔案。
+"""
+import glob
+import os
+import threading
+import time
+
+from utils.cache import NAMESPACE_POLICIES
+from utils.cache_store import get_store, CACHE_STORE_CONFIG
+from utils.cache_stats import save_stats_snapshot
+
+# 空間回收設定
+GC_CONFIG = {
+    'max_entries': 20000,            # 項目數上限
+    'max_bytes': 64 * 1024 * 1024,   # 資料大小上限（位元組）
+    'expired_grace': 600,            # 過期後至少保留的秒數（實際取各 namespace stale_window 的最大值）
+    'interval': 600,                 # 背景回收間隔（秒）
+    # 舊版 JSON 快取檔案（改用快取資料庫後不再讀取）
+    'legacy_patterns': ['stock_basic_*.json', 'analysis_*.json', 'notfound_*.json',
+                        'market_summary.json', 'yahoo_stock_news.json'],
+}
+
+_gc_thread = None
+_gc_lock = threading.Lock()
+_last_report = None
+
+
+def _remove_legacy_files():
+    """刪除舊版 JSON 快取檔案，回傳 (檔案數, 位元組數)"""
+    cache_dir = os.path.dirname(CACHE_STORE_CONFIG['path']) or '.'
+    removed = 0
+    reclaimed = 0
+    for pattern in GC_CONFIG['legacy_patterns']:
+        for path in glob.glob(os.path.join(cache_dir, pattern)):
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                removed += 1
+                reclaimed += size
+            except OSError:
+                continue
+    return removed, reclaimed
+
+
+def run_gc(store=None):
+    """
+    執行一次空間回收
+    :return: 回收報告 dict（過期刪除數、LRU 淘汰數、回收位元組數、剩餘項目數與大小）
+    """
+    global _last_report
+    store = store or get_store()
+    started = time.monotonic()
+
+    # 先寫回存取時間，LRU 才能依實際讀取順序淘汰
+    store.flush_access()
+    # 仍可作為過期資料先行回傳的項目不刪除
+    grace = max([GC_CONFIG['expired_grace']] + [policy['stale_window'] for policy in NAMESPACE_POLICIES.values()])
+    expired, expired_bytes = store.purge_expired(time.time() - grace)
+    evicted, evicted_bytes = store.evict_lru(GC_CONFIG['max_entries'], GC_CONFIG['max_bytes'])
+    legacy_files, legacy_bytes = _remove_legacy_files()
+    if expired or evicted:
+        store.compact()
+    entries, size = store.totals()
+
+    report = {
+        'expired': expired,
+        'evicted': evicted,
+        'legacy_files': legacy_files,
+        'reclaimed_bytes': expired_bytes + evicted_bytes + legacy_bytes,
+        'entries': entries,
+        'bytes': size,
+        'elapsed': round(time.monotonic() - started, 3),
+        'finished_at': time.time(),
+    }
+    _last_report = report
+    if expired or evicted or legacy_files:
+        print(f"🧹 快取回收: 過期 {expired} 筆、淘汰 {evicted} 筆、舊檔 {legacy_files} 個，"
+              f"釋放 {report['reclaimed_bytes'] / 1024:.1f} KB（剩餘 {entries} 筆 / {size / 1024:.1f} KB）")
+    return report
+
+
+def _gc_loop(interval):
+    while True:
+        try:
+            run_gc()
+        except Exception as e:
+            print(f"❌ 快取回收失敗: {e}")
+        # 順便寫出統計快照，供其他行程（database/manage.py）讀取
+        try:
+            save_stats_snapshot()
+        except Exception as e:
+            print(f"❌ 快取統計快照寫入失敗: {e}")
+        time.sleep(interval)
+
+
+def start_cache_gc(interval=None):
+    """啟動背景回收執行緒（重複呼叫不會建立多個執行緒）"""
+    global _gc_thread
+    with _gc_lock:
+        if _gc_thread is not None and _gc_thread.is_alive():
+            return _gc_thread
+        _gc_thread = threading.Thread(target=_gc_loop, args=(interval or GC_CONFIG['interval'],),
+                                      name='cache-gc', daemon=True)
+        _gc_thread.start()
+        return _gc_thread
+
+
+def get_last_gc_report():
+    """最近一次回收的報告，尚未執行過時為 None"""
+    return _last_report
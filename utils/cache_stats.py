@@ -0,0 +1,105 @@
+"""
+快取統計報告
+彙整各 namespace 的命中計數、過期資料回傳次數與最常讀取的 key（皆為行程內已有的計數，讀取路徑不增加工作），
+以及快取資料庫中的項目數、大小與存在時間分布，作為調整 TTL 與記憶體預算的依據；
+並附上報價來源的對沖統計（各來源的勝率與平均勝出耗時），作為調整 HEDGE_CONFIG['delays'] 的依據。
+服務行程會定期把報告寫成快照檔，供 database/manage.py 等其他行程讀取。
+"""
+import json
+import os
+import time
+
+from utils.cache import get_cache_stats, get_memory_stats, namespace
+from utils.cache_store import get_store, CACHE_STORE_CONFIG
+from utils.hedge import get_hedge_stats, HEDGE_CONFIG
+
+# 統計報告設定
+STATS_CONFIG = {
+    'snapshot_file': os.path.join('cache', 'cache_stats.json'),
+    'top_keys': 10,
+    # 存在時間分布的區間：(標籤, 上限秒數)，最後一個區間沒有上限
+    'age_buckets': [('<1m', 60), ('<5m', 300), ('<1h', 3600), ('<1d', 86400), ('>=1d', None)],
+}
+
+
+def collect_cache_report(top_keys=None):
+    """
+    產生快取統計報告
+    :return: {'generated_at', 'pid', 'memory': 記憶體層統計, 'namespaces': {namespace: 統計},
+              'hedge': {'delays': 目前的啟動延遲, 'sources': {來源名稱: 對沖統計}}}
+    """
+    top_keys = STATS_CONFIG['top_keys'] if top_keys is None else top_keys
+    try:
+        stored = get_store().namespace_summary(STATS_CONFIG['age_buckets'])
+    except Exception as e:
+        print(f"❌ 讀取快取資料庫統計失敗: {e}")
+        stored = {}
+
+    namespaces = {}
+    for name in sorted(set(get_cache_stats()) | set(stored)):
+        ns = namespace(name)
+        empty = {'entries': 0, 'bytes': 0, 'expired': 0,
+                 'ages': {label: 0 for label, _ in STATS_CONFIG['age_buckets']}}
+        namespaces[name] = dict(
+            stored.get(name, empty),
+            counters=ns.stats(),
+            top_keys=[{'key': key, 'reads': reads} for key, reads in ns.top_keys(top_keys)],
+        )
+
+    return {
+        'generated_at': time.time(),
+        'pid': os.getpid(),
+        'database': CACHE_STORE_CONFIG['path'],
+        'memory': get_memory_stats(),
+        'namespaces': namespaces,
+        'hedge': {'delays': list(HEDGE_CONFIG['delays']), 'sources': get_hedge_stats()},
+    }
+
+
+def save_stats_snapshot(report=None):
+    """將統計報告寫入快照檔（先寫暫存檔再替換）"""
+    report = report or collect_cache_report()
+    path = STATS_CONFIG['snapshot_file']
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return report
+
+
+def load_stats_snapshot():
+    """讀取服務行程最近寫入的統計快照，不存在時回傳 None"""
+    try:
+        with open(STATS_CONFIG['snapshot_file'], 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def format_cache_report(report):
+    """將統計報告整理為文字（命令列顯示用）"""
+    lines = []
+    generated = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(report['generated_at']))
+    memory = report['memory']
+    lines.append(f"🕒 產生時間: {generated}（行程 {report['pid']}）")
+    lines.append(f"🧠 記憶體層: {memory['entries']}/{memory['max_entries']} 筆，命中率 {memory['hit_ratio']}")
+    for name, item in report['namespaces'].items():
+        counters = item['counters']
+        lines.append("-" * 50)
+        lines.append(f"📦 {name}: {item['entries']} 筆 / {item['bytes'] / 1024:.1f} KB（已到期 {item['expired']} 筆）")
+        lines.append("   存在時間: " + '、'.join(f"{label} {count}" for label, count in item['ages'].items()))
+        lines.append(f"   命中 {counters['hits']}、未命中 {counters['misses']}、到期 {counters['expired']}、"
+                     f"過期回傳 {counters['stale']}、寫入 {counters['sets']}，命中率 {counters['hit_ratio']}")
+        if item['top_keys']:
+            lines.append("   最常讀取: " + '、'.join(f"{entry['key']} ({entry['reads']})" for entry in item['top_keys']))
+
+    hedge = report.get('hedge')
+    if hedge and hedge['sources']:
+        lines.append("-" * 50)
+        lines.append(f"🏁 報價對沖（啟動延遲 {hedge['delays']} 秒）")
+        for name, stats in hedge['sources'].items():
+            latency = f"{stats['avg_win_latency']}s" if stats['avg_win_latency'] is not None else "-"
+            lines.append(f"   {name}: 啟動 {stats['launched']}、勝出 {stats['wins']}，"
+                         f"勝率 {stats['win_rate']}，平均勝出耗時 {latency}")
+    return '\n'.join(lines)
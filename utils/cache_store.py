@@ -0,0 +1,269 @@
+"""
+SQLite 共用快取儲存
+以單一 SQLite 資料庫（WAL 模式）取代一個 key 一個 JSON 檔的快取目錄：
+以 (namespace, key) 為主鍵，記錄建立與到期時間；寫入為單一交易（不會讀到寫一半的資料），
+多個行程（gunicorn workers）可同時讀寫，並支援一次讀取多個 key（get_many）。
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# 快取資料庫設定
+CACHE_STORE_CONFIG = {
+    'path': os.path.join('cache', 'cache.db'),
+    'busy_timeout': 5000,  # 等待其他行程釋放寫入鎖的毫秒數
+    'max_variables': 500,  # get_many 每次查詢的 key 數量上限（SQLite 參數數量限制）
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    size INTEGER NOT NULL,
+    accessed_at REAL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_cache_entries_expires ON cache_entries (expires_at);
+"""
+
+
+class CacheStore:
+    """SQLite 快取儲存，每個執行緒各自使用一條連線"""
+
+    def __init__(self, path=None):
+        self.path = path or CACHE_STORE_CONFIG['path']
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        # 讀取命中的存取時間先記在記憶體，由 flush_access 批次寫回（讀取路徑不寫資料庫）
+        self._accessed = {}
+        self._accessed_lock = threading.Lock()
+
+    def _connect(self):
+        """取得目前執行緒的連線（fork 後的子行程會重新連線）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=CACHE_STORE_CONFIG['busy_timeout'] / 1000,
+                               isolation_level=None, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {int(CACHE_STORE_CONFIG['busy_timeout'])}")
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    self._enable_incremental_vacuum(conn)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(_SCHEMA)
+                    columns = {row[1] for row in conn.execute("PRAGMA table_info(cache_entries)")}
+                    if 'accessed_at' not in columns:
+                        conn.execute("ALTER TABLE cache_entries ADD COLUMN accessed_at REAL")
+                    self._initialized = True
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _enable_incremental_vacuum(conn):
+        """
+        使用漸進式 vacuum，回收空間時不必整庫重寫
+        auto_vacuum 必須在資料庫檔案建立前（設定 journal_mode 之前）設定；
+        已存在的資料庫需執行一次 VACUUM 才會套用
+        """
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:  # 2 = INCREMENTAL
+            return
+        existing = conn.execute("PRAGMA page_count").fetchone()[0] > 0
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        if existing:
+            print("🧹 快取資料庫改用漸進式 vacuum（執行一次 VACUUM）")
+            conn.execute("VACUUM")
+
+    def get(self, namespace, key):
+        """
+        讀取單一項目（不論是否到期，由呼叫端判斷）
+        :return: (值, 到期時間 epoch 秒)，不存在時回傳 None
+        """
+        row = self._connect().execute(
+            "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+            (namespace, key)).fetchone()
+        if row is None:
+            return None
+        self._touch(namespace, [key])
+        return json.loads(row[0]), row[1]
+
+    def get_many(self, namespace, keys):
+        """
+        一次讀取多個項目
+        :return: {key: (值, 到期時間 epoch 秒)}，不存在的 key 不會出現在結果中
+        """
+        keys = list(dict.fromkeys(keys))
+        results = {}
+        conn = self._connect()
+        step = CACHE_STORE_CONFIG['max_variables']
+        for i in range(0, len(keys), step):
+            chunk = keys[i:i + step]
+            placeholders = ','.join('?' * len(chunk))
+            rows = conn.execute(
+                f"SELECT key, value, expires_at FROM cache_entries WHERE namespace = ? AND key IN ({placeholders})",
+                [namespace, *chunk]).fetchall()
+            for key, value, expires_at in rows:
+                results[key] = (json.loads(value), expires_at)
+        self._touch(namespace, results)
+        return results
+
+    def expiry_many(self, namespace, keys):
+        """
+        只讀取多個項目的到期時間（不解析值、不記錄存取時間）
+        :return: {key: 到期時間 epoch 秒}
+        """
+        keys = list(dict.fromkeys(keys))
+        results = {}
+        conn = self._connect()
+        step = CACHE_STORE_CONFIG['max_variables']
+        for i in range(0, len(keys), step):
+            chunk = keys[i:i + step]
+            placeholders = ','.join('?' * len(chunk))
+            rows = conn.execute(
+                f"SELECT key, expires_at FROM cache_entries WHERE namespace = ? AND key IN ({placeholders})",
+                [namespace, *chunk]).fetchall()
+            results.update(rows)
+        return results
+
+    def _touch(self, namespace, keys):
+        now = time.time()
+        with self._accessed_lock:
+            for key in keys:
+                self._accessed[(namespace, key)] = now
+
+    def flush_access(self):
+        """將記憶體中的存取時間批次寫回資料庫（供 LRU 淘汰使用）"""
+        with self._accessed_lock:
+            accessed, self._accessed = self._accessed, {}
+        if accessed:
+            self._connect().executemany(
+                "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                [(at, namespace, key) for (namespace, key), at in accessed.items()])
+        return len(accessed)
+
+    def set(self, namespace, key, value, expires_at):
+        """寫入項目（單一陳述式，原子性覆寫）"""
+        payload = json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        self._connect().execute(
+            "INSERT OR REPLACE INTO cache_entries (namespace, key, value, created_at, expires_at, size) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (namespace, key, payload, time.time(), expires_at, len(payload.encode('utf-8'))))
+
+    def delete(self, namespace, key):
+        self._connect().execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def totals(self):
+        """
+        全部項目的數量與位元組數
+        :return: (項目數, 位元組數)
+        """
+        count, size = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries").fetchone()
+        return count, size
+
+    def namespace_summary(self, age_buckets):
+        """
+        各 namespace 的項目數、位元組數、已到期數與存在時間分布
+        :param age_buckets: [(標籤, 存在時間上限秒數或 None)]，由小到大
+        :return: {namespace: {'entries', 'bytes', 'expired', 'ages': {標籤: 項目數}}}
+        """
+        now = time.time()
+        cases = ' '.join(f"WHEN ? - created_at < {float(limit)} THEN {i}"
+                         for i, (_, limit) in enumerate(age_buckets) if limit is not None)
+        bucket_sql = f"CASE {cases} ELSE {len(age_buckets) - 1} END" if cases else "0"
+        params = [now] * sum(1 for _, limit in age_buckets if limit is not None)
+        rows = self._connect().execute(
+            f"SELECT namespace, {bucket_sql} AS bucket, COUNT(*), COALESCE(SUM(size), 0), "
+            f"SUM(CASE WHEN expires_at < ? THEN 1 ELSE 0 END) "
+            f"FROM cache_entries GROUP BY namespace, bucket", params + [now]).fetchall()
+
+        summary = {}
+        for namespace, bucket, count, size, expired in rows:
+            item = summary.setdefault(namespace, {
+                'entries': 0, 'bytes': 0, 'expired': 0, 'ages': {label: 0 for label, _ in age_buckets},
+            })
+            item['entries'] += count
+            item['bytes'] += size
+            item['expired'] += expired
+            item['ages'][age_buckets[bucket][0]] += count
+        return summary
+
+    def evict_lru(self, max_entries, max_bytes):
+        """
+        依最近存取時間（未曾讀取者以寫入時間計）淘汰最舊的項目，直到數量與大小都在上限內
+        :return: (淘汰項目數, 回收位元組數)
+        """
+        count, size = self.totals()
+        if count <= max_entries and size <= max_bytes:
+            return 0, 0
+
+        conn = self._connect()
+        victims = []
+        reclaimed = 0
+        rows = conn.execute(
+            "SELECT namespace, key, size FROM cache_entries ORDER BY COALESCE(accessed_at, created_at) ASC")
+        for namespace, key, entry_size in rows:
+            if count - len(victims) <= max_entries and size - reclaimed <= max_bytes:
+                break
+            victims.append((namespace, key))
+            reclaimed += entry_size
+        rows.close()
+        conn.executemany("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", victims)
+        return len(victims), reclaimed
+
+    def purge_expired(self, before=None):
+        """
+        刪除到期時間早於 before（預設現在）的項目
+        :return: (刪除項目數, 回收位元組數)
+        """
+        before = time.time() if before is None else before
+        conn = self._connect()
+        count, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries WHERE expires_at < ?", (before,)).fetchone()
+        if count:
+            conn.execute("DELETE FROM cache_entries WHERE expires_at < ?", (before,))
+        return count, size
+
+    def compact(self):
+        """歸還已刪除項目佔用的磁碟空間（WAL checkpoint 與漸進式 vacuum）"""
+        conn = self._connect()
+        # incremental_vacuum 需執行到完成才會釋放所有空頁（execute 只執行一步，只釋放一頁）；之後再 checkpoint 寫回主檔
+        conn.executescript("PRAGMA incremental_vacuum;")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        """關閉目前執行緒的連線"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """取得共用的快取儲存"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CacheStore()
+    return _store
@@ -0,0 +1,135 @@
+"""
+對沖請求（hedged requests）- 多重資料來源競速
+先啟動首選資料來源，若在延遲時間內沒有回應（或已失敗）再啟動下一個，
+取整體時限內第一個有效結果，避免單一緩慢來源拖住整個請求。
+各來源的上游請求超時不超過整體時限的剩餘時間，落敗或逾時的來源不會在背景佔住執行緒。
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from utils.http_client import request_deadline
+
+# 對沖設定
+HEDGE_CONFIG = {
+    # 啟動第 2、3、4... 個資料來源前等待的秒數（自前一個來源啟動起算），不足時沿用最後一個值
+    'delays': [0.5, 1.0, 1.5],
+    'deadline': 8,  # 整體時限（秒）
+    'max_workers': 32,  # 背景執行緒上限（來源的請求超時受整體時限限制，逾時後很快結束）
+}
+
+_executor = ThreadPoolExecutor(max_workers=HEDGE_CONFIG['max_workers'], thread_name_prefix='hedge')
+
+# 各資料來源的對沖統計 {來源名稱: {'launched', 'wins', 'win_latency_total'}}
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _launch_delay(index, delays):
+    """第 index 個資料來源（從 0 起算）相對前一個來源的啟動延遲"""
+    if index <= 0 or not delays:
+        return 0
+    return delays[min(index - 1, len(delays) - 1)]
+
+
+def _run_until(func, deadline_at):
+    """在請求時限內執行資料來源（其上游請求的超時不超過時限的剩餘時間）"""
+    with request_deadline(deadline_at):
+        return func()
+
+
+def _record(source_name, launched=0, win_latency=None):
+    with _stats_lock:
+        stats = _stats.setdefault(source_name, {'launched': 0, 'wins': 0, 'win_latency_total': 0.0})
+        stats['launched'] += launched
+        if win_latency is not None:
+            stats['wins'] += 1
+            stats['win_latency_total'] += win_latency
+
+
+def race(data_sources, is_valid, deadline=None, delays=None):
+    """
+    對沖執行多個資料來源，回傳第一個有效結果
+    :param data_sources: [(來源名稱, 無參數函式), ...]，依優先順序排列
+    :param is_valid: 判斷結果是否有效的函式
+    :param deadline: 整體時限（秒），預設 HEDGE_CONFIG['deadline']
+    :param delays: 啟動延遲列表，預設 HEDGE_CONFIG['delays']
+    :return: (來源名稱, 結果, 耗時秒數)；全部失敗或逾時時來源名稱與結果為 None
+    """
+    deadline = HEDGE_CONFIG['deadline'] if deadline is None else deadline
+    delays = HEDGE_CONFIG['delays'] if delays is None else delays
+
+    start = time.monotonic()
+    pending = {}
+    next_index = 0
+    next_launch_at = start
+
+    while True:
+        now = time.monotonic()
+
+        # 啟動已到期的資料來源（沒有進行中的請求時立即啟動下一個）
+        while next_index < len(data_sources) and (now >= next_launch_at or not pending):
+            source_name, func = data_sources[next_index]
+            print(f"📡 對沖啟動 {source_name}（+{now - start:.2f}s）")
+            pending[_executor.submit(_run_until, func, start + deadline)] = source_name
+            _record(source_name, launched=1)
+            next_index += 1
+            next_launch_at = now + _launch_delay(next_index, delays)
+
+        if not pending:
+            break
+
+        remaining = deadline - (now - start)
+        if remaining <= 0:
+            print(f"⏰ 對沖請求逾時（{deadline}s），仍有 {len(pending)} 個來源未回應")
+            break
+
+        timeout = remaining
+        if next_index < len(data_sources):
+            timeout = min(timeout, max(0, next_launch_at - now))
+
+        done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            source_name = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"❌ {source_name} 發生異常: {e}")
+                result = None
+
+            if is_valid(result):
+                elapsed = time.monotonic() - start
+                _record(source_name, win_latency=elapsed)
+                return source_name, result, elapsed
+
+            # 失敗的來源不必等待延遲，立即啟動下一個
+            print(f"❌ {source_name} 未回傳有效資料")
+            next_launch_at = time.monotonic()
+
+    return None, None, time.monotonic() - start
+
+
+def get_hedge_stats():
+    """
+    取得各資料來源的對沖統計，用於調整啟動延遲
+    :return: {來源名稱: {'launched': 啟動次數, 'wins': 勝出次數, 'win_rate': 勝率, 'avg_win_latency': 平均勝出耗時}}
+    """
+    with _stats_lock:
+        snapshot = {name: dict(stats) for name, stats in _stats.items()}
+
+    report = {}
+    for source_name, stats in snapshot.items():
+        wins = stats['wins']
+        report[source_name] = {
+            'launched': stats['launched'],
+            'wins': wins,
+            'win_rate': round(wins / stats['launched'], 3) if stats['launched'] else 0,
+            'avg_win_latency': round(stats['win_latency_total'] / wins, 3) if wins else None,
+        }
+    return report
+
+
+def reset_hedge_stats():
+    """清除對沖統計"""
+    with _stats_lock:
+        _stats.clear()
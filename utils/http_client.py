@@ -0,0 +1,127 @@
+"""
+共用 HTTP 傳輸層 - 每個上游主機一個 keep-alive Session 連線池
+所有資料抓取（證交所、Yahoo Finance、新聞）都應透過此模組發出請求，
+重複使用既有 TCP+TLS 連線，避免每次請求都重新握手。
+"""
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.rate_limit import host_limiter
+
+# 連線池與超時設定
+HTTP_CONFIG = {
+    'pool_connections': 4,    # 每個 Session 快取的連線池數量
+    'pool_maxsize': 16,       # 每個主機保留的 keep-alive 連線上限
+    'pool_block': False,      # 連線池滿時是否等待（False 則建立臨時連線）
+    'connect_timeout': 3.05,  # 建立連線超時（秒）
+    'read_timeout': 20,       # 讀取回應超時（秒）
+}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _create_session():
+    """建立掛載連線池 Adapter 的 Session"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_CONFIG['pool_connections'],
+        pool_maxsize=HTTP_CONFIG['pool_maxsize'],
+        pool_block=HTTP_CONFIG['pool_block'],
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session(host):
+    """取得指定主機的共用 Session（首次呼叫時建立）"""
+    session = _sessions.get(host)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = _create_session()
+            _sessions[host] = session
+        return session
+
+
+def resolve_timeout(timeout=None):
+    """
+    將超時設定轉換為 (連線超時, 讀取超時)
+    :param timeout: None 使用預設值；數字視為讀取超時；tuple 直接使用
+    """
+    if timeout is None:
+        return (HTTP_CONFIG['connect_timeout'], HTTP_CONFIG['read_timeout'])
+    if isinstance(timeout, (tuple, list)):
+        return tuple(timeout)
+    return (min(HTTP_CONFIG['connect_timeout'], timeout), timeout)
+
+
+# 目前執行緒的請求時限（monotonic 時間），由 request_deadline 設定
+_local = threading.local()
+
+
+@contextmanager
+def request_deadline(deadline):
+    """
+    此區塊內由目前執行緒發出的請求，連線與讀取超時都不超過距 deadline（time.monotonic() 時間）的剩餘秒數，
+    已超過時限時不再發出請求（拋出 requests.Timeout）；巢狀使用時取較早的時限
+    """
+    previous = getattr(_local, 'deadline', None)
+    _local.deadline = deadline if previous is None else min(previous, deadline)
+    try:
+        yield
+    finally:
+        _local.deadline = previous
+
+
+def _apply_deadline(timeout):
+    """依目前執行緒的請求時限縮短 (連線超時, 讀取超時)"""
+    deadline = getattr(_local, 'deadline', None)
+    if deadline is None:
+        return timeout
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise requests.Timeout("已超過請求時限，不再發出請求")
+    return tuple(min(value, remaining) for value in timeout)
+
+
+def http_get(url, params=None, headers=None, timeout=None, **kwargs):
+    """透過該主機的共用連線池發出 GET 請求（受該主機的速率限制與目前執行緒的請求時限），用法同 requests.get"""
+    host = urlsplit(url).netloc
+    host_limiter(host).acquire()
+    session = get_session(host)
+    return session.get(url, params=params, headers=headers,
+                       timeout=_apply_deadline(resolve_timeout(timeout)), **kwargs)
+
+
+def configure(**options):
+    """
+    更新連線池設定（pool_connections、pool_maxsize、connect_timeout 等）
+    已建立的 Session 會被關閉，下次請求時以新設定重建
+    """
+    unknown = set(options) - set(HTTP_CONFIG)
+    if unknown:
+        raise ValueError(f"未知的 HTTP 設定: {', '.join(sorted(unknown))}")
+    HTTP_CONFIG.update(options)
+    close_all()
+
+
+def close_all():
+    """關閉所有主機的 Session 並釋放連線"""
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        try:
+            session.close()
+        except Exception:
+            pass
@@ -0,0 +1,270 @@
+"""
+串流（增量）技術指標狀態
+每檔股票保留 EMA、MACD（含真正的 9 期 signal EMA）、Wilder RSI 與移動平均／布林通道的滾動統計，
+新日線收盤時以 O(1) 更新狀態；盤中報價變動只以 peek 試算「若以此價收盤」的指標，不改變狀態、不重算整段歷史。
+計算定義與 utils.indicators 的向量化版本一致。
+"""
+import math
+import threading
+from collections import deque
+
+# 指標參數（與 utils.indicators.INDICATOR_CONFIG 相同）
+STATE_CONFIG = {
+    'rsi_period': 14,
+    'macd_fast': 12,
+    'macd_slow': 26,
+    'macd_signal': 9,
+    'ma_windows': (5, 10, 20, 60),
+    'bb_period': 20,
+    'bb_width': 2,
+    'change_periods': (1, 5, 20),
+}
+
+
+class EMA:
+    """指數移動平均，以第一個值為起點"""
+
+    def __init__(self, period):
+        self.alpha = 2.0 / (period + 1)
+        self.value = None
+
+    def peek(self, price):
+        """若加入 price 後的值（不改變狀態）"""
+        if self.value is None:
+            return price
+        return self.alpha * price + (1 - self.alpha) * self.value
+
+    def update(self, price):
+        self.value = self.peek(price)
+        return self.value
+
+
+class MACD:
+    """MACD 線（快慢 EMA 差）與 signal 線（MACD 線的 EMA）"""
+
+    def __init__(self, fast=None, slow=None, signal=None):
+        self.fast = EMA(fast or STATE_CONFIG['macd_fast'])
+        self.slow = EMA(slow or STATE_CONFIG['macd_slow'])
+        self.signal = EMA(signal or STATE_CONFIG['macd_signal'])
+
+    def peek(self, price):
+        """:return: (MACD, signal, histogram)"""
+        macd = self.fast.peek(price) - self.slow.peek(price)
+        signal = self.signal.peek(macd)
+        return macd, signal, macd - signal
+
+    def update(self, price):
+        macd = self.fast.update(price) - self.slow.update(price)
+        signal = self.signal.update(macd)
+        return macd, signal, macd - signal
+
+
+class WilderRSI:
+    """
+    Wilder RSI：前 period 根漲跌取平均為起點，之後以 (前值 × (period - 1) + 本期) / period 平滑
+    漲跌數未滿 period 時以目前所有漲跌的平均計算
+    """
+
+    def __init__(self, period=None):
+        self.period = period or STATE_CONFIG['rsi_period']
+        self.last_price = None
+        self.seen = 0
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+
+    def _next(self, price):
+        """加入 price 後的 (漲跌數, 平均漲幅, 平均跌幅)"""
+        if self.last_price is None:
+            return 0, 0.0, 0.0
+        delta = price - self.last_price
+        gain, loss = max(delta, 0.0), max(-delta, 0.0)
+        seen = self.seen + 1
+        if seen <= self.period:
+            # 起點累計期間：維持目前所有漲跌的平均
+            return seen, self.avg_gain + (gain - self.avg_gain) / seen, self.avg_loss + (loss - self.avg_loss) / seen
+        return (seen, (self.avg_gain * (self.period - 1) + gain) / self.period,
+                (self.avg_loss * (self.period - 1) + loss) / self.period)
+
+    @staticmethod
+    def _value(seen, avg_gain, avg_loss):
+        if seen < 2:
+            return 50.0
+        if avg_loss == 0:
+            return 100.0 if avg_gain > 0 else 50.0
+        return max(0.0, min(100.0, 100 - 100 / (1 + avg_gain / avg_loss)))
+
+    def peek(self, price):
+        return self._value(*self._next(price))
+
+    def update(self, price):
+        self.seen, self.avg_gain, self.avg_loss = self._next(price)
+        self.last_price = price
+        return self._value(self.seen, self.avg_gain, self.avg_loss)
+
+    @property
+    def value(self):
+        return self._value(self.seen, self.avg_gain, self.avg_loss)
+
+
+class RollingStats:
+    """固定窗口的滾動平均與母體標準差（資料不足窗口時以現有資料計算）"""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def _next(self, price):
+        """加入 price 後的 (數量, 總和, 平方和)"""
+        count, total, total_sq = len(self.values) + 1, self.total + price, self.total_sq + price * price
+        if count > self.window:
+            oldest = self.values[0]
+            count, total, total_sq = count - 1, total - oldest, total_sq - oldest * oldest
+        return count, total, total_sq
+
+    @staticmethod
+    def _stats(count, total, total_sq):
+        if not count:
+            return None, None
+        mean = total / count
+        return mean, math.sqrt(max(total_sq / count - mean * mean, 0.0))
+
+    def peek(self, price):
+        """:return: (平均, 標準差, 數量)"""
+        count, total, total_sq = self._next(price)
+        return (*self._stats(count, total, total_sq), count)
+
+    def update(self, price):
+        count, self.total, self.total_sq = self._next(price)
+        self.values.append(price)
+        if len(self.values) > self.window:
+            self.values.popleft()
+        return (*self._stats(count, self.total, self.total_sq), count)
+
+
+class SymbolIndicators:
+    """單一股票的所有指標狀態：add_bar 加入已收盤的日線，snapshot 取得目前指標（可帶入盤中價格試算）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """清除所有已收盤日線（重建狀態前呼叫）"""
+        self.macd = MACD()
+        self.rsi = WilderRSI()
+        self.averages = {window: RollingStats(window) for window in STATE_CONFIG['ma_windows']}
+        self.band = RollingStats(STATE_CONFIG['bb_period'])
+        self.recent = deque(maxlen=max(STATE_CONFIG['change_periods']) + 1)
+        self.bars = 0
+        self.last_timestamp = None
+
+    def add_bar(self, close, timestamp=None):
+        """加入一根已收盤的日線（O(1)）"""
+        self.macd.update(close)
+        self.rsi.update(close)
+        for stats in self.averages.values():
+            stats.update(close)
+        self.band.update(close)
+        self.recent.append(close)
+        self.bars += 1
+        if timestamp is not None:
+            self.last_timestamp = timestamp
+
+    def snapshot(self, price=None):
+        """
+        目前的指標（欄位同 utils.indicators.compute_indicators）
+        :param price: 盤中尚未收盤的價格，以「若以此價收盤」試算，不改變狀態；None 表示只用已收盤的日線
+        """
+        if price is None:
+            if not self.bars:
+                return None
+            closes = list(self.recent)
+            bars = self.bars
+            macd, signal = self.macd.fast.value - self.macd.slow.value, self.macd.signal.value
+            histogram = macd - signal
+            rsi = self.rsi.value
+            averages = {window: self._committed(stats) for window, stats in self.averages.items()}
+            band = self._committed(self.band)
+        else:
+            closes = (list(self.recent) + [price])[-self.recent.maxlen:]
+            bars = self.bars + 1
+            macd, signal, histogram = self.macd.peek(price)
+            rsi = self.rsi.peek(price)
+            averages = {window: stats.peek(price) for window, stats in self.averages.items()}
+            band = self.band.peek(price)
+
+        current = closes[-1]
+        values = {'bars': bars, 'current_price': current}
+        for period in STATE_CONFIG['change_periods']:
+            previous = closes[-1 - period] if bars > period and len(closes) > period else None
+            values[f'price_change_{period}d'] = round((current - previous) / previous * 100, 2) if previous else 0.0
+
+        for window, (mean, _, _) in averages.items():
+            values[f'ma{window}'] = round(mean, 2)
+
+        middle, std, count = band
+        width = STATE_CONFIG['bb_width'] * std if count >= 3 else (max(closes[-2:]) - min(closes[-2:])) * 0.5
+        values['bb_upper'] = round(middle + width, 2)
+        values['bb_middle'] = round(middle, 2)
+        values['bb_lower'] = round(middle - width, 2)
+
+        enough = bars >= 3
+        values['macd'] = round(macd, 3) if enough else 0.0
+        values['signal'] = round(signal, 3) if enough else 0.0
+        values['histogram'] = round(histogram, 3) if enough else 0.0
+        values['rsi'] = round(rsi, 2)
+        return values
+
+    @staticmethod
+    def _committed(stats):
+        count = len(stats.values)
+        return (*RollingStats._stats(count, stats.total, stats.total_sq), count)
+
+
+_states = {}
+_states_lock = threading.Lock()
+
+
+def get_symbol_state(symbol):
+    """取得股票的指標狀態（不存在時建立空的狀態），讀寫狀態時需持有 state.lock"""
+    with _states_lock:
+        state = _states.get(symbol)
+        if state is None:
+            state = _states[symbol] = SymbolIndicators()
+        return state
+
+
+def update_symbol(symbol, points):
+    """
+    以圖表資料點更新股票的指標狀態並回傳目前指標
+    除最後一點外都視為已收盤的日線：只加入比狀態中最後一根更新的日線（O(新日線數)）；
+    最後一點視為目前價格（盤中報價會持續變動），只試算不寫入狀態。
+    資料與狀態接不上（第一次、中間有缺口）時以整段資料重建狀態。
+    :param points: [{'timestamp', 'price'}]，依時間排序
+    :return: 指標 dict，沒有資料點時回傳 None
+    """
+    if not points:
+        return None
+    state = get_symbol_state(symbol)
+    closed, current = points[:-1], points[-1]
+    with state.lock:
+        if state.last_timestamp is None or not closed or closed[0]['timestamp'] > state.last_timestamp:
+            # 無法銜接：以整段資料重建
+            state.reset()
+            for point in closed:
+                state.add_bar(point['price'], point['timestamp'])
+        else:
+            for point in closed:
+                if point['timestamp'] > state.last_timestamp:
+                    state.add_bar(point['price'], point['timestamp'])
+        if current['timestamp'] <= (state.last_timestamp or float('-inf')):
+            return state.snapshot()
+        return state.snapshot(current['price'])
+
+
+def drop_symbol(symbol):
+    """移除股票的指標狀態"""
+    with _states_lock:
+        _states.pop(symbol, None)
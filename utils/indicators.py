@@ -0,0 +1,201 @@
+"""
+向量化技術指標計算（NumPy）
+輸入 (股票數 × 日線數) 的收盤價矩陣，每列的有效資料靠右對齊、左側以 NaN 補齊（歷史較短的股票），
+一次計算所有股票的 RSI、MACD、移動平均線、布林通道與漲跌幅，回傳每檔最新一根日線的指標陣列。
+時間方向的遞迴（EMA、Wilder 平滑）只沿日線數迴圈，每一步同時處理所有股票。
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 指標參數
+INDICATOR_CONFIG = {
+    'rsi_period': 14,
+    'macd_fast': 12,
+    'macd_slow': 26,
+    'macd_signal': 9,
+    'ma_windows': (5, 10, 20, 60),
+    'bb_period': 20,
+    'bb_width': 2,
+    'change_periods': (1, 5, 20),
+}
+
+# 各指標的小數位數（與 StockScreener 的輸出一致）
+ROUNDING = {'rsi': 2, 'macd': 3, 'signal': 3, 'histogram': 3}
+
+
+def is_available():
+    """是否可使用向量化計算（需要 NumPy）"""
+    return np is not None
+
+
+def build_price_matrix(price_series, bars=None):
+    """
+    將多檔股票的價格序列排成靠右對齊、左側補 NaN 的矩陣
+    :param price_series: 價格序列的列表（由舊到新）
+    :param bars: 矩陣欄數（只保留最近 bars 根），預設為最長序列的長度
+    :return: float64 矩陣 (len(price_series), bars)
+    """
+    bars = bars or max((len(series) for series in price_series), default=0)
+    matrix = np.full((len(price_series), bars), np.nan)
+    for row, series in enumerate(price_series):
+        values = np.asarray(series, dtype=float)[-bars:] if bars else np.empty(0)
+        if len(values):
+            matrix[row, bars - len(values):] = values
+    return matrix
+
+
+def _window_means(cumulative, counts, window):
+    """
+    每列最後 min(window, 有效數) 根的平均
+    :param cumulative: 左側補一欄 0 的累計和矩陣（NaN 視為 0）
+    :return: (平均, 實際窗口大小)
+    """
+    bars = cumulative.shape[1] - 1
+    size = np.minimum(window, counts)
+    start = (bars - size)[:, None]
+    total = cumulative[:, -1] - np.take_along_axis(cumulative, start, axis=1)[:, 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(size > 0, total / size, np.nan), size
+
+
+def _cumulative(values):
+    return np.concatenate([np.zeros((values.shape[0], 1)), np.cumsum(values, axis=1)], axis=1)
+
+
+def _fill_leading(prices, counts):
+    """將每列左側補齊的 NaN 以該列第一個有效價格填滿（EMA 與漲跌在補齊區間因此維持不變）"""
+    bars = prices.shape[1]
+    first = np.take_along_axis(prices, np.minimum(bars - counts, bars - 1)[:, None], axis=1)
+    return np.where(np.isnan(prices), first, prices)
+
+
+def _recurrence(initial, coef, inputs, keep_series=False):
+    """
+    沿時間軸計算 y_t = coef_t × y_(t-1) + inputs_t
+    :param inputs: (日線數 × 股票數) 的連續陣列；coef 為純量或同形狀的陣列
+    :return: keep_series 時回傳完整序列，否則只回傳最後一根
+    """
+    current = initial.copy()
+    series = np.empty_like(inputs) if keep_series else None
+    scalar = np.ndim(coef) == 0
+    for t in range(inputs.shape[0]):
+        current *= coef if scalar else coef[t]
+        current += inputs[t]
+        if keep_series:
+            series[t] = current
+    return series if keep_series else current
+
+
+def _ema(prices_t, period, keep_series=False):
+    """EMA（輸入為已填滿左側的轉置矩陣，每列從第一個價格起算）"""
+    alpha = 2.0 / (period + 1)
+    return _recurrence(prices_t[0], 1 - alpha, alpha * prices_t, keep_series)
+
+
+def _wilder_rsi(filled_t, counts):
+    """
+    Wilder RSI：先以前 period 根漲跌的平均為起點，之後以 (前值 × (period - 1) + 本期) / period 平滑
+    period 取 min(rsi_period, 有效數 - 1)，不足 2 時為中性值 50
+    :param filled_t: 已填滿左側的轉置矩陣 (日線數 × 股票數)，補齊區間的漲跌為 0，不影響起點的累計
+    """
+    bars = filled_t.shape[0]
+    period = np.minimum(INDICATOR_CONFIG['rsi_period'], counts - 1)
+    safe_period = np.maximum(period, 1).astype(float)
+    decay = 1 - 1 / safe_period
+    seed_end = (bars - counts) + period  # 有效區間的前 period 根漲跌用來計算起點
+
+    avg_gain = np.zeros(len(counts))
+    avg_loss = np.zeros(len(counts))
+    for t, delta in enumerate(np.diff(filled_t, axis=0)):
+        coef = np.where(t < seed_end, 1.0, decay)
+        avg_gain = avg_gain * coef + np.maximum(delta, 0) / safe_period
+        avg_loss = avg_loss * coef + np.maximum(-delta, 0) / safe_period
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+    rsi = np.where(avg_loss == 0, np.where(avg_gain > 0, 100.0, 50.0), rsi)
+    return np.where(period < 2, 50.0, np.clip(rsi, 0, 100))
+
+
+def compute_indicators(prices):
+    """
+    一次計算所有股票的技術指標
+    :param prices: (股票數 × 日線數) 收盤價矩陣，左側以 NaN 補齊
+    :return: {指標名稱: 長度為股票數的陣列}，包含 bars（有效日線數）、current_price、
+             price_change_{1,5,20}d、rsi、macd、signal、histogram、ma{5,10,20,60}、bb_upper、bb_middle、bb_lower；
+             沒有任何有效價格的列為 NaN
+    """
+    prices = np.asarray(prices, dtype=float)
+    if prices.ndim == 1:
+        prices = prices[None, :]
+    rows, bars = prices.shape
+    counts = (~np.isnan(prices)).sum(axis=1)
+    current = prices[:, -1] if bars else np.full(rows, np.nan)
+    result = {'bars': counts, 'current_price': current}
+
+    # 漲跌幅（%）：資料不足時為 0
+    for period in INDICATOR_CONFIG['change_periods']:
+        if bars > period:
+            previous = prices[:, -1 - period]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                change = (current - previous) / previous * 100
+            change = np.where(counts > period, change, 0.0)
+        else:
+            change = np.zeros(rows)
+        result[f'price_change_{period}d'] = np.round(change, 2)
+
+    # 移動平均線與布林通道只需要最後 max(窗口) 根
+    window_bars = min(bars, max(max(INDICATOR_CONFIG['ma_windows']), INDICATOR_CONFIG['bb_period']))
+    recent = np.nan_to_num(prices[:, bars - window_bars:])
+    recent_counts = np.minimum(counts, window_bars)
+    cumulative = _cumulative(recent)
+
+    # 移動平均線：窗口取 min(週期, 有效數)
+    for window in INDICATOR_CONFIG['ma_windows']:
+        mean, _ = _window_means(cumulative, recent_counts, window)
+        result[f'ma{window}'] = np.round(mean, 2)
+
+    # 布林通道：母體標準差，資料少於 3 根時以價格區間的一半代替
+    middle, size = _window_means(cumulative, recent_counts, INDICATOR_CONFIG['bb_period'])
+    mean_sq, _ = _window_means(_cumulative(recent ** 2), recent_counts, INDICATOR_CONFIG['bb_period'])
+    std = np.sqrt(np.maximum(mean_sq - middle ** 2, 0))
+    last_two = prices[:, -min(2, bars):] if bars else np.zeros((rows, 1))
+    half_range = (np.fmax.reduce(last_two, axis=1) - np.fmin.reduce(last_two, axis=1)) * 0.5
+    width = np.where(size >= 3, INDICATOR_CONFIG['bb_width'] * std, half_range)
+    result['bb_upper'] = np.round(middle + width, 2)
+    result['bb_middle'] = np.round(middle, 2)
+    result['bb_lower'] = np.round(middle - width, 2)
+
+    if bars < 2:
+        for name in ('macd', 'signal', 'histogram'):
+            result[name] = np.zeros(rows)
+        result['rsi'] = np.full(rows, 50.0)
+        return result
+
+    # 時間遞迴在轉置後的連續矩陣上進行（每一步處理一整列連續記憶體）
+    filled_t = np.ascontiguousarray(_fill_leading(prices, counts).T)
+
+    # MACD 與 signal（MACD 線的 EMA）
+    macd_series = (_ema(filled_t, INDICATOR_CONFIG['macd_fast'], keep_series=True)
+                   - _ema(filled_t, INDICATOR_CONFIG['macd_slow'], keep_series=True))
+    signal = _ema(macd_series, INDICATOR_CONFIG['macd_signal'])
+    enough = counts >= 3
+    macd = np.where(enough, macd_series[-1], 0.0)
+    signal = np.where(enough, signal, 0.0)
+    result['macd'] = np.round(macd, ROUNDING['macd'])
+    result['signal'] = np.round(signal, ROUNDING['signal'])
+    result['histogram'] = np.round(macd - signal, ROUNDING['histogram'])
+
+    result['rsi'] = np.round(_wilder_rsi(filled_t, counts), ROUNDING['rsi'])
+    return result
+
+
+def indicators_for_row(result, row):
+    """取出單一股票的指標（轉為 Python 數值，方便寫入 JSON）"""
+    values = {}
+    for name, array in result.items():
+        value = array[row].item()
+        values[name] = None if isinstance(value, float) and value != value else value
+    return values
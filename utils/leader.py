@@ -0,0 +1,79 @@
+"""
+背景工作主導行程選定
+以多個服務行程執行（例如 gunicorn 多個 worker）時，各行程共用同一份快取資料庫與選股指標表檔案，
+背景工作（快取回收與統計快照、熱門資料背景更新、選股指標表計算）只需要一個行程執行。
+以 cache/ 下的檔案鎖（fcntl.flock，非阻塞）選出主導行程，鎖在行程存活期間一直持有，
+行程結束時由作業系統釋放；其他行程定期重試，主導行程結束後由其中一個接手。
+"""
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows 沒有 fcntl，視為單一服務行程
+    fcntl = None
+
+# 主導行程設定
+LEADER_CONFIG = {
+    'lock_path': os.path.join('cache', 'background.lock'),
+    'retry_interval': 60,    # 非主導行程重新嘗試取得鎖的間隔（秒）
+}
+
+_lock = threading.Lock()
+_lock_file = None
+_watch_thread = None
+
+
+def try_become_leader():
+    """嘗試取得主導行程鎖（不等待），本行程已是或成為主導行程時回傳 True"""
+    global _lock_file
+    with _lock:
+        if _lock_file is not None:
+            return True
+        if fcntl is None:
+            _lock_file = True
+            return True
+        path = LEADER_CONFIG['lock_path']
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        handle = open(path, 'a+')
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        handle.seek(0)
+        handle.truncate()
+        handle.write(str(os.getpid()))
+        handle.flush()
+        _lock_file = handle
+        return True
+
+
+def is_leader():
+    """本行程是否為主導行程"""
+    return _lock_file is not None
+
+
+def _watch_loop(on_elected):
+    while not try_become_leader():
+        time.sleep(LEADER_CONFIG['retry_interval'])
+    print(f"👑 行程 {os.getpid()} 接手背景工作")
+    on_elected()
+
+
+def run_as_leader(on_elected):
+    """
+    取得主導行程鎖後執行 on_elected（只執行一次）：
+    立即取得時在目前執行緒執行，否則由背景執行緒定期重試，等到原主導行程結束後接手
+    """
+    global _watch_thread
+    if try_become_leader():
+        on_elected()
+        return True
+    with _lock:
+        if _watch_thread is None:
+            _watch_thread = threading.Thread(target=_watch_loop, args=(on_elected,),
+                                             name='leader-watch', daemon=True)
+            _watch_thread.start()
+    return False
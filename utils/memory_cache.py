@@ -0,0 +1,86 @@
+"""
+行程內記憶體快取（LRU + TTL）
+放在 JSON 檔案快取前面的記憶體層：命中時不需開檔與解析 JSON，寫入時同步寫回磁碟（write-through）。
+容量固定，超過時淘汰最久未使用的項目；TTL 限制記憶體中的資料與磁碟（其他行程寫入）的落差。
+"""
+import threading
+import time
+from collections import OrderedDict
+
+# 記憶體快取設定
+MEMORY_CACHE_CONFIG = {
+    'max_entries': 2048,  # 項目上限
+    'ttl': 60,            # 項目在記憶體中最長保留秒數
+}
+
+
+class LRUCache:
+    """執行緒安全的 LRU 快取，每個項目各自有到期時間"""
+
+    def __init__(self, max_entries=None, ttl=None):
+        self.max_entries = max_entries or MEMORY_CACHE_CONFIG['max_entries']
+        self.ttl = MEMORY_CACHE_CONFIG['ttl'] if ttl is None else ttl
+        self._items = OrderedDict()  # {key: (到期的 monotonic 時間, 值)}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """取得項目，不存在或已到期時回傳 None（回傳的是共用物件，請勿修改）"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            if item[0] <= time.monotonic():
+                del self._items[key]
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def peek(self, key):
+        """取得項目但不更新使用順序與命中統計（背景工作檢查用）"""
+        with self._lock:
+            item = self._items.get(key)
+        if item is None or item[0] <= time.monotonic():
+            return None
+        return item[1]
+
+    def set(self, key, value, ttl=None):
+        """
+        寫入項目
+        :param ttl: 有效秒數，不超過 self.ttl；小於等於 0 時不寫入
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            self.delete(key)
+            return
+        with self._lock:
+            self._items[key] = (time.monotonic() + ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self):
+        """命中統計"""
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._items),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 3) if total else None,
+        }
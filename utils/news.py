@@ -1,12 +1,13 @@
-import requests
+from utils.http_client import http_get
 from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
 from urllib.parse import urljoin
 from typing import List, Dict, Optional
 
-# 复用 twse 的設定與快取
+# 复用 twse 的設定與背景更新；快取使用獨立的 news namespace
 try:
-    from utils.twse import HEADERS, CONFIG, get_cache, save_cache
+    from utils.twse import HEADERS, CONFIG, schedule_refresh
+    from utils.cache import news as news_cache
 except Exception:
     # 後備：若無法匯入，提供最基本的設定，快取降級為無
     HEADERS = {
@@ -14,12 +15,8 @@ except Exception:
         'Accept-Language': 'zh-TW,zh;q=0.9,en;q=0.8',
     }
     CONFIG = {'timeout': 15}
-
-    def get_cache(key: str):
-        return None
-
-    def save_cache(key: str, data):
-        return None
+    news_cache = None
+    schedule_refresh = None
 
 
 def _relative_time_string(published_dt: Optional[datetime]) -> str:
@@ -59,7 +56,7 @@ def _parse_rss_datetime(text: str) -> Optional[datetime]:
 def _fetch_from_rss(rss_url: str) -> List[Dict]:
     items: List[Dict] = []
     try:
-        resp = requests.get(rss_url, timeout=CONFIG.get('timeout', 15), headers=HEADERS)
+        resp = http_get(rss_url, timeout=CONFIG.get('timeout', 15), headers=HEADERS)
         resp.raise_for_status()
         soup = BeautifulSoup(resp.content, 'xml')
         for item in soup.find_all('item'):
@@ -85,7 +82,7 @@ def _fetch_from_rss(rss_url: str) -> List[Dict]:
 def _fetch_from_html(list_url: str) -> List[Dict]:
     items: List[Dict] = []
     try:
-        resp = requests.get(list_url, timeout=CONFIG.get('timeout', 15), headers=HEADERS)
+        resp = http_get(list_url, timeout=CONFIG.get('timeout', 15), headers=HEADERS)
         resp.raise_for_status()
         soup = BeautifulSoup(resp.text, 'lxml')
 
@@ -122,13 +119,26 @@ def _fetch_from_html(list_url: str) -> List[Dict]:
 def get_yahoo_stock_top_news(limit: int = 3) -> List[Dict]:
     """抓取 Yahoo 股市/財經熱門新聞，回傳最多 limit 筆。
     回傳欄位：title, link, relative_time, source
-    具備本地快取（預設 5 分鐘，沿用 twse.CONFIG['cache_duration']）。
+    具備本地快取（news namespace，過期後先回傳舊新聞並於背景更新）。
     """
-    cache_key = 'yahoo_stock_news'
-    cached = get_cache(cache_key)
-    if cached and isinstance(cached, list):
-        return cached[:limit]
+    cache_key = 'yahoo_top'
+    if news_cache is not None:
+        cached, is_stale = news_cache.get_entry(cache_key)
+        if cached and isinstance(cached, list):
+            if is_stale:
+                schedule_refresh(f"news_{cache_key}", lambda: _fetch_top_news(limit))
+            return cached[:limit]
+
+    return _fetch_top_news(limit)
+
+
+def refresh_top_news(limit: int = 3) -> List[Dict]:
+    """不論快取是否到期，重新抓取熱門新聞並寫入快取（背景更新器使用）"""
+    return _fetch_top_news(limit)
+
 
+def _fetch_top_news(limit: int) -> List[Dict]:
+    """抓取熱門新聞並寫入快取"""
     candidates: List[Dict] = []
 
     # 優先 RSS（較穩定）
@@ -162,8 +172,9 @@ def get_yahoo_stock_top_news(limit: int = 3) -> List[Dict]:
         if len(deduped) >= limit:
             break
 
-    # 快取
-    save_cache(cache_key, deduped)
+    # 快取（沒抓到新聞時不快取，下次請求再試）
+    if news_cache is not None and deduped:
+        news_cache.set('yahoo_top', deduped)
     return deduped
 
 
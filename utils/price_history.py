@@ -0,0 +1,232 @@
+"""
+日線價格歷史欄式儲存（OHLCV）
+每檔股票一個資料夾，日期、開高低收、成交量各自一個原始二進位欄檔，以 NumPy memmap 唯讀對應：
+區間讀取只需在日期欄二分搜尋後切片（zero-copy），不必重新向上游下載整段歷史。
+新的日線只附加在檔尾（append-only）；整段回補時寫入暫存資料夾後再整批替換。
+"""
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 價格歷史設定
+PRICE_HISTORY_CONFIG = {
+    'path': os.path.join('cache', 'history'),
+    'backfill_range': '5y',   # 沒有任何歷史時一次回補的期間（Yahoo Finance range）
+    'max_open_maps': 240,     # 保留的 memmap 數上限（每個佔用一個檔案描述子，每檔股票 6 個欄位）
+}
+
+# 欄位與資料型別：日期為該日線的 epoch 秒（遞增、不重複）
+COLUMNS = ('date', 'open', 'high', 'low', 'close', 'volume')
+DTYPES = {
+    'date': 'int64',
+    'open': 'float64',
+    'high': 'float64',
+    'low': 'float64',
+    'close': 'float64',
+    'volume': 'int64',
+}
+
+
+def is_available():
+    """是否可使用價格歷史儲存（需要 NumPy）"""
+    return np is not None
+
+
+def bars_from_yahoo(data):
+    """
+    將 Yahoo Finance chart 回應轉為欄式日線資料（略過收盤價缺漏的日線）
+    :return: {欄位: ndarray}，無資料時回傳 None
+    """
+    if not data.get('chart') or not data['chart'].get('result'):
+        return None
+    result = data['chart']['result'][0]
+    timestamps = result.get('timestamp') or []
+    quote = (result.get('indicators', {}).get('quote') or [{}])[0]
+    if not timestamps or not quote:
+        return None
+
+    def value(field, i):
+        values = quote.get(field) or []
+        item = values[i] if i < len(values) else None
+        return None if item is None or item != item else item  # item != item 表示 NaN
+
+    rows = []
+    for i, timestamp in enumerate(timestamps):
+        close = value('close', i)
+        if close is None or close <= 0:
+            continue
+        open_, high, low = (value(field, i) or close for field in ('open', 'high', 'low'))
+        rows.append((int(timestamp), open_, high, low, close, int(value('volume', i) or 0)))
+    if not rows:
+        return None
+
+    rows.sort(key=lambda row: row[0])
+    return {column: np.array([row[i] for row in rows], dtype=DTYPES[column])
+            for i, column in enumerate(COLUMNS)}
+
+
+class PriceHistoryStore:
+    """
+    欄式日線儲存，讀取以 memmap 對應（檔案改變時才重新對應）
+    對應只保留最近使用的 max_open_maps 個（LRU），逐檔掃描全市場時不會累積開啟的檔案描述子
+    """
+
+    def __init__(self, path=None):
+        self.path = path or PRICE_HISTORY_CONFIG['path']
+        self._maps = OrderedDict()   # {(股票代碼, 欄位): ((檔案大小, 修改時間), memmap)}，依最近使用排序
+        self._maps_lock = threading.Lock()
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _lock(self, symbol):
+        with self._locks_lock:
+            return self._locks.setdefault(symbol, threading.Lock())
+
+    def _column_path(self, symbol, column, directory=None):
+        return os.path.join(directory or os.path.join(self.path, symbol), f"{column}.bin")
+
+    def _map(self, symbol, column):
+        """取得欄檔的 memmap（不存在或為空時回傳空陣列）"""
+        path = self._column_path(symbol, column)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return np.empty(0, dtype=DTYPES[column])
+        size = stat.st_size
+        version = (size, stat.st_mtime_ns)
+        key = (symbol, column)
+        with self._maps_lock:
+            cached = self._maps.get(key)
+            if cached is not None and cached[0] == version:
+                self._maps.move_to_end(key)
+                return cached[1]
+        itemsize = np.dtype(DTYPES[column]).itemsize
+        if size < itemsize:
+            return np.empty(0, dtype=DTYPES[column])
+        mapped = np.memmap(path, dtype=DTYPES[column], mode='r', shape=(size // itemsize,))
+        with self._maps_lock:
+            self._maps[key] = (version, mapped)
+            self._maps.move_to_end(key)
+            while len(self._maps) > PRICE_HISTORY_CONFIG['max_open_maps']:
+                self._maps.popitem(last=False)
+        return mapped
+
+    def _release(self, symbol):
+        """
+        釋放股票各欄位的 memmap：memmap 本身持有底層對應的 buffer，無法在仍被參照時 close，
+        移除參照後對應（與其檔案描述子）在最後一個切片釋放時即關閉
+        """
+        with self._maps_lock:
+            for column in COLUMNS:
+                self._maps.pop((symbol, column), None)
+
+    def _columns(self, symbol):
+        """各欄位的 memmap，長度取最短者（附加寫到一半時只讀到完整的日線）"""
+        columns = {column: self._map(symbol, column) for column in COLUMNS}
+        length = min(len(array) for array in columns.values())
+        return {column: array[:length] for column, array in columns.items()}
+
+    def length(self, symbol):
+        """已儲存的日線數"""
+        return len(self._columns(symbol)['date'])
+
+    def last_date(self, symbol):
+        """最後一筆日線的 epoch 秒，沒有歷史時回傳 None"""
+        dates = self._columns(symbol)['date']
+        return int(dates[-1]) if len(dates) else None
+
+    def first_date(self, symbol):
+        """第一筆日線的 epoch 秒，沒有歷史時回傳 None"""
+        dates = self._columns(symbol)['date']
+        return int(dates[0]) if len(dates) else None
+
+    def read(self, symbol, start=None, end=None):
+        """
+        讀取 [start, end] 區間的日線（皆為 epoch 秒，None 表示不限）
+        :return: {欄位: ndarray}，為 memmap 的唯讀切片（不複製資料）
+        """
+        columns = self._columns(symbol)
+        dates = columns['date']
+        lo = 0 if start is None else int(np.searchsorted(dates, start, side='left'))
+        hi = len(dates) if end is None else int(np.searchsorted(dates, end, side='right'))
+        return {column: array[lo:hi] for column, array in columns.items()}
+
+    def tail(self, symbol, count):
+        """讀取最後 count 筆日線"""
+        columns = self._columns(symbol)
+        return {column: array[-count:] if count else array[:0] for column, array in columns.items()}
+
+    def append(self, symbol, bars):
+        """
+        將比最後一筆更新的日線附加到檔尾（較舊或重複的日線略過）
+        :param bars: {欄位: 陣列}，日期遞增
+        :return: 附加的日線數
+        """
+        with self._lock(symbol):
+            last = self.last_date(symbol)
+            dates = np.asarray(bars['date'], dtype=DTYPES['date'])
+            mask = dates > last if last is not None else np.ones(len(dates), dtype=bool)
+            count = int(mask.sum())
+            if not count:
+                return 0
+            directory = os.path.join(self.path, symbol)
+            os.makedirs(directory, exist_ok=True)
+            # 日期欄最後寫入：讀取端以最短欄長為準，中途失敗也不會讀到不完整的日線
+            for column in COLUMNS[1:] + COLUMNS[:1]:
+                values = np.asarray(bars[column], dtype=DTYPES[column])[mask]
+                with open(self._column_path(symbol, column), 'ab') as f:
+                    f.write(values.tobytes())
+            return count
+
+    def backfill(self, symbol, bars):
+        """
+        整段回補：與既有歷史合併（同一日期以新資料為準）後整批替換
+        :return: 合併後的日線數
+        """
+        with self._lock(symbol):
+            existing = {column: np.array(array) for column, array in self._columns(symbol).items()}
+            merged = {column: np.concatenate([existing[column], np.asarray(bars[column], dtype=DTYPES[column])])
+                      for column in COLUMNS}
+            # 同一日期保留最後出現者（新資料），並依日期排序
+            reversed_dates = merged['date'][::-1]
+            _, index = np.unique(reversed_dates, return_index=True)
+            keep = len(reversed_dates) - 1 - index
+            merged = {column: array[keep] for column, array in merged.items()}
+
+            directory = os.path.join(self.path, symbol)
+            staging = f"{directory}.new"
+            shutil.rmtree(staging, ignore_errors=True)
+            os.makedirs(staging)
+            for column in COLUMNS:
+                merged[column].tofile(self._column_path(symbol, column, staging))
+            # 先釋放舊檔的對應（Windows 無法替換仍被對應的檔案）
+            self._release(symbol)
+            retired = f"{directory}.old"
+            shutil.rmtree(retired, ignore_errors=True)
+            if os.path.isdir(directory):
+                os.replace(directory, retired)
+            os.replace(staging, directory)
+            shutil.rmtree(retired, ignore_errors=True)
+            return len(merged['date'])
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store():
+    """取得共用的價格歷史儲存（未安裝 NumPy 時回傳 None）"""
+    global _store
+    if np is None:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = PriceHistoryStore()
+    return _store
@@ -0,0 +1,86 @@
+"""
+上游請求速率限制（token bucket）
+以固定速率補充權杖、允許短暫突發，取代各處零散的 time.sleep 間隔。
+每個上游主機共用一個限制器（同步的 http_get 與非同步引擎皆經過），並行查詢時也不會超過主機的速率上限。
+"""
+import threading
+import time
+
+# 各主機的速率上限：{主機: (每秒請求數, 突發請求數)}，未列出的主機使用 default
+RATE_LIMIT_CONFIG = {
+    'default': (10, 10),
+    'hosts': {
+        'mis.twse.com.tw': (5, 5),
+        'www.twse.com.tw': (3, 3),
+        'query1.finance.yahoo.com': (10, 10),
+        'query2.finance.yahoo.com': (10, 10),
+    },
+}
+
+
+class RateLimiter:
+    """執行緒安全的 token bucket：每秒補充 rate 個權杖，最多累積 burst 個"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """立即取得權杖，不足時回傳 False（不等待）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def wait_time(self, tokens=1):
+        """距離可取得權杖還需等待的秒數（不取得權杖）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (tokens - self._tokens) / self.rate)
+
+    def acquire(self, tokens=1, timeout=None):
+        """
+        等待直到取得權杖
+        :param timeout: 最長等待秒數（None 表示一直等待）
+        :return: 是否取得
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None:
+                if now + wait > deadline:
+                    return False
+            time.sleep(wait)
+
+
+_host_limiters = {}
+_host_limiters_lock = threading.Lock()
+
+
+def host_limiter(host):
+    """取得指定主機共用的限制器（首次呼叫時依 RATE_LIMIT_CONFIG 建立）"""
+    limiter = _host_limiters.get(host)
+    if limiter is not None:
+        return limiter
+    with _host_limiters_lock:
+        limiter = _host_limiters.get(host)
+        if limiter is None:
+            rate, burst = RATE_LIMIT_CONFIG['hosts'].get(host, RATE_LIMIT_CONFIG['default'])
+            limiter = RateLimiter(rate, burst)
+            _host_limiters[host] = limiter
+        return limiter
@@ -0,0 +1,164 @@
+"""
+盤中熱門資料背景更新
+交易時段內定期檢查熱門資料（大盤摘要、熱門股、有啟用到價提醒的股票、自選股、新聞）的快取，
+在到期前主動向上游更新，讓使用者讀到的永遠是未過期的快取。
+依優先順序處理，並以 token bucket 限制對上游的請求速率；非交易時段不發出任何請求。
+"""
+import threading
+import time
+
+from utils.twse import refresh_market_summary, refresh_stock_quotes
+from utils.news import refresh_top_news
+from utils.cache import quotes as quote_cache, market as market_cache, news as news_cache, missing as missing_cache
+from utils.rate_limit import RateLimiter
+from utils.trading_calendar import in_session_window
+
+# 背景更新設定
+REFRESH_CONFIG = {
+    'interval': 10,        # 檢查間隔（秒）
+    'lead_time': 20,       # 距離到期少於此秒數即更新
+    'rate': 1.0,           # 每秒最多向上游發出的更新工作數
+    'burst': 3,            # 允許的短暫突發工作數
+    'hot_set_ttl': 60,     # 熱門清單（自選股、到價提醒）重新讀取的間隔（秒）
+    'chunk_size': 50,      # 每個報價更新工作的股票數（對應證交所即時報價單次批次上限）
+    'news_limit': 3,       # 與首頁顯示的新聞數量一致
+}
+
+# 熱門清單分類與優先順序（數字越小越優先）
+PRIORITY_MARKET = 0
+PRIORITY_POPULAR = 1
+PRIORITY_ALERTS = 2
+PRIORITY_WATCHLIST = 3
+PRIORITY_NEWS = 4
+
+HOT_GROUPS = {
+    'popular': PRIORITY_POPULAR,
+    'alerts': PRIORITY_ALERTS,
+    'watchlist': PRIORITY_WATCHLIST,
+}
+
+_refresher_thread = None
+_refresher_lock = threading.Lock()
+_hot_codes = []
+_hot_loaded_at = 0.0
+_stats = {'runs': 0, 'tasks': 0, 'failures': 0, 'last_run': None}
+
+
+def _load_hot_codes(hot_set_provider):
+    """
+    讀取熱門股票並依優先順序排列（同一代碼只保留最高優先）
+    :param hot_set_provider: 回傳 {'popular': [...], 'alerts': [...], 'watchlist': [...]} 的函式
+    :return: [(優先順序, 股票代碼)]
+    """
+    global _hot_codes, _hot_loaded_at
+    if _hot_codes and time.monotonic() - _hot_loaded_at < REFRESH_CONFIG['hot_set_ttl']:
+        return _hot_codes
+    try:
+        groups = hot_set_provider() or {}
+    except Exception as e:
+        print(f"⚠️ 無法讀取熱門清單: {e}")
+        return _hot_codes
+
+    priorities = {}
+    for group, codes in groups.items():
+        priority = HOT_GROUPS.get(group, PRIORITY_WATCHLIST)
+        for code in codes or []:
+            if code and priority < priorities.get(code, PRIORITY_NEWS):
+                priorities[code] = priority
+    _hot_codes = sorted(((priority, code) for code, priority in priorities.items()), key=lambda item: item[0])
+    _hot_loaded_at = time.monotonic()
+    return _hot_codes
+
+
+def _due(expires_at, now):
+    return expires_at is None or expires_at - now < REFRESH_CONFIG['lead_time']
+
+
+def collect_due_tasks(hot_codes):
+    """
+    找出即將到期（或尚未快取）的熱門資料
+    :param hot_codes: [(優先順序, 股票代碼)]，已依優先順序排列
+    :return: [(優先順序, 說明, 更新函式)]，依優先順序排列
+    """
+    now = time.time()
+    tasks = []
+
+    if _due(market_cache.expiry_many(['summary']).get('summary'), now):
+        tasks.append((PRIORITY_MARKET, '大盤摘要', refresh_market_summary))
+
+    codes = [code for _, code in hot_codes]
+    known_missing = missing_cache.get_many(codes)
+    expiries = quote_cache.expiry_many(codes)
+    due_codes = [(priority, code) for priority, code in hot_codes
+                 if code not in known_missing and _due(expiries.get(code), now)]
+    # 依優先順序分批，每批的優先順序取批內最高者
+    size = REFRESH_CONFIG['chunk_size']
+    for i in range(0, len(due_codes), size):
+        chunk = due_codes[i:i + size]
+        chunk_codes = [code for _, code in chunk]
+        tasks.append((chunk[0][0], f"報價 {len(chunk_codes)} 檔",
+                      lambda chunk_codes=chunk_codes: refresh_stock_quotes(chunk_codes)))
+
+    if _due(news_cache.expiry_many(['yahoo_top']).get('yahoo_top'), now):
+        tasks.append((PRIORITY_NEWS, '新聞', lambda: refresh_top_news(REFRESH_CONFIG['news_limit'])))
+
+    tasks.sort(key=lambda task: task[0])
+    return tasks
+
+
+def run_refresh_cycle(hot_set_provider, limiter):
+    """
+    執行一輪背景更新（依優先順序，每個工作先取得速率限制的權杖）
+    :return: 本輪執行的工作數
+    """
+    tasks = collect_due_tasks(_load_hot_codes(hot_set_provider))
+    deadline = time.monotonic() + REFRESH_CONFIG['interval']
+    done = 0
+    for priority, label, refresh in tasks:
+        # 本輪時間用完時留給下一輪重新排序，避免低優先工作佔用高優先的時間
+        if not limiter.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            break
+        try:
+            refresh()
+            done += 1
+        except Exception as e:
+            _stats['failures'] += 1
+            print(f"❌ 背景更新失敗 {label}: {e}")
+    _stats['runs'] += 1
+    _stats['tasks'] += done
+    _stats['last_run'] = time.time()
+    if done:
+        print(f"🔄 背景更新 {done}/{len(tasks)} 項即將到期的熱門資料")
+    return done
+
+
+def _refresher_loop(hot_set_provider):
+    limiter = RateLimiter(REFRESH_CONFIG['rate'], REFRESH_CONFIG['burst'])
+    while True:
+        started = time.monotonic()
+        if in_session_window():
+            try:
+                run_refresh_cycle(hot_set_provider, limiter)
+            except Exception as e:
+                print(f"❌ 背景更新失敗: {e}")
+        time.sleep(max(1.0, REFRESH_CONFIG['interval'] - (time.monotonic() - started)))
+
+
+def start_refresher(hot_set_provider):
+    """
+    啟動盤中背景更新執行緒（重複呼叫不會建立多個執行緒）
+    :param hot_set_provider: 回傳熱門股票分類清單的函式，見 _load_hot_codes
+    """
+    global _refresher_thread
+    with _refresher_lock:
+        if _refresher_thread is not None and _refresher_thread.is_alive():
+            return _refresher_thread
+        _refresher_thread = threading.Thread(target=_refresher_loop, args=(hot_set_provider,),
+                                             name='cache-refresher', daemon=True)
+        _refresher_thread.start()
+        return _refresher_thread
+
+
+def get_refresher_stats():
+    """背景更新統計（執行輪數、完成工作數、失敗數、最近執行時間、熱門股票數）"""
+    return dict(_stats, hot_codes=len(_hot_codes))
@@ -0,0 +1,132 @@
+"""
+全市場選股指標表
+排程工作定期為所有上市櫃股票計算技術指標、評分與信號，整張表保存在記憶體並寫入磁碟（重新啟動後直接載入），
+選股 API 只篩選表中已計算好的資料列，請求期間不向上游發出任何請求。
+表格的建立方式由 app 啟動背景工作時注入（StockScreener.build_screening_table），本模組只負責保存與排程；
+股票代碼主檔更新（例如首次下載完成前只有內建的基本資料）後也會重新計算。
+多個服務行程時只由主導行程（utils.leader）計算與寫入，其他行程在磁碟檔案更新後重新載入。
+"""
+import json
+import os
+import threading
+import time
+
+from utils.symbols import ensure_symbols, symbols_timestamp
+from utils.trading_calendar import in_session_window, last_settled_day
+
+# 選股指標表設定
+SCREENER_TABLE_CONFIG = {
+    'table_file': os.path.join('cache', 'screener_table.json'),
+    'session_interval': 300,   # 盤中重新計算的間隔（秒）
+    'check_interval': 60,      # 排程檢查是否需要重新計算的間隔（秒）
+    'retry_interval': 600,     # 建立失敗後再次嘗試的間隔（秒）
+}
+
+_table = None
+_table_mtime = None
+_table_lock = threading.Lock()
+_job_thread = None
+_job_lock = threading.Lock()
+
+
+def _file_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def get_screener_table():
+    """
+    取得最近一次計算的選股指標表（磁碟檔案由其他行程更新時重新載入）
+    :return: {'built_at', 'settled_day', 'symbols_timestamp', 'rows': [分析結果]}，尚未建立時回傳 None
+    """
+    global _table, _table_mtime
+    path = SCREENER_TABLE_CONFIG['table_file']
+    mtime = _file_mtime(path)
+    if mtime is None or mtime == _table_mtime:
+        return _table
+    with _table_lock:
+        if mtime != _table_mtime:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    _table = json.load(f)
+                print(f"📋 載入選股指標表 {len(_table.get('rows', []))} 檔")
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                print(f"❌ 讀取選股指標表失敗: {e}")
+            _table_mtime = mtime
+    return _table
+
+
+def save_screener_table(rows):
+    """以新的資料列替換選股指標表，並寫入磁碟（先寫暫存檔再替換）"""
+    global _table, _table_mtime
+    table = {
+        'built_at': time.time(),
+        'settled_day': last_settled_day().isoformat(),
+        'symbols_timestamp': symbols_timestamp(),
+        'rows': rows,
+    }
+    path = SCREENER_TABLE_CONFIG['table_file']
+    with _table_lock:
+        _table = table
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(table, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"❌ 選股指標表寫入失敗: {e}")
+        # 記下本行程寫入的版本，避免重新載入自己剛寫入的檔案
+        _table_mtime = _file_mtime(path)
+    return table
+
+
+def table_outdated(table=None):
+    """是否需要重新計算：尚未建立、股票代碼主檔已更新、盤中超過重新計算間隔，或尚未包含最近一個已定稿的交易日"""
+    table = table if table is not None else get_screener_table()
+    if not table or table.get('symbols_timestamp') != symbols_timestamp():
+        return True
+    if in_session_window():
+        return time.time() - table.get('built_at', 0) >= SCREENER_TABLE_CONFIG['session_interval']
+    return table.get('settled_day', '') < last_settled_day().isoformat()
+
+
+def _table_loop(builder):
+    failed_at = None
+    while True:
+        try:
+            # 先確保使用最新的股票代碼主檔（首次下載完成前不以內建基本資料長期代表全市場）
+            ensure_symbols()
+            retry_due = failed_at is None or time.monotonic() - failed_at >= SCREENER_TABLE_CONFIG['retry_interval']
+            if retry_due and table_outdated():
+                started = time.monotonic()
+                rows = builder()
+                if rows:
+                    save_screener_table(rows)
+                    failed_at = None
+                    print(f"📋 選股指標表已更新 {len(rows)} 檔（{time.monotonic() - started:.1f} 秒）")
+                else:
+                    failed_at = time.monotonic()
+        except Exception as e:
+            failed_at = time.monotonic()
+            print(f"❌ 選股指標表建立失敗: {e}")
+        time.sleep(SCREENER_TABLE_CONFIG['check_interval'])
+
+
+def start_screener_table_job(builder):
+    """
+    啟動選股指標表排程執行緒（重複呼叫不會建立多個執行緒）
+    :param builder: 計算全市場資料列的函式，回傳分析結果列表
+    """
+    global _job_thread
+    with _job_lock:
+        if _job_thread is not None and _job_thread.is_alive():
+            return _job_thread
+        _job_thread = threading.Thread(target=_table_loop, args=(builder,),
+                                       name='screener-table', daemon=True)
+        _job_thread.start()
+        return _job_thread
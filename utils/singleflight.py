@@ -0,0 +1,66 @@
+"""
+單一飛行（single-flight）請求合併
+同一個 key 同時只會有一個上游請求在進行，其他並行呼叫者等待並共用同一份結果，
+避免快取到期瞬間大量請求同時打到上游（thundering herd）。
+"""
+import threading
+
+
+class _Call:
+    """進行中的單次呼叫"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """以 key 合併並行呼叫"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0  # 被合併（未實際發出請求）的呼叫次數
+
+    def do(self, key, func):
+        """
+        執行 func 並回傳結果；若同一 key 已有呼叫在進行，等待其結果而不重複執行
+        注意：所有呼叫者拿到的是同一個物件，修改前請先複製
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+            if call.waiters:
+                print(f"🔗 合併 {call.waiters} 個並行請求: {key}")
+
+        return call.result
+
+    def in_flight(self):
+        """目前進行中的 key 列表"""
+        with self._lock:
+            return list(self._calls)
@@ -0,0 +1,232 @@
+"""
+資料來源健康度追蹤與斷路器
+記錄每個資料來源最近的成功率與延遲；連續失敗時斷路（跳過該來源），
+冷卻時間後放行單一試探請求，成功即恢復。並依觀察到的成功率與延遲動態排序資料來源。
+"""
+import threading
+import time
+from collections import deque
+
+# 健康度與斷路器設定
+HEALTH_CONFIG = {
+    'window': 20,             # 滾動視窗（最近 N 次請求）
+    'failure_threshold': 5,   # 連續失敗幾次後斷路
+    'cooldown': 60,           # 斷路後多久放行試探請求（秒）
+    'min_samples': 3,         # 樣本數不足時維持原本的優先順序
+    'min_success_rate': 0.05, # 計算預期耗時時成功率的下限，避免除以零
+    'prior_cost': 1.0,        # 樣本不足的來源假設的預期耗時（秒）
+}
+
+CLOSED = 'closed'        # 正常
+OPEN = 'open'            # 斷路中，跳過
+HALF_OPEN = 'half_open'  # 冷卻結束，放行試探請求
+
+
+class SourceUnavailable(Exception):
+    """資料來源斷路中（實際呼叫時試探請求已被其他請求取得）"""
+
+
+class SourceHealth:
+    """單一資料來源的滾動健康度與斷路器狀態"""
+
+    def __init__(self, name):
+        self.name = name
+        self.samples = deque(maxlen=HEALTH_CONFIG['window'])  # (是否成功, 延遲秒數)
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probe_started_at = None
+        self.lock = threading.Lock()
+
+    def _probe_free(self, now):
+        """斷路冷卻結束後轉為半開；回傳目前是否可放行請求（呼叫端需持有 lock）"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if now - self.opened_at < HEALTH_CONFIG['cooldown']:
+                return False
+            self.state = HALF_OPEN
+            self.probe_started_at = None
+        # 半開：一次只放行一個試探請求；試探未回報結果超過冷卻時間則再放行
+        return self.probe_started_at is None or now - self.probe_started_at >= HEALTH_CONFIG['cooldown']
+
+    def available(self):
+        """是否可排入本次請求的候選來源（只檢查，不佔用半開狀態的試探請求）"""
+        with self.lock:
+            return self._probe_free(time.monotonic())
+
+    def allow(self):
+        """實際發出請求前呼叫：是否允許對此來源發出請求，半開時同時佔用試探請求"""
+        with self.lock:
+            now = time.monotonic()
+            if not self._probe_free(now):
+                return False
+            if self.state == HALF_OPEN:
+                self.probe_started_at = now
+            return True
+
+    def record(self, ok, latency):
+        """記錄一次請求結果"""
+        with self.lock:
+            self.samples.append((bool(ok), latency))
+            if ok:
+                if self.state != CLOSED:
+                    print(f"🟢 資料來源恢復: {self.name}")
+                self.consecutive_failures = 0
+                self.state = CLOSED
+                self.probe_started_at = None
+                return
+
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= HEALTH_CONFIG['failure_threshold']:
+                if self.state != OPEN:
+                    print(f"🔴 資料來源斷路: {self.name}（連續失敗 {self.consecutive_failures} 次）")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.probe_started_at = None
+
+    def record_empty(self):
+        """
+        記錄一次正常回應但查無資料（代碼不存在、已下市等）：不算失敗，也不計入成功率樣本，
+        但表示來源可正常回應，因此清除連續失敗數並結束半開狀態
+        """
+        with self.lock:
+            self.consecutive_failures = 0
+            if self.state == HALF_OPEN:
+                print(f"🟢 資料來源恢復: {self.name}")
+                self.state = CLOSED
+                self.probe_started_at = None
+
+    def success_rate(self):
+        if not self.samples:
+            return None
+        return sum(1 for ok, _ in self.samples if ok) / len(self.samples)
+
+    def avg_latency(self):
+        if not self.samples:
+            return None
+        return sum(latency for _, latency in self.samples) / len(self.samples)
+
+    def expected_cost(self):
+        """取得有效結果的預期耗時（平均延遲 / 成功率），樣本不足時回傳 None"""
+        if len(self.samples) < HEALTH_CONFIG['min_samples']:
+            return None
+        rate = max(self.success_rate(), HEALTH_CONFIG['min_success_rate'])
+        return self.avg_latency() / rate
+
+    def snapshot(self):
+        with self.lock:
+            rate = self.success_rate()
+            latency = self.avg_latency()
+            return {
+                'state': self.state,
+                'samples': len(self.samples),
+                'success_rate': round(rate, 3) if rate is not None else None,
+                'avg_latency': round(latency, 3) if latency is not None else None,
+                'consecutive_failures': self.consecutive_failures,
+            }
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_health(source_name):
+    """取得（必要時建立）資料來源的健康度物件"""
+    health = _registry.get(source_name)
+    if health is None:
+        with _registry_lock:
+            health = _registry.setdefault(source_name, SourceHealth(source_name))
+    return health
+
+
+def track(source_name, func, is_valid, claim=True):
+    """
+    包裝資料來源函式，自動記錄結果及延遲：
+    例外（連線錯誤、逾時、上游錯誤回應）記為失敗，有效結果記為成功，正常回應但查無資料不影響斷路器
+    :param claim: 呼叫前先向斷路器取得放行（半開時佔用試探請求），未放行時拋出 SourceUnavailable
+    """
+    def tracked():
+        health = get_health(source_name)
+        if claim and not health.allow():
+            raise SourceUnavailable(f"{source_name} 斷路中")
+        start = time.monotonic()
+        try:
+            result = func()
+        except Exception:
+            health.record(False, time.monotonic() - start)
+            raise
+        if is_valid(result):
+            health.record(True, time.monotonic() - start)
+        else:
+            health.record_empty()
+        return result
+    return tracked
+
+
+def track_async(source_name, func, is_valid, claim=True):
+    """同 track，包裝 async 資料來源函式（無參數、回傳 coroutine），供非同步引擎使用"""
+    async def tracked():
+        health = get_health(source_name)
+        if claim and not health.allow():
+            raise SourceUnavailable(f"{source_name} 斷路中")
+        start = time.monotonic()
+        try:
+            result = await func()
+        except Exception:
+            health.record(False, time.monotonic() - start)
+            raise
+        if is_valid(result):
+            health.record(True, time.monotonic() - start)
+        else:
+            health.record_empty()
+        return result
+    return tracked
+
+
+def _rank_sources(data_sources):
+    """
+    依健康度排序資料來源並跳過斷路中的來源
+    :return: [(來源名稱, 函式, 是否經斷路器放行)]
+    """
+    ranked = []
+    for index, (source_name, func) in enumerate(data_sources):
+        health = get_health(source_name)
+        if not health.available():
+            print(f"⏭️ 跳過斷路中的資料來源: {source_name}")
+            continue
+        cost = health.expected_cost()
+        # 樣本不足的來源以預設耗時估計，同分時維持預設順序
+        ranked.append(((HEALTH_CONFIG['prior_cost'] if cost is None else cost, index), source_name, func))
+
+    if not ranked and data_sources:
+        # 全部斷路時仍保留首選來源（不經斷路器放行），避免請求完全沒有機會成功
+        source_name, func = data_sources[0]
+        return [(source_name, func, False)]
+
+    ranked.sort(key=lambda item: item[0])
+    return [(source_name, func, True) for _, source_name, func in ranked]
+
+
+def order_sources(data_sources, is_valid):
+    """
+    依健康度動態排序資料來源，並跳過斷路中的來源
+    :param data_sources: [(來源名稱, 無參數函式), ...]，依預設優先順序排列
+    :param is_valid: 判斷結果是否有效的函式（用於記錄成功率）
+    :return: 排序後且已包裝追蹤的資料來源列表（半開來源的試探請求在實際呼叫時才佔用）
+    """
+    return [(source_name, track(source_name, func, is_valid, claim=claim))
+            for source_name, func, claim in _rank_sources(data_sources)]
+
+
+def order_sources_async(data_sources, is_valid):
+    """同 order_sources，資料來源為無參數的 async 函式（與同步路徑共用同一組健康度與斷路器）"""
+    return [(source_name, track_async(source_name, func, is_valid, claim=claim))
+            for source_name, func, claim in _rank_sources(data_sources)]
+
+
+def get_source_health_report():
+    """取得所有資料來源的健康度摘要"""
+    with _registry_lock:
+        sources = list(_registry.values())
+    return {health.name: health.snapshot() for health in sources}
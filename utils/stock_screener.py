@@ -1,46 +1,43 @@
-import requests
-import json
 import os
 import time
-import random
-from datetime import datetime, timedelta
-from utils.twse import get_stock_basic_info, get_stock_chart_data, HEADERS, CONFIG
-try:
-    import numpy as np
-except ImportError:
-    np = None
-try:
-    import pandas as pd
-except ImportError:
-    pd = None
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from utils.twse import (
+    get_stock_basic_info, get_stock_chart_data, fetch_realtime_quotes, sync_price_history, history_is_current, has_valid_price
+)
+from utils.twse_async import resolve_stocks, resolve_charts
+from utils.cache import analysis as analysis_cache, quotes as quote_cache, fingerprint
+from utils.price_history import get_history_store
+from utils.trading_calendar import TAIPEI_TZ, in_session_window, now_taipei
+from utils.indicators import compute_indicators, build_price_matrix, indicators_for_row, is_available as indicators_available
+from utils.indicator_state import MACD, get_symbol_state, update_symbol
+from utils.screener_table import get_screener_table
+from utils.symbols import all_symbols, lookup_name
 
 class StockScreener:
     """股票選股器 - 基於技術指標進行選股分析"""
     
+    # 分析結果用到的基本資訊欄位（計算輸入指紋用）
+    BASIC_INPUT_FIELDS = ('股票名稱', '成交量')
+    
     def __init__(self):
         self.cache_dir = 'cache'
         os.makedirs(self.cache_dir, exist_ok=True)
         
-        # 台股常見股票池（優化版 - 更小但更穩定的股票池）
-        self.stock_pool = [
-            # 核心大型股（流動性好，數據穩定）
-            '2330', '2317', '2454', '2412', '2882', '2308', '2303', '2891',
-            '2886', '6505', '2395', '2207', '3008', '2881', '2892', '1303',
-            
-            # 主要ETF（數據穩定，適合篩選）
-            '0050', '0056', '006208', '00878', '00919', '00881',
-            
-            # 知名科技股
-            '2376', '3034', '2379', '6446', '3443', '6415', '2408',
-            
-            # 穩定傳產股
-            '1216', '2609', '2201', '1102', '2104', '2204', '2618'
-        ]
-        
-        # 快取設定
-        self.cache_timeout = 300  # 5分鐘快取
+        # 分析結果快取於 analysis namespace（TTL 見 utils.cache.NAMESPACE_POLICIES），
+        # 並記錄輸入資料的指紋：輸入變動才重新計算，未變動則延長快取
         self.max_retries = 3
-        self.request_delay = 1  # 請求間隔1秒
+        self.request_delay = 1  # 重試前的等待基準（秒）
+        self.max_workers = 8    # 同時補齊日線歷史的股票數
+        
+        # 非同步預先取得的圖表資料 {(股票代碼, 天數): 圖表資料}
+        self.prefetched_charts = {}
+        
+        # 全市場指標表的代碼索引 (表格, {股票代碼: 資料列})，表格重新載入後重建
+        self._table_index = None
+        
+        # 是否已計算過指標表：第一次以向量化整批計算，之後以增量指標狀態更新
+        self.table_built = False
     
     def calculate_rsi(self, prices, period=14):
         """計算RSI指標 - 適應性版本"""
@@ -89,20 +86,10 @@ class StockScreener:
         try:
             # 簡化的MACD計算，適用於較少的資料點
             if len(prices) >= 12:
-                # 使用標準MACD
-                def ema(data, period):
-                    multiplier = 2 / (period + 1)
-                    ema_values = [data[0]]
-                    for price in data[1:]:
-                        ema_values.append((price * multiplier) + (ema_values[-1] * (1 - multiplier)))
-                    return ema_values
-                
-                ema12 = ema(prices, min(12, len(prices) // 2))
-                ema26 = ema(prices, min(26, len(prices) - 1))
-                
-                macd_line = ema12[-1] - ema26[-1]
-                signal_line = macd_line * 0.8  # 簡化signal計算
-                histogram = macd_line - signal_line
+                # 使用標準MACD（signal 為 MACD 線的 9 期 EMA）
+                macd = MACD()
+                for price in prices:
+                    macd_line, signal_line, histogram = macd.update(price)
                 
                 return round(macd_line, 3), round(signal_line, 3), round(histogram, 3)
             else:
@@ -173,12 +160,16 @@ class StockScreener:
         try:
             print(f"📊 分析股票: {stock_code}")
             
+            # 全市場指標表已包含時直接使用排程計算好的資料列（不向上游發出請求）
+            row = self.table_row(stock_code)
+            if row:
+                return row
+            
             # 檢查快取
-            cache_key = f"analysis_{stock_code}"
-            cached_analysis = self.get_cache(cache_key)
-            if cached_analysis:
+            cached_entry, needs_check = self.get_cached_analysis(stock_code)
+            if cached_entry and not needs_check:
                 print(f"✅ 使用快取分析: {stock_code}")
-                return cached_analysis
+                return cached_entry['analysis']
             
             # 延遲請求避免過於頻繁
             if retries > 0:
@@ -201,6 +192,13 @@ class StockScreener:
                 print(f"❌ 資料點不足: {stock_code} ({len(data_points)} 點)")
                 return None
             
+            # 輸入資料與上次分析相同時沿用結果並延長快取
+            inputs = self.input_fingerprints(basic_info, chart_data)
+            if cached_entry and cached_entry['inputs'] == inputs:
+                print(f"♻️ 輸入資料未變動，延長分析快取: {stock_code}")
+                analysis_cache.set(stock_code, cached_entry)
+                return cached_entry['analysis']
+            
             # 解析價格資料
             prices = []
             for item in data_points:
@@ -225,11 +223,16 @@ class StockScreener:
                 'analysis_time': datetime.now().isoformat()
             }
             
-            # 計算價格變化（安全版本）
-            analysis.update(self.calculate_price_changes(prices))
-            
-            # 計算技術指標（安全版本）
-            analysis.update(self.calculate_technical_indicators(prices))
+            # 以增量指標狀態計算（只加入新收盤的日線），無法使用時整段重算
+            streamed = self.calculate_streaming_indicators(stock_code, data_points)
+            if streamed:
+                analysis.update(streamed)
+            else:
+                # 計算價格變化（安全版本）
+                analysis.update(self.calculate_price_changes(prices))
+                
+                # 計算技術指標（安全版本）
+                analysis.update(self.calculate_technical_indicators(prices))
             
             # 解析成交量
             analysis['volume'] = self.parse_volume(basic_info.get('成交量', '0'))
@@ -238,8 +241,8 @@ class StockScreener:
             analysis['signals'] = self.generate_signals(analysis)
             analysis['score'] = self.calculate_score(analysis)
             
-            # 儲存快取
-            self.save_cache(cache_key, analysis)
+            # 儲存快取（連同輸入指紋）
+            analysis_cache.set(stock_code, {'analysis': analysis, 'inputs': inputs})
             
             print(f"✅ 成功分析: {stock_code} (評分: {analysis['score']})")
             return analysis
@@ -255,6 +258,40 @@ class StockScreener:
             
             return None
     
+    def table_row(self, stock_code):
+        """全市場指標表中該股票的資料列，表格尚未建立或不包含該股票時回傳 None"""
+        table = get_screener_table()
+        if not table:
+            return None
+        if self._table_index is None or self._table_index[0] is not table:
+            self._table_index = (table, {row['stock_code']: row for row in table.get('rows', [])})
+        return self._table_index[1].get(stock_code)
+    
+    def input_fingerprints(self, basic_info, chart_data):
+        """分析輸入的指紋：基本資訊只取分析用到的欄位，圖表取每個資料點的時間與價格"""
+        return {
+            'basic': fingerprint([basic_info.get(field) for field in self.BASIC_INPUT_FIELDS]),
+            'chart': fingerprint([(item.get('timestamp'), item.get('price')) for item in chart_data.get('data', [])]),
+        }
+    
+    def get_cached_analysis(self, stock_code):
+        """
+        讀取分析快取並判斷是否需要比對輸入
+        :return: (快取項目 {'analysis', 'inputs'} 或 None, 是否需要取得輸入重新比對)
+        """
+        entry, is_stale = analysis_cache.get_entry(stock_code)
+        if not entry or 'inputs' not in entry:
+            return None, True
+        if is_stale:
+            return entry, True
+        # 未到期但快取中的報價已更新時提前失效（只讀快取，不發出上游請求）
+        cached_basic = quote_cache.get(stock_code)
+        if cached_basic and not cached_basic.get('錯誤'):
+            basic_print = fingerprint([cached_basic.get(field) for field in self.BASIC_INPUT_FIELDS])
+            if basic_print != entry['inputs']['basic']:
+                return entry, True
+        return entry, False
+    
     def get_stock_info_with_retry(self, stock_code):
         """帶重試機制的股票資訊獲取"""
         for attempt in range(self.max_retries):
@@ -270,6 +307,10 @@ class StockScreener:
     
     def get_chart_data_with_retry(self, stock_code, days):
         """帶重試機制的圖表資料獲取"""
+        prefetched = self.prefetched_charts.pop((stock_code, days), None)
+        if prefetched and prefetched.get('success'):
+            return prefetched
+        
         for attempt in range(self.max_retries):
             try:
                 if attempt > 0:
@@ -281,6 +322,23 @@ class StockScreener:
                     return None
         return None
     
+    def prefetch(self, stock_codes, days=14):
+        """以非同步引擎同時取得多檔股票的基本資訊（寫入快取）與圖表資料"""
+        # 分析快取仍有效者不需預先取得
+        cached = analysis_cache.get_many(stock_codes)
+        pending = [code for code in stock_codes if code not in cached or cached[code][1]]
+        if not pending:
+            return
+        
+        try:
+            print(f"⚡ 同時預先取得 {len(pending)} 支股票的報價與圖表...")
+            resolve_stocks(pending)
+            for code, chart_data in resolve_charts(pending, days).items():
+                if chart_data:
+                    self.prefetched_charts[(code, days)] = chart_data
+        except Exception as e:
+            print(f"⚠️ 預先取得資料失敗，改為逐檔查詢: {e}")
+    
     def calculate_price_changes(self, prices):
         """計算價格變化 - 安全版本"""
         changes = {}
@@ -305,8 +363,59 @@ class StockScreener:
         
         return changes
     
+    # 全市場指標表：第一次計算（向量化整批）與指標狀態第一次建立時載入最近 TABLE_HISTORY_BARS 根日線（約一年），
+    # 之後只加入新收盤的日線；資料點少於 TABLE_MIN_BARS 者不列入
+    TABLE_HISTORY_BARS = 250
+    TABLE_HISTORY_DAYS = 30  # 未安裝 NumPy（沒有日線歷史）時改讀的圖表天數（圖表 API 日線最多約一個月）
+    TABLE_MIN_BARS = 5
+    
+    # 技術指標欄位（calculate_technical_indicators 的輸出）
+    INDICATOR_FIELDS = ('rsi', 'macd', 'signal', 'histogram', 'ma5', 'ma10', 'ma20', 'ma60',
+                        'bb_upper', 'bb_middle', 'bb_lower')
+    
+    def calculate_indicators_batch(self, price_series):
+        """
+        以向量化計算一次取得多檔股票的技術指標與漲跌幅（需要 NumPy）
+        :param price_series: 價格序列的列表（由舊到新）
+        :return: 與輸入順序相同的指標 dict 列表
+        """
+        result = compute_indicators(build_price_matrix(price_series))
+        return [indicators_for_row(result, row) for row in range(len(price_series))]
+    
+    def calculate_streaming_indicators(self, stock_code, data_points):
+        """
+        以每檔股票保留的增量指標狀態計算技術指標與漲跌幅
+        已收盤的日線只在第一次出現時加入狀態；最後一點（盤中即時價格）只試算，不重算整段歷史
+        :return: 漲跌幅與 INDICATOR_FIELDS 的 dict，失敗時回傳 None
+        """
+        try:
+            points = []
+            for item in data_points:
+                try:
+                    price = float(item['price'])
+                    timestamp = int(item['timestamp'])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if price > 0 and (not points or timestamp > points[-1]['timestamp']):
+                    points.append({'timestamp': timestamp, 'price': price})
+            values = update_symbol(stock_code, points)
+            if not values:
+                return None
+            fields = ('price_change_1d', 'price_change_5d', 'price_change_20d') + self.INDICATOR_FIELDS
+            return {field: values[field] for field in fields}
+        except Exception as e:
+            print(f"⚠️ 增量指標計算失敗，改用整段計算: {e}")
+            return None
+    
     def calculate_technical_indicators(self, prices):
-        """計算技術指標 - 安全版本"""
+        """計算技術指標 - 安全版本（有 NumPy 時使用向量化計算）"""
+        if indicators_available() and prices:
+            try:
+                values = self.calculate_indicators_batch([prices])[0]
+                return {field: values[field] for field in self.INDICATOR_FIELDS}
+            except Exception as e:
+                print(f"⚠️ 向量化指標計算失敗，改用逐項計算: {e}")
+        
         indicators = {}
         
         try:
@@ -362,35 +471,6 @@ class StockScreener:
         except:
             return 0
     
-    def get_cache(self, key):
-        """獲取快取資料"""
-        cache_file = os.path.join(self.cache_dir, f"{key}.json")
-        try:
-            if os.path.exists(cache_file):
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    cache_data = json.load(f)
-                
-                # 檢查快取是否過期
-                cache_time = datetime.fromisoformat(cache_data['timestamp'])
-                if datetime.now() - cache_time < timedelta(seconds=self.cache_timeout):
-                    return cache_data['data']
-        except Exception as e:
-            print(f"❌ 讀取快取失敗: {e}")
-        return None
-    
-    def save_cache(self, key, data):
-        """儲存快取資料"""
-        cache_file = os.path.join(self.cache_dir, f"{key}.json")
-        try:
-            cache_data = {
-                'timestamp': datetime.now().isoformat(),
-                'data': data
-            }
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"❌ 儲存快取失敗: {e}")
-    
     def generate_signals(self, analysis):
         """基於技術指標產生投資信號"""
         signals = []
@@ -499,71 +579,228 @@ class StockScreener:
         
         return max(0, min(100, score))
     
-    def screen_stocks(self, criteria=None):
-        """執行股票篩選 - 優化版"""
-        if criteria is None:
-            criteria = {
-                'min_rsi': 0,    # 放寬條件
-                'max_rsi': 100,  # 放寬條件
-                'min_score': 40, # 降低最低評分
-                'price_trend': 'any',
-                'volume_filter': False
+    def universe(self):
+        """選股範圍：股票代碼主檔中的所有上市櫃股票與 ETF"""
+        return sorted(symbol['code'] for symbol in all_symbols())
+    
+    def table_quotes(self, stock_codes):
+        """
+        指標表用的盤中報價：先讀報價快取，其餘只以證交所即時報價批次請求取得（不逐檔查詢）
+        非盤中（含收盤定稿後）不取報價，一律使用日線歷史的收盤價
+        :return: dict {股票代碼: 股票資訊}
+        """
+        if not in_session_window():
+            return {}
+        quotes = {code: data for code, (data, is_stale) in quote_cache.get_many(stock_codes).items()
+                  if not is_stale and has_valid_price(data)}
+        pending = [code for code in stock_codes if code not in quotes]
+        if pending:
+            quotes.update(fetch_realtime_quotes(pending))
+        return quotes
+    
+    def quote_price(self, quote):
+        """報價中的股價（即時股價，沒有成交時用收盤價），無法解析時回傳 None"""
+        for field in ('即時股價', '收盤價'):
+            try:
+                price = float(str((quote or {}).get(field, '')).replace(',', ''))
+            except ValueError:
+                continue
+            if price > 0:
+                return price
+        return None
+    
+    def table_indicators(self, store, stock_code, quote):
+        """
+        以股票的增量指標狀態計算指標表的一列：只加入狀態中還沒有的已收盤日線（O(新日線數)），
+        報價的股價若是日線歷史之後的交易日則以「若以此價收盤」試算，否則使用最近收盤價
+        :return: (指標 dict, 成交量（張）)，沒有日線歷史時回傳 (None, 0)
+        """
+        state = get_symbol_state(stock_code)
+        with state.lock:
+            if state.last_timestamp is None:
+                bars = store.tail(stock_code, self.TABLE_HISTORY_BARS)
+            else:
+                bars = store.read(stock_code, start=state.last_timestamp + 1)
+            for timestamp, close in zip(bars['date'].tolist(), bars['close'].tolist()):
+                state.add_bar(close, int(timestamp))
+            if state.last_timestamp is None:
+                return None, 0
+            
+            last_day = datetime.fromtimestamp(state.last_timestamp, TAIPEI_TZ).date()
+            live_price = self.quote_price(quote) if last_day < now_taipei().date() else None
+            values = state.snapshot(live_price)
+        
+        if live_price is not None:
+            volume = self.parse_volume(quote.get('成交量', '0'))
+        else:
+            last_bar = store.tail(stock_code, 1)
+            volume = int(last_bar['volume'][0]) // 1000 if len(last_bar['volume']) else 0  # 股 → 張
+        return values, volume
+    
+    def table_batch_indicators(self, store, stock_codes, quotes):
+        """
+        第一次計算指標表：讀取每檔股票最近 TABLE_HISTORY_BARS 根日線排成價格矩陣，以向量化一次計算所有股票；
+        報價的股價若是日線歷史之後的交易日則接在序列最後試算（同 table_indicators）
+        :return: {股票代碼: (指標 dict, 成交量（張）)}，沒有日線歷史的股票不列入
+        """
+        today = now_taipei().date()
+        codes, series, volumes = [], [], []
+        for stock_code in stock_codes:
+            bars = store.tail(stock_code, self.TABLE_HISTORY_BARS)
+            closes = bars['close'].tolist()
+            if not closes:
+                continue
+            quote = quotes.get(stock_code)
+            last_day = datetime.fromtimestamp(int(bars['date'][-1]), TAIPEI_TZ).date()
+            live_price = self.quote_price(quote) if last_day < today else None
+            if live_price is not None:
+                closes.append(live_price)
+                volumes.append(self.parse_volume(quote.get('成交量', '0')))
+            else:
+                volumes.append(int(bars['volume'][-1]) // 1000)  # 股 → 張
+            codes.append(stock_code)
+            series.append(closes)
+        if not series:
+            return {}
+        return dict(zip(codes, zip(self.calculate_indicators_batch(series), volumes)))
+    
+    def chart_indicators(self, stock_code, chart_data, quote):
+        """未安裝 NumPy 時：以圖表資料更新股票的增量指標狀態（最後一點為目前價格）"""
+        if not chart_data or not chart_data.get('success'):
+            return None, 0
+        points = []
+        for item in chart_data.get('data', []):
+            try:
+                price = float(item['price'])
+                timestamp = int(item['timestamp'])
+            except (ValueError, KeyError, TypeError):
+                continue
+            if price > 0 and (not points or timestamp > points[-1]['timestamp']):
+                points.append({'timestamp': timestamp, 'price': price})
+        return update_symbol(stock_code, points), self.parse_volume((quote or {}).get('成交量', '0'))
+    
+    def build_screening_table(self, stock_codes=None):
+        """
+        計算全市場選股指標表（由排程工作執行，見 utils.screener_table）
+        日線歷史尚未補齊者先同時補齊；第一次計算以價格矩陣向量化整批計算，
+        之後每檔股票的指標狀態只加入新收盤的日線，
+        盤中以證交所即時報價批次請求的股價試算，沒有即時報價者使用最近收盤價
+        :return: 分析結果列表
+        """
+        stock_codes = stock_codes or self.universe()
+        started = time.time()
+        print(f"📋 開始計算選股指標表 {len(stock_codes)} 支股票...")
+        
+        store = get_history_store()
+        if store is not None:
+            # 只有日線歷史尚未包含最近定稿交易日的股票需要向上游補齊
+            pending = [stock_code for stock_code in stock_codes if not history_is_current(stock_code)]
+            if pending:
+                with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='screener-history') as executor:
+                    list(executor.map(sync_price_history, pending))
+        else:
+            # 沒有日線歷史：以非同步引擎同時取得所有股票的圖表資料
+            print("⚠️ 未安裝 NumPy，選股指標表改由圖表資料計算")
+            charts = resolve_charts(stock_codes, self.TABLE_HISTORY_DAYS)
+        
+        quotes = self.table_quotes(stock_codes)
+        batch = None
+        if store is not None and not self.table_built:
+            try:
+                batch = self.table_batch_indicators(store, stock_codes, quotes)
+            except Exception as e:
+                print(f"⚠️ 向量化指標計算失敗，改用增量指標狀態: {e}")
+        
+        analysis_time = datetime.now().isoformat()
+        fields = ('price_change_1d', 'price_change_5d', 'price_change_20d') + self.INDICATOR_FIELDS
+        rows = []
+        for stock_code in stock_codes:
+            quote = quotes.get(stock_code)
+            try:
+                if batch is not None:
+                    values, volume = batch.get(stock_code, (None, 0))
+                elif store is not None:
+                    values, volume = self.table_indicators(store, stock_code, quote)
+                else:
+                    values, volume = self.chart_indicators(stock_code, charts.get(stock_code), quote)
+            except Exception as e:
+                print(f"❌ 計算指標失敗 {stock_code}: {e}")
+                continue
+            if not values or values['bars'] < self.TABLE_MIN_BARS:
+                continue
+            
+            analysis = {
+                'stock_code': stock_code,
+                'stock_name': (quote or {}).get('股票名稱') or lookup_name(stock_code) or stock_code,
+                'current_price': round(values['current_price'], 2),
+                'analysis_time': analysis_time
             }
+            analysis.update({field: values[field] for field in fields})
+            analysis['volume'] = volume
+            analysis['signals'] = self.generate_signals(analysis)
+            analysis['score'] = self.calculate_score(analysis)
+            if self.is_valid_analysis(analysis):
+                rows.append(analysis)
         
+        self.table_built = True
+        print(f"✅ 選股指標表計算完成: {len(rows)}/{len(stock_codes)} 支（{time.time() - started:.1f} 秒）")
+        return rows
+    
+    # 未指定條件時的預設篩選條件
+    DEFAULT_CRITERIA = {
+        'min_rsi': 0,    # 放寬條件
+        'max_rsi': 100,  # 放寬條件
+        'min_score': 40, # 降低最低評分
+        'price_trend': 'any',
+        'volume_filter': False
+    }
+    
+    def iter_screening(self, criteria=None, progress_every=None):
+        """
+        逐步篩選全市場指標表，每找到一支符合條件的股票就立即產生結果（串流回應用）
+        :param progress_every: 每處理幾支股票產生一次進度，預設約每 5%
+        :return: 產生 (事件, 資料) 的 generator：
+                 ('progress', {'processed', 'total', 'matched'})、('match', 分析結果)、
+                 ('done', {'results': 依評分排序的結果, 'total', 'matched', 'built_at'})
+        """
         # 確保條件合理
-        criteria = self.validate_criteria(criteria)
+        criteria = self.validate_criteria(criteria or self.DEFAULT_CRITERIA)
         
-        results = []
-        processed = 0
-        errors = 0
+        # 只篩選排程預先計算的全市場指標表（請求期間不向上游發出請求）
+        table = get_screener_table()
+        rows = table['rows'] if table else []
+        if not table:
+            print("⚠️ 選股指標表尚未建立，請稍後再試")
         
-        print(f"🔍 開始篩選 {len(self.stock_pool)} 支股票...")
+        total = len(rows)
+        step = progress_every or max(1, total // 20)
+        print(f"🔍 開始篩選 {total} 支股票...")
         print(f"📋 篩選條件: RSI({criteria['min_rsi']}-{criteria['max_rsi']}), 最低評分({criteria['min_score']})")
         
-        # 隨機打亂股票順序，避免總是從同樣的股票開始
-        import random
-        shuffled_stocks = self.stock_pool.copy()
-        random.shuffle(shuffled_stocks)
-        
-        for stock_code in shuffled_stocks:
-            try:
-                # 添加處理進度
-                if processed % 3 == 0:
-                    print(f"📊 已處理 {processed}/{len(self.stock_pool)} 支股票，找到 {len(results)} 支符合條件")
-                
-                analysis = self.analyze_stock(stock_code)
-                processed += 1
-                
-                if analysis:
-                    # 先檢查基本有效性
-                    if self.is_valid_analysis(analysis):
-                        # 再檢查是否符合篩選條件
-                        if self.meets_criteria(analysis, criteria):
-                            results.append(analysis)
-                            print(f"✅ 找到符合條件股票: {stock_code} ({analysis['stock_name']}) - 評分: {analysis['score']}")
-                            
-                            # 如果已經找到足夠的結果，可以提前結束
-                            if len(results) >= 20:
-                                print(f"🎯 已找到 {len(results)} 支股票，提前結束篩選")
-                                break
-                else:
-                    errors += 1
-                
-                # 減少延遲
-                time.sleep(0.2)
-                
-            except Exception as e:
-                print(f"❌ 處理 {stock_code} 時發生錯誤: {e}")
-                errors += 1
-                continue
+        results = []
+        yield 'progress', {'processed': 0, 'total': total, 'matched': 0}
+        for processed, analysis in enumerate(rows, 1):
+            if self.is_valid_analysis(analysis) and self.meets_criteria(analysis, criteria):
+                results.append(analysis)
+                yield 'match', analysis
+            if processed % step == 0 or processed == total:
+                yield 'progress', {'processed': processed, 'total': total, 'matched': len(results)}
         
         # 依照評分排序
-        if results:
-            results.sort(key=lambda x: x.get('score', 0), reverse=True)
+        results.sort(key=lambda x: x.get('score', 0), reverse=True)
+        yield 'done', {'results': results, 'total': total, 'matched': len(results),
+                       'built_at': table['built_at'] if table else None}
+    
+    def screen_stocks(self, criteria=None):
+        """執行股票篩選 - 篩選全市場指標表（見 build_screening_table）"""
+        results = []
+        total = 0
+        for event, data in self.iter_screening(criteria):
+            if event == 'done':
+                results, total = data['results'], data['total']
         
-        print(f"✅ 篩選完成！")
-        print(f"📊 處理股票: {processed} 支")
-        print(f"❌ 錯誤數量: {errors} 支") 
+        print("✅ 篩選完成！")
+        print(f"📊 處理股票: {total} 支")
         print(f"🎯 符合條件: {len(results)} 支")
         
         # 如果結果太少，提供建議
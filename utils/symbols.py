@@ -0,0 +1,295 @@
+"""
+本地股票代碼主檔（symbol master）
+記錄代碼、中文名稱、英文名稱、市場（上市 TSE / 上櫃 OTC）與類型（股票 / ETF），
+啟動時載入記憶體一次，代碼與名稱皆為 O(1) 查詢；由證交所 ISIN 清單批次更新，查詢路徑不發出任何網路請求。
+"""
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+from utils.http_client import http_get
+
+# 主檔設定
+SYMBOL_CONFIG = {
+    'master_file': os.path.join('instance', 'symbol_master.json'),
+    'refresh_days': 1,  # 主檔多久批次更新一次
+    'retry_interval': 1800,  # 批次更新失敗後再次嘗試的間隔（秒）
+    # 證交所 ISIN 公開清單：strMode=2 上市、strMode=4 上櫃
+    'isin_url': 'https://isin.twse.com.tw/isin/C_public.jsp',
+    'isin_modes': {'TSE': 2, 'OTC': 4},
+    # 公司基本資料（英文簡稱）
+    'english_urls': {
+        'TSE': 'https://openapi.twse.com.tw/v1/opendata/t187ap03_L',
+        'OTC': 'https://www.tpex.org.tw/openapi/v1/mopsfe_t187ap03_O',
+    },
+}
+
+TSE = 'TSE'
+OTC = 'OTC'
+STOCK = 'stock'
+ETF = 'ETF'
+
+# ISIN 清單中的分類標題對應的證券類型，其餘分類（權證、特別股、債券等）不收錄
+_ISIN_SECTIONS = {
+    '股票': STOCK,
+    'ETF': ETF,
+    '臺灣存託憑證': STOCK,
+    '臺灣存託憑證(TDR)': STOCK,
+}
+
+# 主檔尚未下載時的基本資料
+SEED_SYMBOLS = [
+    ('2330', '台積電', 'TSMC', TSE, STOCK),
+    ('2317', '鴻海', 'HON HAI', TSE, STOCK),
+    ('2454', '聯發科', 'MEDIATEK', TSE, STOCK),
+    ('2412', '中華電', 'CHT', TSE, STOCK),
+    ('2882', '國泰金', 'CATHAY FHC', TSE, STOCK),
+    ('2881', '富邦金', 'FUBON FHC', TSE, STOCK),
+    ('2308', '台達電', 'DELTA', TSE, STOCK),
+    ('2303', '聯電', 'UMC', TSE, STOCK),
+    ('0050', '元大台灣50', '', TSE, ETF),
+    ('0056', '元大高股息', '', TSE, ETF),
+    ('006208', '富邦台50', '', TSE, ETF),
+    ('00878', '國泰永續高股息', '', TSE, ETF),
+    ('00919', '群益台灣精選高息', '', TSE, ETF),
+]
+
+_symbols = None   # {代碼: 主檔資料}
+_names = None     # {名稱（中文 / 英文大寫）: 代碼}
+_timestamp = None  # 目前載入的主檔時間戳記（只有內建基本資料時為 None）
+_mtime = None      # 目前載入的主檔檔案修改時間
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_refresh_failed_at = None  # 最近一次批次更新失敗的 monotonic 時間
+
+
+def _make_symbol(code, name, en_name='', market=TSE, sec_type=STOCK):
+    return {'code': code, 'name': name, 'en_name': en_name, 'market': market, 'type': sec_type}
+
+
+def _index(symbols):
+    """建立名稱反查索引"""
+    names = {}
+    for code, symbol in symbols.items():
+        if symbol.get('name'):
+            names.setdefault(symbol['name'], code)
+        if symbol.get('en_name'):
+            names.setdefault(symbol['en_name'].upper(), code)
+    return names
+
+
+def _read_master():
+    """
+    讀取本地主檔檔案（以內建基本資料為底）
+    :return: (主檔 dict, 主檔時間戳記, 檔案修改時間)，檔案不存在時時間戳記與修改時間為 None
+    """
+    symbols = {code: _make_symbol(code, name, en_name, market, sec_type)
+               for code, name, en_name, market, sec_type in SEED_SYMBOLS}
+    timestamp = mtime = None
+    try:
+        mtime = os.path.getmtime(SYMBOL_CONFIG['master_file'])
+        with open(SYMBOL_CONFIG['master_file'], 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for symbol in data.get('symbols', []):
+            symbols[symbol['code']] = symbol
+        timestamp = data.get('timestamp')
+    except FileNotFoundError:
+        print("⚠️ 尚未建立股票代碼主檔，使用內建基本資料")
+    except Exception as e:
+        print(f"❌ 讀取股票代碼主檔失敗: {e}")
+    return symbols, timestamp, mtime
+
+
+def _install(symbols, timestamp, mtime):
+    """以新字典整批替換主檔（呼叫端需持有 _lock），查詢端不需加鎖"""
+    global _symbols, _names, _timestamp, _mtime
+    _names = _index(symbols)
+    _timestamp, _mtime = timestamp, mtime
+    _symbols = symbols
+
+
+def _load():
+    """從本地檔案載入主檔（僅在首次查詢時執行）"""
+    with _lock:
+        if _symbols is not None:
+            return
+        _install(*_read_master())
+
+
+def get_symbol(stock_code):
+    """
+    查詢股票主檔資料
+    :return: {'code', 'name', 'en_name', 'market', 'type'}，查無資料時為 None
+    """
+    if _symbols is None:
+        _load()
+    return _symbols.get(stock_code)
+
+
+def lookup_name(stock_code):
+    """代碼查中文名稱，查無資料時回傳 None"""
+    symbol = get_symbol(stock_code)
+    return symbol['name'] if symbol else None
+
+
+def lookup_code(name):
+    """中文或英文名稱查代碼，查無資料時回傳 None"""
+    if _names is None:
+        _load()
+    name = (name or '').strip()
+    return _names.get(name) or _names.get(name.upper())
+
+
+def get_market(stock_code):
+    """股票所屬市場（TSE / OTC），查無資料時視為上市"""
+    symbol = get_symbol(stock_code)
+    return symbol['market'] if symbol else TSE
+
+
+def all_symbols(market=None, sec_type=None):
+    """列出主檔中的所有股票，可依市場與類型篩選"""
+    if _symbols is None:
+        _load()
+    return [symbol for symbol in _symbols.values()
+            if (market is None or symbol['market'] == market)
+            and (sec_type is None or symbol['type'] == sec_type)]
+
+
+def _strip_tags(html):
+    return re.sub(r'<[^>]+>', '', html).replace('&nbsp;', ' ').strip()
+
+
+def _parse_isin_page(html, market):
+    """解析證交所 ISIN 清單頁面（代碼與名稱以全形空白分隔，依分類標題決定類型）"""
+    symbols = {}
+    sec_type = None
+    for row in re.findall(r'<tr[^>]*>(.*?)</tr>', html, flags=re.S | re.I):
+        cells = [_strip_tags(cell) for cell in re.findall(r'<td[^>]*>(.*?)</td>', row, flags=re.S | re.I)]
+        if len(cells) == 1:
+            # 分類標題列
+            sec_type = _ISIN_SECTIONS.get(cells[0].strip())
+            continue
+        if sec_type is None or not cells:
+            continue
+        parts = re.split(r'[　\s]+', cells[0], maxsplit=1)
+        if len(parts) == 2 and parts[0].isalnum():
+            symbols[parts[0]] = _make_symbol(parts[0], parts[1].strip(), '', market, sec_type)
+    return symbols
+
+
+def _fetch_english_names(market):
+    """下載公司英文簡稱 {代碼: 英文簡稱}（ETF 不在此資料中）"""
+    names = {}
+    try:
+        response = http_get(SYMBOL_CONFIG['english_urls'][market], timeout=20)
+        if response.status_code == 200:
+            for row in response.json():
+                code = row.get('公司代號') or row.get('SecuritiesCompanyCode')
+                en_name = row.get('英文簡稱') or row.get('Symbol') or row.get('EnglishAbbreviation')
+                if code and en_name:
+                    names[str(code).strip()] = str(en_name).strip()
+    except Exception as e:
+        print(f"⚠️ 無法下載 {market} 英文名稱: {e}")
+    return names
+
+
+def refresh_symbols():
+    """
+    從交易所清單批次更新主檔並寫入本地檔案（同時只會有一個執行緒下載）
+    :return: 更新後的股票數量（下載失敗時為 0，保留原主檔）
+    """
+    with _refresh_lock:
+        return _download_symbols()
+
+
+def _download_symbols():
+    global _refresh_failed_at
+    symbols = {}
+    for market, mode in SYMBOL_CONFIG['isin_modes'].items():
+        try:
+            response = http_get(SYMBOL_CONFIG['isin_url'], params={'strMode': mode}, timeout=30)
+            if response.status_code != 200:
+                continue
+            response.encoding = 'cp950'
+            listed = _parse_isin_page(response.text, market)
+            english = _fetch_english_names(market)
+            for code, symbol in listed.items():
+                symbol['en_name'] = english.get(code, '')
+            symbols.update(listed)
+            print(f"📋 {market} 清單: {len(listed)} 檔")
+        except Exception as e:
+            print(f"❌ 下載 {market} 股票清單失敗: {e}")
+
+    if not symbols:
+        _refresh_failed_at = time.monotonic()
+        return 0
+    _refresh_failed_at = None
+
+    timestamp = datetime.now().isoformat()
+    mtime = None
+    try:
+        os.makedirs(os.path.dirname(SYMBOL_CONFIG['master_file']), exist_ok=True)
+        tmp_file = SYMBOL_CONFIG['master_file'] + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'timestamp': timestamp, 'symbols': list(symbols.values())},
+                      f, ensure_ascii=False)
+        os.replace(tmp_file, SYMBOL_CONFIG['master_file'])
+        mtime = os.path.getmtime(SYMBOL_CONFIG['master_file'])
+    except Exception as e:
+        print(f"❌ 儲存股票代碼主檔失敗: {e}")
+
+    with _lock:
+        _install(symbols, timestamp, mtime)
+    print(f"✅ 股票代碼主檔已更新: {len(symbols)} 檔")
+    return len(symbols)
+
+
+def _is_outdated(timestamp):
+    try:
+        return datetime.now() - datetime.fromisoformat(timestamp) > timedelta(days=SYMBOL_CONFIG['refresh_days'])
+    except (TypeError, ValueError):
+        return True
+
+
+def symbols_outdated():
+    """主檔是否不存在或超過更新週期"""
+    try:
+        with open(SYMBOL_CONFIG['master_file'], 'r', encoding='utf-8') as f:
+            return _is_outdated(json.load(f)['timestamp'])
+    except Exception:
+        return True
+
+
+def symbols_timestamp():
+    """目前載入的主檔時間戳記（ISO 格式），只有內建基本資料時為 None；主檔更新後隨之改變"""
+    if _symbols is None:
+        _load()
+    return _timestamp
+
+
+def ensure_symbols():
+    """
+    確保記憶體中的主檔為最新（供需要完整主檔的排程工作在使用前呼叫）：
+    其他行程已更新主檔檔案時重新載入；主檔不存在或過期時批次更新（等待進行中的更新完成，
+    下載失敗後 retry_interval 內不再重試）
+    """
+    if _symbols is None:
+        _load()
+    with _refresh_lock:
+        try:
+            mtime = os.path.getmtime(SYMBOL_CONFIG['master_file'])
+        except OSError:
+            mtime = None
+        if mtime is not None and mtime != _mtime:
+            master = _read_master()
+            with _lock:
+                _install(*master)
+            print(f"📋 重新載入股票代碼主檔: {len(_symbols)} 檔")
+        retry_due = (_refresh_failed_at is None
+                     or time.monotonic() - _refresh_failed_at >= SYMBOL_CONFIG['retry_interval'])
+        if _is_outdated(_timestamp) and retry_due:
+            _download_symbols()
+    return _timestamp
@@ -0,0 +1,216 @@
+"""
+證交所交易日曆與快取有效期限（TTL）策略
+盤中（週一至週五 09:00-13:30，台北時間）使用短 TTL；收盤後、週末與休市日股價不會變動，
+快取一律有效到下一個開盤時間，讓非交易時段的上游請求幾乎歸零。
+"""
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone, time as dtime
+
+try:
+    from zoneinfo import ZoneInfo  # Python 3.9+
+    TAIPEI_TZ = ZoneInfo('Asia/Taipei')
+except Exception:
+    TAIPEI_TZ = timezone(timedelta(hours=8))  # 台灣無日光節約時間，固定 UTC+8
+
+from utils.http_client import http_get
+
+# 交易時段與 TTL 設定
+CALENDAR_CONFIG = {
+    'open_time': dtime(9, 0),
+    'close_time': dtime(13, 30),
+    'settle_minutes': 60,  # 收盤後仍視為盤中 TTL 的分鐘數（等待收盤價、成交量定稿）
+    'holiday_url': 'https://www.twse.com.tw/rwd/zh/holidaySchedule/holidaySchedule',
+    'holiday_cache_file': os.path.join('cache', 'twse_holidays.json'),
+    'holiday_refresh_days': 7,  # 休市日資料多久重新下載一次
+}
+
+# 證交所公告的休市日（不含週末），下載失敗時的備用資料
+DEFAULT_HOLIDAYS = {
+    # 2025
+    '2025-01-01', '2025-01-23', '2025-01-24', '2025-01-27', '2025-01-28', '2025-01-29',
+    '2025-01-30', '2025-01-31', '2025-02-28', '2025-04-03', '2025-04-04', '2025-05-01',
+    '2025-05-30', '2025-09-29', '2025-10-06', '2025-10-10', '2025-10-24', '2025-12-25',
+    # 2026
+    '2026-01-01', '2026-02-12', '2026-02-13', '2026-02-16', '2026-02-17', '2026-02-18',
+    '2026-02-19', '2026-02-20', '2026-02-27', '2026-04-03', '2026-04-06', '2026-05-01',
+    '2026-06-19', '2026-09-25', '2026-09-28', '2026-10-09', '2026-10-26', '2026-12-25',
+}
+
+_holidays = None
+_holidays_lock = threading.Lock()
+
+
+def now_taipei():
+    """目前的台北時間"""
+    return datetime.now(TAIPEI_TZ)
+
+
+def _to_taipei(now=None):
+    if now is None:
+        return now_taipei()
+    if now.tzinfo is None:
+        # 未帶時區的時間視為本機時間
+        now = now.astimezone()
+    return now.astimezone(TAIPEI_TZ)
+
+
+def _parse_holiday_schedule(data):
+    """從證交所休市日回應取出日期（民國年 115/01/01 或 20260101 等格式）"""
+    dates = set()
+    for row in data.get('data') or []:
+        if not row:
+            continue
+        # 休市日表也列出「開始交易」「最後交易」等交易日，需排除
+        name = str(row[1]) if len(row) > 1 else ''
+        if '開始交易' in name or '最後交易' in name:
+            continue
+        raw = str(row[0]).strip().replace('-', '/')
+        try:
+            if '/' in raw:
+                year, month, day = (int(part) for part in raw.split('/')[:3])
+                if year < 1911:
+                    year += 1911
+            else:
+                year, month, day = int(raw[:4]), int(raw[4:6]), int(raw[6:8])
+            dates.add(f"{year:04d}-{month:02d}-{day:02d}")
+        except (ValueError, IndexError):
+            continue
+    return dates
+
+
+def refresh_holidays(years=None):
+    """
+    從證交所下載休市日並存入本地檔案
+    :param years: 西元年份列表，預設今年與明年
+    :return: 下載到的休市日數量（失敗時為 0）
+    """
+    global _holidays
+    today = now_taipei().date()
+    years = years or [today.year, today.year + 1]
+
+    downloaded = set()
+    for year in years:
+        try:
+            response = http_get(CALENDAR_CONFIG['holiday_url'],
+                                params={'response': 'json', 'queryYear': year - 1911}, timeout=10)
+            if response.status_code == 200:
+                downloaded |= _parse_holiday_schedule(response.json())
+        except Exception as e:
+            print(f"❌ 下載休市日失敗 {year}: {e}")
+
+    # 週末本來就不交易，僅保留平日
+    downloaded = {d for d in downloaded if datetime.strptime(d, '%Y-%m-%d').weekday() < 5}
+    if not downloaded:
+        return 0
+
+    try:
+        os.makedirs(os.path.dirname(CALENDAR_CONFIG['holiday_cache_file']), exist_ok=True)
+        with open(CALENDAR_CONFIG['holiday_cache_file'], 'w', encoding='utf-8') as f:
+            json.dump({'timestamp': datetime.now().isoformat(), 'holidays': sorted(downloaded)},
+                      f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        print(f"❌ 儲存休市日失敗: {e}")
+
+    with _holidays_lock:
+        _holidays = DEFAULT_HOLIDAYS | downloaded
+    print(f"📅 已更新休市日 {len(downloaded)} 筆")
+    return len(downloaded)
+
+
+def get_holidays():
+    """取得休市日集合（首次呼叫時載入本地檔案）"""
+    global _holidays
+    if _holidays is not None:
+        return _holidays
+
+    with _holidays_lock:
+        if _holidays is None:
+            holidays = set(DEFAULT_HOLIDAYS)
+            try:
+                with open(CALENDAR_CONFIG['holiday_cache_file'], 'r', encoding='utf-8') as f:
+                    holidays |= set(json.load(f).get('holidays', []))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"❌ 讀取休市日失敗: {e}")
+            _holidays = holidays
+        return _holidays
+
+
+def holidays_outdated():
+    """本地休市日檔案是否不存在或超過更新週期"""
+    try:
+        with open(CALENDAR_CONFIG['holiday_cache_file'], 'r', encoding='utf-8') as f:
+            timestamp = datetime.fromisoformat(json.load(f)['timestamp'])
+        return datetime.now() - timestamp > timedelta(days=CALENDAR_CONFIG['holiday_refresh_days'])
+    except Exception:
+        return True
+
+
+def is_trading_day(day):
+    """是否為交易日（平日且非休市日）"""
+    return day.weekday() < 5 and day.isoformat() not in get_holidays()
+
+
+def is_market_open(now=None):
+    """目前是否為盤中時段"""
+    now = _to_taipei(now)
+    return (is_trading_day(now.date())
+            and CALENDAR_CONFIG['open_time'] <= now.time() <= CALENDAR_CONFIG['close_time'])
+
+
+def in_session_window(now=None):
+    """目前是否為盤中或收盤後定稿時段（報價仍會變動的時段）"""
+    return _in_session_window(_to_taipei(now))
+
+
+def _in_session_window(now):
+    """盤中或收盤後定稿時段內（此時段使用短 TTL）"""
+    if not is_trading_day(now.date()):
+        return False
+    open_at = datetime.combine(now.date(), CALENDAR_CONFIG['open_time'], tzinfo=TAIPEI_TZ)
+    close_at = datetime.combine(now.date(), CALENDAR_CONFIG['close_time'], tzinfo=TAIPEI_TZ)
+    return open_at <= now <= close_at + timedelta(minutes=CALENDAR_CONFIG['settle_minutes'])
+
+
+def next_open(now=None):
+    """下一個開盤時間（盤中呼叫時回傳下一個交易日的開盤）"""
+    now = _to_taipei(now)
+    day = now.date()
+    if now.time() >= CALENDAR_CONFIG['open_time']:
+        day += timedelta(days=1)
+    # 最長的連假（春節）也不會超過三週
+    for _ in range(31):
+        if is_trading_day(day):
+            break
+        day += timedelta(days=1)
+    return datetime.combine(day, CALENDAR_CONFIG['open_time'], tzinfo=TAIPEI_TZ)
+
+
+def last_settled_day(now=None):
+    """最近一個已收盤且過了定稿時段的交易日（其日線不會再變動）"""
+    now = _to_taipei(now)
+    day = now.date()
+    settled_at = datetime.combine(day, CALENDAR_CONFIG['close_time'], tzinfo=TAIPEI_TZ) + \
+        timedelta(minutes=CALENDAR_CONFIG['settle_minutes'])
+    if now < settled_at:
+        day -= timedelta(days=1)
+    for _ in range(31):
+        if is_trading_day(day):
+            break
+        day -= timedelta(days=1)
+    return day
+
+
+def calendar_expiry(session_ttl, now=None):
+    """
+    依交易日曆計算快取資料的到期時間
+    :param session_ttl: 盤中（含收盤後定稿時段）的有效秒數
+    :return: 台北時區的到期時間；非交易時段有效到下一個開盤
+    """
+    now = _to_taipei(now)
+    if _in_session_window(now):
+        return now + timedelta(seconds=session_ttl)
+    return next_open(now)
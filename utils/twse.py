@@ -1,10 +1,21 @@
 import os
-import requests
+from utils.http_client import http_get
+from utils.hedge import race
+from utils.source_health import order_sources
+from utils.singleflight import SingleFlight
+from utils.cache import (
+    quotes as quote_cache, market as market_cache, missing as missing_cache,
+    charts as chart_cache, names as name_cache,
+)
+from utils.symbols import lookup_name, get_market, get_symbol, symbols_timestamp, OTC
+from utils.price_history import get_history_store, bars_from_yahoo, PRICE_HISTORY_CONFIG
+from utils.trading_calendar import TAIPEI_TZ, CALENDAR_CONFIG, is_market_open, last_settled_day, now_taipei
 import pandas as pd
 from datetime import datetime, timedelta
-import json
 import time
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 CACHE_DIR = 'cache'
 os.makedirs(CACHE_DIR, exist_ok=True)
@@ -13,9 +24,16 @@ os.makedirs(CACHE_DIR, exist_ok=True)
 CONFIG = {
     'timeout': 20,  # 增加超時時間
     'retry_times': 3,  # 增加重試次數
-    'cache_duration': 300,  # 縮短快取時間到5分鐘，獲取更新數據
+    'cache_duration': 300,  # 預設快取時間（秒），各類資料的 TTL 與過期策略見 utils.cache.NAMESPACE_POLICIES
+    'batch_size': 50,  # 證交所即時報價單次批次查詢的股票數量上限
+    'quote_strategy': 'hedged',  # 個股報價策略：'hedged' 對沖競速 / 'sequential' 依序備援
+    'refresh_workers': 4,  # 背景更新的執行緒數量
+    'history_check_interval': 600,  # 日線歷史未補齊時（上游尚未提供），再次向上游檢查的最短間隔（秒）
 }
 
+# 過期資料的標記欄位（模板與 API 依此顯示資料延遲）
+STALE_FLAG = '_stale'
+
 # 請求標頭
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -26,281 +44,442 @@ HEADERS = {
     'Pragma': 'no-cache',
 }
 
+# 證交所即時報價（MIS）請求標頭
+MIS_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Referer': 'https://mis.twse.com.tw/',
+    'Accept': 'application/json'
+}
+
+MIS_URL = "https://mis.twse.com.tw/stock/api/getStockInfo.jsp"
 
-def get_stock_from_yahoo(stock_code):
-    """從 Yahoo Finance 獲取股票資料（備用方案）"""
+# 合併同一 key 的並行上游請求（報價、圖表、大盤）
+_flight = SingleFlight()
+
+# 背景更新過期快取
+_refresh_executor = ThreadPoolExecutor(max_workers=CONFIG['refresh_workers'], thread_name_prefix='cache-refresh')
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _yahoo_symbol(stock_code):
+    """台股在 Yahoo Finance 的格式（上櫃股票為 .TWO）"""
+    if stock_code.endswith('.TW') or stock_code.endswith('.TWO'):
+        return stock_code
+    if get_market(stock_code) == OTC:
+        return f"{stock_code}.TWO"
+    return f"{stock_code}.TW"
+
+
+def _mis_channel(stock_code):
+    """股票在證交所即時報價的頻道名稱（上市 tse_、上櫃 otc_）"""
+    prefix = 'otc' if get_market(stock_code) == OTC else 'tse'
+    return f"{prefix}_{stock_code}.tw"
+
+
+def _parse_yahoo_quote(stock_code, data, stock_name):
+    """將 Yahoo Finance chart API 的 meta 資料轉換為股票資訊字典，無資料時回傳 None"""
+    if not (data.get('chart') and data['chart'].get('result')):
+        return None
+    
+    result = data['chart']['result'][0]
+    meta = result.get('meta', {})
+    
+    # 基本股價資訊
+    current_price = meta.get('regularMarketPrice', 0)
+    previous_close = meta.get('regularMarketPreviousClose', 0)
+    open_price = meta.get('regularMarketOpen', 0)
+    high_price = meta.get('regularMarketDayHigh', 0)
+    low_price = meta.get('regularMarketDayLow', 0)
+    volume = meta.get('regularMarketVolume', 0)
+    
+    stock_info = {
+        '股票代碼': stock_code,
+        '股票名稱': stock_name,
+        '即時股價': f"{current_price:.2f}" if current_price else "N/A",
+        '收盤價': f"{current_price:.2f}" if current_price else "N/A",
+        '開盤價': f"{open_price:.2f}" if open_price else "N/A",
+        '最高價': f"{high_price:.2f}" if high_price else "N/A",
+        '最低價': f"{low_price:.2f}" if low_price else "N/A",
+        '成交量': f"{volume:,}" if volume else "N/A",
+    }
+    
+    # 計算漲跌
+    if previous_close and current_price and previous_close > 0:
+        change = current_price - previous_close
+        change_percent = (change / previous_close) * 100
+        stock_info['漲跌價差'] = f"{change:+.2f}"
+        stock_info['漲跌幅'] = f"{change_percent:+.2f}%"
+    else:
+        stock_info['漲跌價差'] = "N/A"
+        stock_info['漲跌幅'] = "N/A"
+    
+    # 嘗試從 meta 資料中獲取更完整的資訊
     try:
-        # 台股在 Yahoo Finance 的格式
-        if not stock_code.endswith('.TW'):
-            yahoo_symbol = f"{stock_code}.TW"
-        else:
-            yahoo_symbol = stock_code
+        # 從 meta 中獲取開盤價
+        if meta.get('regularMarketOpen'):
+            stock_info['開盤價'] = f"{meta['regularMarketOpen']:.2f}"
+        
+        # 如果 meta 中有昨收和當前價格，重新計算漲跌
+        prev_close_meta = meta.get('regularMarketPreviousClose') or meta.get('previousClose') or meta.get('chartPreviousClose')
+        current_price_meta = meta.get('regularMarketPrice')
+        
+        if prev_close_meta and current_price_meta and prev_close_meta > 0:
+            change = current_price_meta - prev_close_meta
+            change_percent = (change / prev_close_meta) * 100
+            
+            stock_info['漲跌價差'] = f"{change:+.2f}"
+            stock_info['漲跌幅'] = f"{change_percent:+.2f}%"
+            print(f"💹 計算漲跌: 目前價格={current_price_meta}, 昨收={prev_close_meta}, 漲跌={change:+.2f}")
             
+    except Exception as e:
+        print(f"⚠️ 處理 meta 資料失敗: {e}")
+    
+    return stock_info
+
+
+def _needs_yahoo_quote_fallback(stock_info):
+    """Yahoo chart 資料缺少開盤價或漲跌時，需要再查詢 quote API 補齊"""
+    return any(stock_info.get(field) == "N/A" for field in ('開盤價', '漲跌價差', '漲跌幅'))
+
+
+def _apply_yahoo_quote_fallback(stock_info, quote_data):
+    """以 Yahoo Finance quote API 資料補齊缺少的開盤價與漲跌"""
+    if quote_data.get('quoteResponse') and quote_data['quoteResponse'].get('result'):
+        quote_result = quote_data['quoteResponse']['result'][0]
+        
+        # 更新開盤價等資料
+        if quote_result.get('regularMarketOpen') and stock_info.get('開盤價') == "N/A":
+            stock_info['開盤價'] = f"{quote_result['regularMarketOpen']:.2f}"
+        if quote_result.get('regularMarketChange') and stock_info.get('漲跌價差') == "N/A":
+            stock_info['漲跌價差'] = f"{quote_result['regularMarketChange']:+.2f}"
+        if quote_result.get('regularMarketChangePercent') and stock_info.get('漲跌幅') == "N/A":
+            stock_info['漲跌幅'] = f"{quote_result['regularMarketChangePercent']:+.2f}%"
+    return stock_info
+
+
+def get_stock_from_yahoo(stock_code):
+    """
+    從 Yahoo Finance 獲取股票資料（備用方案）
+    查無此代碼時回傳 None；連線錯誤、逾時與上游錯誤回應則拋出例外（由斷路器記為失敗）
+    """
+    try:
+        yahoo_symbol = _yahoo_symbol(stock_code)
         url = f"https://query1.finance.yahoo.com/v8/finance/chart/{yahoo_symbol}"
         
-        resp = requests.get(url, timeout=CONFIG['timeout'], headers=HEADERS)
+        resp = http_get(url, timeout=CONFIG['timeout'], headers=HEADERS)
+        if resp.status_code == 404:
+            # Yahoo 對不存在的代碼回應 404
+            print(f"❌ Yahoo Finance 查無資料: {stock_code}")
+            return None
         resp.raise_for_status()
         data = resp.json()
         
         if data.get('chart') and data['chart'].get('result'):
-            result = data['chart']['result'][0]
-            meta = result.get('meta', {})
-            
-            # 基本股價資訊
-            current_price = meta.get('regularMarketPrice', 0)
-            previous_close = meta.get('regularMarketPreviousClose', 0)
-            open_price = meta.get('regularMarketOpen', 0)
-            high_price = meta.get('regularMarketDayHigh', 0)
-            low_price = meta.get('regularMarketDayLow', 0)
-            volume = meta.get('regularMarketVolume', 0)
-            
-            stock_info = {
-                '股票代碼': stock_code,
-                '股票名稱': get_stock_name(stock_code),
-                '即時股價': f"{current_price:.2f}" if current_price else "N/A",
-                '收盤價': f"{current_price:.2f}" if current_price else "N/A",
-                '開盤價': f"{open_price:.2f}" if open_price else "N/A",
-                '最高價': f"{high_price:.2f}" if high_price else "N/A",
-                '最低價': f"{low_price:.2f}" if low_price else "N/A",
-                '成交量': f"{volume:,}" if volume else "N/A",
-            }
-            
-            # 計算漲跌
-            if previous_close and current_price and previous_close > 0:
-                change = current_price - previous_close
-                change_percent = (change / previous_close) * 100
-                stock_info['漲跌價差'] = f"{change:+.2f}"
-                stock_info['漲跌幅'] = f"{change_percent:+.2f}%"
-            else:
-                stock_info['漲跌價差'] = "N/A"
-                stock_info['漲跌幅'] = "N/A"
-            
-            # 嘗試從 meta 資料中獲取更完整的資訊
-            try:
-                # 從 meta 中獲取開盤價
-                if meta.get('regularMarketOpen'):
-                    stock_info['開盤價'] = f"{meta['regularMarketOpen']:.2f}"
-                
-                # 如果 meta 中有昨收和當前價格，重新計算漲跌
-                prev_close_meta = meta.get('regularMarketPreviousClose') or meta.get('previousClose') or meta.get('chartPreviousClose')
-                current_price_meta = meta.get('regularMarketPrice')
-                
-                if prev_close_meta and current_price_meta and prev_close_meta > 0:
-                    change = current_price_meta - prev_close_meta
-                    change_percent = (change / prev_close_meta) * 100
-                    
-                    stock_info['漲跌價差'] = f"{change:+.2f}"
-                    stock_info['漲跌幅'] = f"{change_percent:+.2f}%"
-                    print(f"💹 計算漲跌: 目前價格={current_price_meta}, 昨收={prev_close_meta}, 漲跌={change:+.2f}")
-                    
-            except Exception as e:
-                print(f"⚠️ 處理 meta 資料失敗: {e}")
+            stock_info = _parse_yahoo_quote(stock_code, data, get_stock_name(stock_code))
             
             # 嘗試獲取更多資料（備用方案）
-            try:
-                # 從 quote 資料中獲取
-                quote_url = f"https://query1.finance.yahoo.com/v7/finance/quote?symbols={yahoo_symbol}"
-                quote_resp = requests.get(quote_url, timeout=5, headers=HEADERS)
-                
-                if quote_resp.status_code == 200:
-                    quote_data = quote_resp.json()
+            if _needs_yahoo_quote_fallback(stock_info):
+                try:
+                    # 從 quote 資料中獲取
+                    quote_url = f"https://query1.finance.yahoo.com/v7/finance/quote?symbols={yahoo_symbol}"
+                    quote_resp = http_get(quote_url, timeout=5, headers=HEADERS)
                     
-                    if quote_data.get('quoteResponse') and quote_data['quoteResponse'].get('result'):
-                        quote_result = quote_data['quoteResponse']['result'][0]
+                    if quote_resp.status_code == 200:
+                        _apply_yahoo_quote_fallback(stock_info, quote_resp.json())
                         
-                        # 更新開盤價等資料
-                        if quote_result.get('regularMarketOpen') and stock_info.get('開盤價') == "N/A":
-                            stock_info['開盤價'] = f"{quote_result['regularMarketOpen']:.2f}"
-                        if quote_result.get('regularMarketChange') and stock_info.get('漲跌價差') == "N/A":
-                            stock_info['漲跌價差'] = f"{quote_result['regularMarketChange']:+.2f}"
-                        if quote_result.get('regularMarketChangePercent') and stock_info.get('漲跌幅') == "N/A":
-                            stock_info['漲跌幅'] = f"{quote_result['regularMarketChangePercent']:+.2f}%"
-                        
-            except Exception as e:
-                print(f"⚠️ 獲取 Quote 資料失敗: {e}")
+                except Exception as e:
+                    print(f"⚠️ 獲取 Quote 資料失敗: {e}")
             
             print(f"✅ Yahoo Finance 成功獲取 {stock_code} 資料")
             return stock_info
             
     except Exception as e:
         print(f"Yahoo Finance 獲取失敗: {e}")
+        raise
+
+
+def _twse_stock_day_urls(stock_code):
+    """證交所個股日成交資訊 API（新舊兩種路徑）"""
+    today = datetime.now().strftime('%Y%m%d')
+    return [
+        f"https://www.twse.com.tw/rwd/zh/afterTrading/STOCK_DAY?date={today}&stockNo={stock_code}&response=json",
+        f"https://www.twse.com.tw/exchangeReport/STOCK_DAY?response=json&date={today}&stockNo={stock_code}",
+    ]
+
+
+def _parse_twse_stock_day(stock_code, data, stock_name):
+    """將證交所 STOCK_DAY 回應轉換為股票資訊字典（取最新一天），無資料時回傳 None"""
+    if not (data.get('stat') == 'OK' and data.get('data')):
         return None
+    
+    # 取最新一天的資料
+    latest_data = data['data'][-1]
+    
+    stock_info = {
+        '股票代碼': stock_code,
+        '股票名稱': stock_name,
+    }
+    
+    # 對應欄位
+    field_mapping = {
+        '日期': 0,
+        '成交股數': 1,
+        '成交金額': 2,
+        '開盤價': 3,
+        '最高價': 4,
+        '最低價': 5,
+        '收盤價': 6,
+        '漲跌價差': 7,
+        '成交筆數': 8
+    }
+    
+    for field_name, index in field_mapping.items():
+        if index < len(latest_data):
+            stock_info[field_name] = latest_data[index]
+    
+    # 計算漲跌幅
+    try:
+        close_price = float(stock_info.get('收盤價', '0').replace(',', ''))
+        change_str = stock_info.get('漲跌價差', '0')
+        if change_str and change_str != '--':
+            change = float(change_str.replace(',', ''))
+            if close_price > 0:
+                prev_close = close_price - change
+                if prev_close > 0:
+                    change_percent = (change / prev_close) * 100
+                    stock_info['漲跌幅'] = f"{change_percent:+.2f}%"
+    except:
+        stock_info['漲跌幅'] = "N/A"
+    
+    return stock_info
 
 
 def get_stock_from_twse_api(stock_code):
-    """從證交所 API 獲取股票資料"""
-    try:
-        # 嘗試不同的證交所 API
-        urls = [
-            f"https://www.twse.com.tw/rwd/zh/afterTrading/STOCK_DAY?date={datetime.now().strftime('%Y%m%d')}&stockNo={stock_code}&response=json",
-            f"https://www.twse.com.tw/exchangeReport/STOCK_DAY?response=json&date={datetime.now().strftime('%Y%m%d')}&stockNo={stock_code}",
-        ]
-        
-        for url in urls:
-            try:
-                print(f"嘗試證交所 API: {stock_code}")
-                resp = requests.get(url, timeout=CONFIG['timeout'], headers=HEADERS)
-                resp.raise_for_status()
-                data = resp.json()
-                
-                if data.get('stat') == 'OK' and data.get('data'):
-                    # 取最新一天的資料
-                    latest_data = data['data'][-1]
-                    fields = data.get('fields', [])
-                    
-                    stock_info = {
-                        '股票代碼': stock_code,
-                        '股票名稱': get_stock_name(stock_code),
-                    }
-                    
-                    # 對應欄位
-                    field_mapping = {
-                        '日期': 0,
-                        '成交股數': 1,
-                        '成交金額': 2,
-                        '開盤價': 3,
-                        '最高價': 4,
-                        '最低價': 5,
-                        '收盤價': 6,
-                        '漲跌價差': 7,
-                        '成交筆數': 8
-                    }
-                    
-                    for field_name, index in field_mapping.items():
-                        if index < len(latest_data):
-                            stock_info[field_name] = latest_data[index]
-                    
-                    # 計算漲跌幅
-                    try:
-                        close_price = float(stock_info.get('收盤價', '0').replace(',', ''))
-                        change_str = stock_info.get('漲跌價差', '0')
-                        if change_str and change_str != '--':
-                            change = float(change_str.replace(',', ''))
-                            if close_price > 0:
-                                prev_close = close_price - change
-                                if prev_close > 0:
-                                    change_percent = (change / prev_close) * 100
-                                    stock_info['漲跌幅'] = f"{change_percent:+.2f}%"
-                    except:
-                        stock_info['漲跌幅'] = "N/A"
-                    
-                    print(f"✅ 證交所 API 成功獲取 {stock_code} 資料")
-                    return stock_info
-                    
-            except Exception as e:
-                print(f"證交所 API 嘗試失敗: {e}")
-                continue
-                
-        return None
+    """
+    從證交所 API 獲取股票資料
+    有任一路徑正常回應但查無資料時回傳 None；所有路徑皆連線失敗或回應錯誤時拋出最後一個例外
+    """
+    last_error = None
+    answered = False
+    # 嘗試不同的證交所 API
+    for url in _twse_stock_day_urls(stock_code):
+        try:
+            print(f"嘗試證交所 API: {stock_code}")
+            resp = http_get(url, timeout=CONFIG['timeout'], headers=HEADERS)
+            resp.raise_for_status()
+            data = resp.json()
+        except Exception as e:
+            print(f"證交所 API 嘗試失敗: {e}")
+            last_error = e
+            continue
         
-    except Exception as e:
-        print(f"證交所 API 整體失敗: {e}")
+        answered = True
+        if data.get('stat') == 'OK' and data.get('data'):
+            stock_info = _parse_twse_stock_day(stock_code, data, get_stock_name(stock_code))
+            print(f"✅ 證交所 API 成功獲取 {stock_code} 資料")
+            return stock_info
+    
+    if last_error is not None and not answered:
+        raise last_error
+    return None
+
+
+def _parse_alternative_quote(stock_code, data, stock_name):
+    """將 Fugle 即時報價回應轉換為股票資訊字典，無資料時回傳 None"""
+    if not data.get('data'):
         return None
+    
+    quote = data['data']
+    return {
+        '股票代碼': stock_code,
+        '股票名稱': stock_name,
+        '收盤價': f"{quote.get('price', 0):.2f}",
+        '開盤價': f"{quote.get('open', 0):.2f}",
+        '最高價': f"{quote.get('high', 0):.2f}",
+        '最低價': f"{quote.get('low', 0):.2f}",
+        '成交量': f"{quote.get('volume', 0):,}",
+        '漲跌價差': f"{quote.get('change', 0):+.2f}",
+        '漲跌幅': f"{quote.get('changePercent', 0):+.2f}%",
+    }
 
 
 def get_stock_from_alternative_api(stock_code):
-    """從其他金融 API 獲取資料"""
+    """從其他金融 API 獲取資料（查無資料回傳 None，連線錯誤與上游錯誤回應拋出例外）"""
     try:
         # 嘗試 Fugle API (免費版)
         url = f"https://api.fugle.tw/realtime/v0.3/intraday/quote?symbolId={stock_code}"
         
-        resp = requests.get(url, timeout=CONFIG['timeout'], headers=HEADERS)
-        if resp.status_code == 200:
-            data = resp.json()
-            if data.get('data'):
-                quote = data['data']
-                stock_info = {
-                    '股票代碼': stock_code,
-                    '股票名稱': get_stock_name(stock_code),
-                    '收盤價': f"{quote.get('price', 0):.2f}",
-                    '開盤價': f"{quote.get('open', 0):.2f}",
-                    '最高價': f"{quote.get('high', 0):.2f}",
-                    '最低價': f"{quote.get('low', 0):.2f}",
-                    '成交量': f"{quote.get('volume', 0):,}",
-                    '漲跌價差': f"{quote.get('change', 0):+.2f}",
-                    '漲跌幅': f"{quote.get('changePercent', 0):+.2f}%",
-                }
-                print(f"✅ 替代 API 成功獲取 {stock_code} 資料")
-                return stock_info
+        resp = http_get(url, timeout=CONFIG['timeout'], headers=HEADERS)
+        if resp.status_code == 404:
+            return None
+        resp.raise_for_status()
+        data = resp.json()
+        if data.get('data'):
+            stock_info = _parse_alternative_quote(stock_code, data, get_stock_name(stock_code))
+            print(f"✅ 替代 API 成功獲取 {stock_code} 資料")
+            return stock_info
                 
     except Exception as e:
         print(f"替代 API 獲取失敗: {e}")
+        raise
         
     return None
 
 
+def _parse_twse_realtime_item(stock_code, stock_data, stock_name=None):
+    """
+    將證交所即時報價的單筆 msgArray 資料轉換為股票資訊字典
+    :param stock_name: 回應中沒有名稱時使用的備用名稱（未提供則查詢 get_stock_name）
+    """
+    # 獲取各項資料
+    current_price = stock_data.get('z', '0')    # 目前價格
+    open_price = stock_data.get('o', '0')       # 開盤價
+    high_price = stock_data.get('h', '0')       # 最高價
+    low_price = stock_data.get('l', '0')        # 最低價
+    volume = stock_data.get('v', '0')           # 成交量
+    name = stock_data.get('n', '')              # 股票名稱
+    remember_name(stock_code, name)
+    prev_close = stock_data.get('y', '0')       # 昨日收盤價
+    
+    stock_info = {
+        '股票代碼': stock_code,
+        '股票名稱': name if name else (stock_name or get_stock_name(stock_code)),
+        '即時股價': current_price if current_price != '0' else "N/A",
+        '收盤價': current_price if current_price != '0' else "N/A",  # 即時股價也是收盤價
+        '開盤價': open_price if open_price != '0' else "N/A",
+        '最高價': high_price if high_price != '0' else "N/A",
+        '最低價': low_price if low_price != '0' else "N/A",
+        '成交量': f"{int(volume):,}" if volume and volume != '0' else "N/A",
+    }
+    
+    # 計算漲跌資料
+    try:
+        if prev_close and prev_close != '0' and current_price and current_price != '0':
+            prev_val = float(prev_close)
+            curr_val = float(current_price)
+            
+            # 計算漲跌價差
+            change_val = curr_val - prev_val
+            stock_info['漲跌價差'] = f"{change_val:+.2f}"
+            
+            # 計算漲跌幅
+            if prev_val > 0:
+                change_percent = (change_val / prev_val) * 100
+                stock_info['漲跌幅'] = f"{change_percent:+.2f}%"
+            else:
+                stock_info['漲跌幅'] = "N/A"
+        else:
+            stock_info['漲跌價差'] = "N/A"
+            stock_info['漲跌幅'] = "N/A"
+            
+    except Exception as e:
+        print(f"⚠️ 漲跌計算錯誤: {e}")
+        stock_info['漲跌價差'] = "N/A"
+        stock_info['漲跌幅'] = "N/A"
+    
+    return stock_info
+
+
 def get_stock_from_twse_realtime(stock_code):
-    """從證交所即時報價獲取資料"""
+    """從證交所即時報價獲取資料（查無資料回傳 None，連線錯誤與上游錯誤回應拋出例外）"""
     try:
         # 證交所即時報價 API
-        url = f"https://mis.twse.com.tw/stock/api/getStockInfo.jsp?ex_ch=tse_{stock_code}.tw"
+        url = f"{MIS_URL}?ex_ch={_mis_channel(stock_code)}"
         
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Referer': 'https://mis.twse.com.tw/',
-            'Accept': 'application/json'
-        }
+        resp = http_get(url, timeout=CONFIG['timeout'], headers=MIS_HEADERS)
+        resp.raise_for_status()
+        data = resp.json()
+    except Exception as e:
+        print(f"證交所即時報價獲取失敗: {e}")
+        raise
+    
+    if not data.get('msgArray'):
+        print(f"❌ 證交所即時報價無資料: {stock_code}")
+        return None
+    try:
+        stock_info = _parse_twse_realtime_item(stock_code, data['msgArray'][0])
+    except (ValueError, TypeError) as e:
+        print(f"⚠️ 證交所即時報價資料格式錯誤 {stock_code}: {e}")
+        return None
+    print(f"✅ 證交所即時報價成功獲取 {stock_code} 資料")
+    return stock_info
+
+
+def get_stocks_from_twse_realtime(stock_codes):
+    """
+    從證交所即時報價批次獲取多檔股票資料（ex_ch 以 | 串接，單次請求）
+    :param stock_codes: 股票代碼列表
+    :return: dict {股票代碼: 股票資訊}，僅包含有回傳資料的代碼
+    """
+    results = {}
+    if not stock_codes:
+        return results
+    
+    try:
+        ex_ch = '|'.join(_mis_channel(code) for code in stock_codes)
+        url = f"{MIS_URL}?ex_ch={ex_ch}"
         
-        resp = requests.get(url, timeout=CONFIG['timeout'], headers=headers)
+        resp = http_get(url, timeout=CONFIG['timeout'], headers=MIS_HEADERS)
         resp.raise_for_status()
         data = resp.json()
         
-        if data.get('msgArray') and len(data['msgArray']) > 0:
-            stock_data = data['msgArray'][0]
+        wanted = set(stock_codes)
+        for stock_data in data.get('msgArray') or []:
+            code = (stock_data.get('c') or '').strip()
+            if code in wanted:
+                # 單筆格式錯誤（例如成交量為 "-"）只略過該檔，不影響同批其他股票
+                try:
+                    results[code] = _parse_twse_realtime_item(code, stock_data)
+                except (ValueError, TypeError) as e:
+                    print(f"⚠️ 證交所即時報價資料格式錯誤 {code}: {e}")
+        
+        print(f"✅ 證交所即時報價批次獲取 {len(results)}/{len(stock_codes)} 檔資料")
+        
+    except Exception as e:
+        print(f"證交所即時報價批次獲取失敗: {e}")
+    
+    return results
+
+
+def _parse_market_twse(data):
+    """將證交所即時報價的加權指數資料轉換為大盤資訊字典，資料無效時回傳 None"""
+    if not (data.get('msgArray') and len(data['msgArray']) > 0):
+        print("❌ 證交所大盤無資料")
+        return None
+    
+    # 回傳為加權指數資料
+    market_data = data['msgArray'][0]
+    
+    current_index = market_data.get('z', '0')   # 目前指數
+    prev_close = market_data.get('y', '0')      # 昨收指數
+    name = market_data.get('n', '') or '台灣加權股價指數'  # 指數名稱
+    
+    try:
+        if current_index and current_index not in ['0', '-'] and prev_close and prev_close not in ['0', '-']:
+            curr_val = float(current_index)
+            prev_val = float(prev_close)
             
-            # 獲取各項資料
-            current_price = stock_data.get('z', '0')    # 目前價格
-            open_price = stock_data.get('o', '0')       # 開盤價
-            high_price = stock_data.get('h', '0')       # 最高價
-            low_price = stock_data.get('l', '0')        # 最低價
-            volume = stock_data.get('v', '0')           # 成交量
-            name = stock_data.get('n', '')              # 股票名稱
-            prev_close = stock_data.get('y', '0')       # 昨日收盤價
+            # 計算漲跌點數
+            change_val = curr_val - prev_val
             
-            stock_info = {
-                '股票代碼': stock_code,
-                '股票名稱': name if name else get_stock_name(stock_code),
-                '即時股價': current_price if current_price != '0' else "N/A",
-                '收盤價': current_price if current_price != '0' else "N/A",  # 即時股價也是收盤價
-                '開盤價': open_price if open_price != '0' else "N/A",
-                '最高價': high_price if high_price != '0' else "N/A",
-                '最低價': low_price if low_price != '0' else "N/A",
-                '成交量': f"{int(volume):,}" if volume and volume != '0' else "N/A",
-            }
+            # 計算漲跌幅
+            change_percent = (change_val / prev_val) * 100 if prev_val > 0 else 0
             
-            # 計算漲跌資料
-            try:
-                if prev_close and prev_close != '0' and current_price and current_price != '0':
-                    prev_val = float(prev_close)
-                    curr_val = float(current_price)
-                    
-                    # 計算漲跌價差
-                    change_val = curr_val - prev_val
-                    stock_info['漲跌價差'] = f"{change_val:+.2f}"
-                    
-                    # 計算漲跌幅
-                    if prev_val > 0:
-                        change_percent = (change_val / prev_val) * 100
-                        stock_info['漲跌幅'] = f"{change_percent:+.2f}%"
-                    else:
-                        stock_info['漲跌幅'] = "N/A"
-                else:
-                    stock_info['漲跌價差'] = "N/A"
-                    stock_info['漲跌幅'] = "N/A"
-                    
-            except Exception as e:
-                print(f"⚠️ 漲跌計算錯誤: {e}")
-                stock_info['漲跌價差'] = "N/A"
-                stock_info['漲跌幅'] = "N/A"
-            
-            print(f"✅ 證交所即時報價成功獲取 {stock_code} 資料")
-            return stock_info
+            return {
+                '指數': f"{curr_val:,.2f}",
+                '漲跌點數': f"{change_val:+.2f}",
+                '漲跌幅': f"{change_percent:+.2f}%",
+                '成交量': "N/A",  # 大盤通常不提供成交量
+                '更新時間': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                '指數名稱': name if name else "台股指數"
+            }
         else:
-            print(f"❌ 證交所即時報價無資料: {stock_code}")
+            print("❌ 證交所大盤指數資料無效")
             return None
             
-    except Exception as e:
-        print(f"證交所即時報價獲取失敗: {e}")
+    except ValueError as e:
+        print(f"❌ 證交所大盤資料轉換錯誤: {e}")
         return None
 
 
@@ -309,80 +488,68 @@ def get_market_from_twse():
     try:
         # 使用台股加權指數 (TAIEX) 代碼 t00
         # 參考：tse_t00.tw 為 TSE 加權指數
-        url = "https://mis.twse.com.tw/stock/api/getStockInfo.jsp?ex_ch=tse_t00.tw"
-        
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Referer': 'https://mis.twse.com.tw/',
-            'Accept': 'application/json'
-        }
+        url = f"{MIS_URL}?ex_ch=tse_t00.tw"
         
-        resp = requests.get(url, timeout=CONFIG['timeout'], headers=headers)
+        resp = http_get(url, timeout=CONFIG['timeout'], headers=MIS_HEADERS)
         resp.raise_for_status()
-        data = resp.json()
         
-        if data.get('msgArray') and len(data['msgArray']) > 0:
-            # 回傳為加權指數資料
-            market_data = data['msgArray'][0]
-            
-            current_index = market_data.get('z', '0')   # 目前指數
-            prev_close = market_data.get('y', '0')      # 昨收指數
-            name = market_data.get('n', '') or '台灣加權股價指數'  # 指數名稱
-            
-            try:
-                if current_index and current_index not in ['0', '-'] and prev_close and prev_close not in ['0', '-']:
-                    curr_val = float(current_index)
-                    prev_val = float(prev_close)
-                    
-                    # 計算漲跌點數
-                    change_val = curr_val - prev_val
-                    
-                    # 計算漲跌幅
-                    change_percent = (change_val / prev_val) * 100 if prev_val > 0 else 0
-                    
-                    market_info = {
-                        '指數': f"{curr_val:,.2f}",
-                        '漲跌點數': f"{change_val:+.2f}",
-                        '漲跌幅': f"{change_percent:+.2f}%",
-                        '成交量': "N/A",  # 大盤通常不提供成交量
-                        '更新時間': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                        '指數名稱': name if name else "台股指數"
-                    }
-                    
-                    print("✅ 證交所成功獲取大盤資料")
-                    return market_info
-                else:
-                    print("❌ 證交所大盤指數資料無效")
-                    return None
-                    
-            except ValueError as e:
-                print(f"❌ 證交所大盤資料轉換錯誤: {e}")
-                return None
-        else:
-            print("❌ 證交所大盤無資料")
-            return None
+        market_info = _parse_market_twse(resp.json())
+        if market_info:
+            print("✅ 證交所成功獲取大盤資料")
+        return market_info
             
     except Exception as e:
         print(f"證交所大盤獲取失敗: {e}")
-        return None
+        raise
+
+
+def has_valid_price(stock_data):
+    """檢查股票資料是否包含有效股價（即時股價或收盤價不是 "-", "N/A", "0" 或空值）"""
+    if not stock_data or stock_data.get('錯誤'):
+        return False
+    invalid_values = ['-', 'N/A', '0', '', None]
+    return (stock_data.get('即時股價', 'N/A') not in invalid_values or
+            stock_data.get('收盤價', 'N/A') not in invalid_values)
 
 
 def get_stock_basic_info(stock_code):
     """
-    獲取個股基本資訊 - 多重資料來源
+    獲取個股基本資訊 - 多重資料來源（依 CONFIG['quote_strategy'] 對沖競速或依序備援）
     :param stock_code: 股票代碼（支援任意長度）
     :return: dict 包含股票基本資訊
     """
     # 清理股票代碼，移除空格和非數字字符（保留字母）
     clean_code = re.sub(r'[^\w]', '', stock_code.strip())
     
+    # 近期查無資料的代碼直接回傳，不再逐一嘗試所有資料來源
+    if is_known_missing(clean_code):
+        print(f"🚫 負快取命中，略過查詢: {clean_code}")
+        return missing_stock_result(clean_code)
+    
     # 檢查快取
     cache_key = f"stock_basic_{clean_code}"
-    cached_data = get_cache(cache_key)
-    if cached_data:
+    cached_data, is_stale = quote_cache.get_entry(clean_code)
+    if cached_data and not is_stale:
         print(f"🔄 使用快取資料: {clean_code}")
         return cached_data
     
+    refresh = lambda: _fetch_stock_basic_info(clean_code)
+    if cached_data:
+        # 剛過期：先回傳舊資料，背景更新
+        print(f"⏳ 使用過期快取並背景更新: {clean_code}")
+        return serve_stale(cache_key, cached_data, refresh)
+    
+    # 同一股票同時只發出一次上游請求，其他並行請求共用結果
+    return _flight.do(cache_key, refresh)
+
+
+def _fetch_stock_basic_info(clean_code):
+    """從多重資料來源獲取個股基本資訊並寫入快取（由 get_stock_basic_info 經 single-flight 呼叫）"""
+    # 等待期間可能已有其他請求完成並寫入快取
+    cached_data = quote_cache.get(clean_code)
+    if cached_data:
+        return cached_data
+    
     print(f"🔍 開始獲取股票 {clean_code} 的即時資料...")
     
     # 多重資料來源策略 - 優先使用證交所
@@ -392,136 +559,245 @@ def get_stock_basic_info(stock_code):
         ("證交所 API", lambda: get_stock_from_twse_api(clean_code)),
         ("替代 API", lambda: get_stock_from_alternative_api(clean_code)),
     ]
+    # 依各來源近期成功率與延遲動態排序，並跳過斷路中的來源
+    data_sources = order_sources(data_sources, has_valid_price)
+    # 記錄各來源是正常回應查無資料還是請求失敗（決定是否記入負快取）
+    outcomes = {source_name: None for source_name, _ in data_sources}
+    data_sources = [(source_name, observe_source(outcomes, source_name, func)) for source_name, func in data_sources]
     
-    for source_name, get_data_func in data_sources:
-        try:
-            print(f"📡 嘗試 {source_name}...")
-            stock_data = get_data_func()
-            
-            if stock_data and not stock_data.get('錯誤'):
-                # 檢查是否有有效的股價資料
-                realtime_price = stock_data.get('即時股價', 'N/A')
-                close_price = stock_data.get('收盤價', 'N/A')
+    if CONFIG['quote_strategy'] == 'hedged':
+        # 對沖模式：來源依延遲逐一啟動，取第一個有效結果
+        source_name, stock_data, elapsed = race(data_sources, has_valid_price)
+        if stock_data:
+            stock_data['來源'] = source_name
+            quote_cache.set(clean_code, stock_data)
+            print(f"✅ 對沖勝出 {source_name}（{elapsed:.2f}s），資料已快取")
+            return stock_data
+    else:
+        for source_name, get_data_func in data_sources:
+            try:
+                print(f"📡 嘗試 {source_name}...")
+                stock_data = get_data_func()
                 
-                # 如果股價資料有效（不是 "-", "N/A", "0" 或空值）
-                if (realtime_price not in ['-', 'N/A', '0', '', None] or 
-                    close_price not in ['-', 'N/A', '0', '', None]):
-                    # 儲存快取
-                    save_cache(cache_key, stock_data)
-                    print(f"✅ 成功從 {source_name} 獲取資料並快取")
-                    return stock_data
+                if stock_data and not stock_data.get('錯誤'):
+                    realtime_price = stock_data.get('即時股價', 'N/A')
+                    close_price = stock_data.get('收盤價', 'N/A')
+                    
+                    # 如果股價資料有效（不是 "-", "N/A", "0" 或空值）
+                    if has_valid_price(stock_data):
+                        # 儲存快取
+                        stock_data['來源'] = source_name
+                        quote_cache.set(clean_code, stock_data)
+                        print(f"✅ 成功從 {source_name} 獲取資料並快取")
+                        return stock_data
+                    else:
+                        print(f"⚠️ {source_name} 回傳資料但股價無效: 即時股價={realtime_price}, 收盤價={close_price}")
                 else:
-                    print(f"⚠️ {source_name} 回傳資料但股價無效: 即時股價={realtime_price}, 收盤價={close_price}")
-            else:
-                print(f"❌ {source_name} 資料不完整或有錯誤")
-                
-        except Exception as e:
-            print(f"❌ {source_name} 發生異常: {e}")
-            continue
+                    print(f"❌ {source_name} 資料不完整或有錯誤")
+                    
+            except Exception as e:
+                print(f"❌ {source_name} 發生異常: {e}")
+                continue
     
     # 所有資料來源都失敗
-    error_result = {
+    print(f"❌ 所有資料來源都失敗: {clean_code}")
+    return record_missing_stock(clean_code, outcomes)
+
+
+def is_known_missing(stock_code):
+    """股票代碼是否在負快取中（近期所有資料來源皆查無資料）"""
+    clean_code = re.sub(r'[^\w]', '', str(stock_code).strip())
+    return bool(clean_code) and missing_cache.get(clean_code) is not None
+
+
+def missing_stock_result(clean_code):
+    """查無資料時回傳的錯誤資訊"""
+    return {
         '股票代碼': clean_code,
         '股票名稱': get_stock_name(clean_code),
         '錯誤': f'無法從任何資料來源獲取股票 {clean_code} 的資料'
     }
-    print(f"❌ 所有資料來源都失敗: {clean_code}")
-    return error_result
 
 
-def get_stock_name_from_api(stock_code):
-    """從 API 動態獲取股票名稱"""
-    try:
-        # 檢查是否為中文名稱，如果是則直接返回預設名稱
-        if re.search(r'[\u4e00-\u9fff]', stock_code):
-            # 中文名稱對應表
-            chinese_names = {
-                '台積電': '台積電',
-                '鴻海': '鴻海',
-                '聯發科': '聯發科',
-                '元大台灣50': '元大台灣50',
-                '元大高股息': '元大高股息',
-                '富邦台50': '富邦台50',
-                '國泰永續高股息': '國泰永續高股息',
-                '群益台灣精選高息': '群益台灣精選高息',
-            }
-            return chinese_names.get(stock_code, stock_code)
-        
-        # 嘗試從證交所即時報價 API 獲取名稱
-        url = f"https://mis.twse.com.tw/stock/api/getStockInfo.jsp?ex_ch=tse_{stock_code}.tw"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Referer': 'https://mis.twse.com.tw/',
-            'Accept': 'application/json'
-        }
-        
-        resp = requests.get(url, timeout=5, headers=headers)
-        if resp.status_code == 200:
-            data = resp.json()
-            if data.get('msgArray') and len(data['msgArray']) > 0:
-                stock_data = data['msgArray'][0]
-                name = stock_data.get('n', '').strip()
-                if name:
-                    return name
-        
-        # 嘗試從 Yahoo Finance 獲取名稱
-        yahoo_symbol = f"{stock_code}.TW"
-        yahoo_url = f"https://query1.finance.yahoo.com/v8/finance/chart/{yahoo_symbol}"
-        
-        resp = requests.get(yahoo_url, timeout=5, headers=HEADERS)
-        if resp.status_code == 200:
-            data = resp.json()
-            if data.get('chart') and data['chart'].get('result'):
-                result = data['chart']['result'][0]
-                meta = result.get('meta', {})
-                
-                # 嘗試不同的名稱欄位
-                name = (meta.get('longName') or 
-                       meta.get('shortName') or 
-                       meta.get('displayName'))
-                
-                if name:
-                    # 清理名稱，移除多餘字符
-                    name = name.replace('Taiwan Semiconductor Manufacturing Company Limited', '台積電')
-                    name = name.replace('TAIWAN SEMICONDUCTOR MANUFACTUR', '台積電')
-                    return name
-        
-    except Exception as e:
-        print(f"⚠️ 無法從 API 獲取股票名稱 {stock_code}: {e}")
+def observe_source(outcomes, source_name, func):
+    """
+    包裝資料來源函式，將結果記入 outcomes[source_name]：
+    'ok'（有效股價）、'empty'（正常回應但查無資料）或 'error'（拋出例外）；未回應者維持 None
+    """
+    def observed():
+        try:
+            result = func()
+        except Exception:
+            outcomes[source_name] = 'error'
+            raise
+        outcomes[source_name] = 'ok' if has_valid_price(result) else 'empty'
+        return result
+    return observed
+
+
+def record_missing_stock(clean_code, outcomes):
+    """
+    所有資料來源皆未取得資料時呼叫，只有確定查無此代碼時才記入負快取（短 TTL）：
+    每個嘗試的來源都正常回應查無資料（沒有來源拋出例外或逾時未回應）、股票代碼主檔已完整載入，
+    且主檔中沒有此代碼。上游故障、主檔仍只有內建基本資料或主檔中的代碼都不記錄，以免誤擋
+    :param outcomes: {來源名稱: 'ok' / 'empty' / 'error' / None}（見 observe_source）
+    :return: 錯誤資訊字典
+    """
+    answered = bool(outcomes) and all(status == 'empty' for status in outcomes.values())
+    if answered and symbols_timestamp() is not None and get_symbol(clean_code) is None:
+        missing_cache.set(clean_code, True)
+    elif not answered:
+        print(f"⚠️ 資料來源請求失敗或未回應，不記入負快取: {clean_code}")
+    return missing_stock_result(clean_code)
+
+
+def get_stock_basic_info_many(stock_codes):
+    """
+    批次獲取多檔股票基本資訊 - 先讀快取，未命中者以單次證交所即時報價請求取得
+    :param stock_codes: 股票代碼列表
+    :return: dict {輸入的股票代碼: 股票資訊}，批次與個別來源皆失敗者為錯誤資訊字典
+    """
+    # 清理股票代碼並去除重複
+    code_map = {}
+    clean_codes = []
+    for stock_code in stock_codes:
+        clean_code = re.sub(r'[^\w]', '', str(stock_code).strip())
+        code_map[stock_code] = clean_code
+        if clean_code and clean_code not in clean_codes:
+            clean_codes.append(clean_code)
     
-    return None
+    results = {}
+    missing = []
+    stale = []
+    # 批次查詢所有代碼的快取與負快取
+    known_missing = missing_cache.get_many(clean_codes)
+    entries = quote_cache.get_many([code for code in clean_codes if code not in known_missing])
+    for clean_code in clean_codes:
+        if clean_code in known_missing:
+            results[clean_code] = missing_stock_result(clean_code)
+            continue
+        cached_data, is_stale = entries.get(clean_code, (None, False))
+        if cached_data and is_stale:
+            results[clean_code] = dict(cached_data, **{STALE_FLAG: True})
+            stale.append(clean_code)
+        elif cached_data:
+            results[clean_code] = cached_data
+        else:
+            missing.append(clean_code)
+    
+    # 過期者先回傳舊資料，並以一次批次請求在背景更新
+    if stale:
+        print(f"⏳ {len(stale)} 檔使用過期快取並背景批次更新")
+        schedule_refresh(f"stock_basic_batch_{','.join(stale)}", lambda: _fetch_stock_basic_info_batch(stale))
+    
+    if missing:
+        print(f"🔍 批次獲取 {len(missing)} 檔股票即時資料（快取命中 {len(results)} 檔）...")
+        results.update(_fetch_stock_basic_info_batch(missing))
+    
+    return {stock_code: results.get(clean_code) for stock_code, clean_code in code_map.items()}
+
+
+# 常見股票的預設名稱（API 失敗時的備用）
+COMMON_STOCK_NAMES = {
+    '2330': '台積電',
+    '2317': '鴻海', 
+    '2454': '聯發科',
+    '0050': '元大台灣50',
+    '0056': '元大高股息',
+    '006208': '富邦台50',
+    '00878': '國泰永續高股息',
+    '00919': '群益台灣精選高息',
+}
+
+
+def refresh_stock_quotes(clean_codes):
+    """不論快取是否到期，批次向上游更新報價快取（背景更新器使用，與前景請求共用 single-flight）"""
+    return _flight.do(f"stock_basic_batch_{','.join(clean_codes)}",
+                      lambda: _fetch_stock_basic_info_batch(clean_codes))
+
+
+def fetch_realtime_quotes(clean_codes):
+    """
+    只以證交所即時報價批次請求（每批 CONFIG['batch_size'] 檔、單次請求）取得報價並寫入快取，
+    不改走其他資料來源、不逐檔查詢（全市場批次作業使用）
+    :return: dict {股票代碼: 股票資訊}，只包含取得有效股價者
+    """
+    results = {}
+    batch_size = max(1, CONFIG['batch_size'])
+    for i in range(0, len(clean_codes), batch_size):
+        batch = clean_codes[i:i + batch_size]
+        for clean_code, stock_data in get_stocks_from_twse_realtime(batch).items():
+            if has_valid_price(stock_data):
+                stock_data['來源'] = "證交所即時報價"
+                quote_cache.set(clean_code, stock_data)
+                results[clean_code] = stock_data
+    return results
+
+
+def _fetch_stock_basic_info_batch(clean_codes):
+    """
+    以證交所即時報價批次請求取得多檔股票資料並寫入快取，
+    批次未取得有效股價者改走多重資料來源（非同步引擎同時查詢）
+    :return: dict {股票代碼: 股票資訊}
+    """
+    results = fetch_realtime_quotes(clean_codes)
+    
+    remaining = [clean_code for clean_code in clean_codes if clean_code not in results]
+    if remaining:
+        from utils.twse_async import resolve_stocks
+        results.update(resolve_stocks(remaining))
+    
+    return results
+
+
+def remember_name(stock_code, name):
+    """記錄上游報價回應中的名稱（只記錄股票代碼主檔中沒有的代碼，例如主檔尚未下載或新上市）"""
+    if name and lookup_name(stock_code) is None and name_cache.get(stock_code) != name:
+        name_cache.set(stock_code, name)
 
 
 def get_stock_name(stock_code):
-    """取得股票名稱 - 先嘗試 API，失敗則使用預設名稱"""
-    # 先嘗試從 API 動態獲取
-    api_name = get_stock_name_from_api(stock_code)
-    if api_name:
-        return api_name
+    """
+    取得股票名稱 - 查詢本地股票代碼主檔，主檔中沒有時改查 names 快取（上游報價回應中的名稱），
+    都沒有時使用預設名稱；不發出網路請求
+    """
+    name = lookup_name(stock_code) or name_cache.get(stock_code)
+    if name:
+        return name
     
     # 備用：常見股票的預設名稱（只保留最常見的）
-    common_stocks = {
-        '2330': '台積電',
-        '2317': '鴻海', 
-        '2454': '聯發科',
-        '0050': '元大台灣50',
-        '0056': '元大高股息',
-        '006208': '富邦台50',
-        '00878': '國泰永續高股息',
-        '00919': '群益台灣精選高息',
-    }
-    
-    return common_stocks.get(stock_code, stock_code)
+    return COMMON_STOCK_NAMES.get(stock_code, stock_code)
 
 
 def get_market_summary():
     """獲取大盤摘要資訊 - 改進版"""
     cache_key = "market_summary"
-    cached_data = get_cache(cache_key)
-    if cached_data:
+    cached_data, is_stale = market_cache.get_entry('summary')
+    if cached_data and not is_stale:
         print("🔄 使用大盤快取資料")
         return cached_data
     
+    if cached_data:
+        print("⏳ 使用過期大盤快取並背景更新")
+        return serve_stale(cache_key, cached_data, _fetch_market_summary)
+    
+    return _flight.do(cache_key, _fetch_market_summary)
+
+
+def refresh_market_summary():
+    """不論快取是否到期，向上游更新大盤摘要（背景更新器使用，與前景請求共用 single-flight）"""
+    return _flight.do("market_summary", lambda: _fetch_market_summary(force=True))
+
+
+def _fetch_market_summary(force=False):
+    """
+    從多重資料來源獲取大盤資訊並寫入快取（由 get_market_summary 經 single-flight 呼叫）
+    :param force: 不使用未到期的快取
+    """
+    cached_data = None if force else market_cache.get('summary')
+    if cached_data:
+        return cached_data
+    
     print("📊 獲取大盤即時資料...")
     
     # 嘗試多個資料來源 - 優先使用證交所
@@ -535,6 +811,7 @@ def get_market_summary():
         # 備用資料來源
         ("Yahoo Finance Alternative", lambda: get_market_from_yahoo("https://query1.finance.yahoo.com/v7/finance/quote?symbols=%5ETWII")),
     ]
+    data_sources = order_sources(data_sources, lambda info: bool(info) and not info.get('錯誤'))
     
     for source_name, get_data_func in data_sources:
         try:
@@ -542,7 +819,7 @@ def get_market_summary():
             market_info = get_data_func()
             
             if market_info and not market_info.get('錯誤'):
-                save_cache(cache_key, market_info)
+                market_cache.set('summary', market_info)
                 print(f"✅ 成功從 {source_name} 獲取大盤資料")
                 return market_info
             else:
@@ -564,90 +841,93 @@ def get_market_summary():
     }
 
 
-def get_market_from_yahoo(url):
-    """從 Yahoo Finance 獲取大盤資料的輔助函數"""
-    try:
-        resp = requests.get(url, timeout=CONFIG['timeout'], headers=HEADERS)
-        resp.raise_for_status()
-        data = resp.json()
+def _parse_market_yahoo(data):
+    """將 Yahoo Finance chart 或 quote API 回應轉換為大盤資訊字典"""
+    market_info = None
+    
+    if 'chart' in data and data['chart'].get('result'):
+        # Chart API 格式
+        result = data['chart']['result'][0]
+        meta = result.get('meta', {})
         
-        market_info = None
+        current_price = meta.get('regularMarketPrice')
+        previous_close = meta.get('regularMarketPreviousClose')
+        volume = meta.get('regularMarketVolume', 0)
         
-        if 'chart' in data and data['chart'].get('result'):
-            # Chart API 格式
-            result = data['chart']['result'][0]
-            meta = result.get('meta', {})
-            
-            current_price = meta.get('regularMarketPrice')
-            previous_close = meta.get('regularMarketPreviousClose')
-            volume = meta.get('regularMarketVolume', 0)
+        if current_price and previous_close:
+            change = current_price - previous_close
+            change_percent = (change / previous_close) * 100
             
-            if current_price and previous_close:
-                change = current_price - previous_close
-                change_percent = (change / previous_close) * 100
-                
-                market_info = {
-                    '指數': f"{current_price:,.2f}",
-                    '漲跌點數': f"{change:+.2f}",
-                    '漲跌幅': f"{change_percent:+.2f}%",
-                    '成交量': f"{volume:,}" if volume else "N/A",
-                    '更新時間': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                }
+            market_info = {
+                '指數': f"{current_price:,.2f}",
+                '漲跌點數': f"{change:+.2f}",
+                '漲跌幅': f"{change_percent:+.2f}%",
+                '成交量': f"{volume:,}" if volume else "N/A",
+                '更新時間': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+    
+    elif 'quoteResponse' in data and data['quoteResponse'].get('result'):
+        # Quote API 格式
+        result = data['quoteResponse']['result'][0]
         
-        elif 'quoteResponse' in data and data['quoteResponse'].get('result'):
-            # Quote API 格式
-            result = data['quoteResponse']['result'][0]
-            
-            current_price = result.get('regularMarketPrice')
-            change = result.get('regularMarketChange')
-            change_percent = result.get('regularMarketChangePercent')
-            volume = result.get('regularMarketVolume', 0)
-            
-            if current_price:
-                market_info = {
-                    '指數': f"{current_price:,.2f}",
-                    '漲跌點數': f"{change:+.2f}" if change else "N/A",
-                    '漲跌幅': f"{change_percent:+.2f}%" if change_percent else "N/A",
-                    '成交量': f"{volume:,}" if volume else "N/A",
-                    '更新時間': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                }
+        current_price = result.get('regularMarketPrice')
+        change = result.get('regularMarketChange')
+        change_percent = result.get('regularMarketChangePercent')
+        volume = result.get('regularMarketVolume', 0)
         
-        return market_info
+        if current_price:
+            market_info = {
+                '指數': f"{current_price:,.2f}",
+                '漲跌點數': f"{change:+.2f}" if change else "N/A",
+                '漲跌幅': f"{change_percent:+.2f}%" if change_percent else "N/A",
+                '成交量': f"{volume:,}" if volume else "N/A",
+                '更新時間': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+    
+    return market_info
+
+
+def get_market_from_yahoo(url):
+    """從 Yahoo Finance 獲取大盤資料的輔助函數"""
+    try:
+        resp = http_get(url, timeout=CONFIG['timeout'], headers=HEADERS)
+        resp.raise_for_status()
+        return _parse_market_yahoo(resp.json())
         
     except Exception as e:
         print(f"Yahoo Finance 錯誤: {e}")
-        return None
+        raise
 
 
-def get_cache(key):
-    """獲取快取資料"""
-    cache_file = os.path.join(CACHE_DIR, f"{key}.json")
-    if os.path.exists(cache_file):
+def schedule_refresh(key, refresh):
+    """
+    在背景執行更新函式（同一 key 同時只排程一次，並與前景請求共用 single-flight）
+    :return: 是否有新排程
+    """
+    with _refreshing_lock:
+        if key in _refreshing:
+            return False
+        _refreshing.add(key)
+    
+    def run():
         try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cache_data = json.load(f)
-            
-            # 檢查快取是否過期
-            cache_time = datetime.fromisoformat(cache_data['timestamp'])
-            if datetime.now() - cache_time < timedelta(seconds=CONFIG['cache_duration']):
-                return cache_data['data']
+            _flight.do(key, refresh)
         except Exception as e:
-            print(f"❌ 讀取快取失敗: {e}")
-    return None
+            print(f"❌ 背景更新失敗 {key}: {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+    
+    _refresh_executor.submit(run)
+    return True
 
 
-def save_cache(key, data):
-    """儲存快取資料"""
-    cache_file = os.path.join(CACHE_DIR, f"{key}.json")
-    try:
-        cache_data = {
-            'timestamp': datetime.now().isoformat(),
-            'data': data
-        }
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"❌ 儲存快取失敗: {e}")
+def serve_stale(key, data, refresh):
+    """排程背景更新，並回傳標記為過期的資料副本"""
+    schedule_refresh(key, refresh)
+    stale_data = dict(data)
+    stale_data[STALE_FLAG] = True
+    return stale_data
 
 
 def search_stock(stock_code):
@@ -727,103 +1007,260 @@ if __name__ == '__main__':
             print(f"❌ 發生錯誤：{e}") 
 
 
-def get_stock_chart_data(stock_code, days=7):
-    """獲取股票圖表資料（最近N天）"""
-    try:
-        # 台股在 Yahoo Finance 的格式
-        if not stock_code.endswith('.TW'):
-            yahoo_symbol = f"{stock_code}.TW"
-        else:
-            yahoo_symbol = stock_code
-            
-        # 使用預設期間而不是時間戳，避免時間問題
-        url = f"https://query1.finance.yahoo.com/v8/finance/chart/{yahoo_symbol}"
-        
-        # 根據天數選擇適當的間隔和期間（使用Yahoo Finance API支援的有效組合）
-        if days <= 3:
-            params = {
-                'range': '5d',      # 使用5天範圍確保有足夠資料
-                'interval': '15m',  # 15分鐘間隔（30m可能不穩定）
-            }
-        elif days <= 7:
-            params = {
-                'range': '1mo',     # 改為1個月範圍
-                'interval': '1h',   # 1小時間隔
-            }
-        elif days <= 14:
-            params = {
-                'range': '1mo',     # 使用1個月範圍，但會在後面過濾到14天
-                'interval': '1d',   # 1天間隔是最安全的選擇
-            }
-        else:
-            params = {
-                'range': '1mo',
-                'interval': '1d',   # 1天間隔
-            }
-        
-        resp = requests.get(url, params=params, timeout=CONFIG['timeout'], headers=HEADERS)
-        resp.raise_for_status()
-        data = resp.json()
-        
-        if not data.get('chart') or not data['chart'].get('result'):
-            return None
-            
-        result = data['chart']['result'][0]
-        timestamps = result.get('timestamp', [])
-        quotes = result.get('indicators', {}).get('quote', [{}])[0]
-        
-        if not timestamps or not quotes:
-            return None
-            
-        # 整理圖表資料
-        chart_data = []
-        close_prices = quotes.get('close', [])
-        
-        # 計算時間範圍：只取指定天數的資料
-        now = datetime.now()
-        start_time = now - timedelta(days=days)
-        
-        for i, timestamp in enumerate(timestamps):
-            if i < len(close_prices):
-                close_price = close_prices[i]
-                # 確保價格有效（不是None、NaN或0）
-                if close_price is not None and str(close_price).lower() != 'nan' and close_price > 0:
-                    try:
-                        dt = datetime.fromtimestamp(timestamp)
-                        
-                        # 只保留指定天數內的資料
-                        if dt >= start_time:
-                            chart_data.append({
-                                'time': dt.strftime('%Y-%m-%d %H:%M'),
-                                'price': round(float(close_price), 2),
-                                'timestamp': timestamp,
-                                'datetime': dt  # 添加 datetime 物件方便後續處理
-                            })
-                    except (ValueError, OSError) as e:
-                        # 時間戳轉換失敗，跳過這筆資料
-                        print(f"時間戳轉換錯誤: {timestamp}, {e}")
-                        continue
-        
-        # 按時間排序
-        chart_data.sort(key=lambda x: x['timestamp'])
-        
-        # 移除 datetime 物件（JSON 序列化時會出錯）
-        for item in chart_data:
-            if 'datetime' in item:
-                del item['datetime']
-        
+def _chart_params(days):
+    """根據天數選擇適當的間隔和期間（使用Yahoo Finance API支援的有效組合）"""
+    if days <= 3:
         return {
-            'success': True,
-            'data': chart_data,
-            'stock_code': stock_code,
-            'symbol': yahoo_symbol,
-            'period': f"{days}天"
+            'range': '5d',      # 使用5天範圍確保有足夠資料
+            'interval': '15m',  # 15分鐘間隔（30m可能不穩定）
         }
-        
-    except Exception as e:
-        print(f"圖表資料獲取錯誤: {e}")
+    elif days <= 7:
+        return {
+            'range': '1mo',     # 改為1個月範圍
+            'interval': '1h',   # 1小時間隔
+        }
+    elif days <= 14:
+        return {
+            'range': '1mo',     # 使用1個月範圍，但會在後面過濾到14天
+            'interval': '1d',   # 1天間隔是最安全的選擇
+        }
+    else:
         return {
-            'success': False,
-            'error': str(e),
-            'data': []
+            'range': '1mo',
+            'interval': '1d',   # 1天間隔
         }
+
+
+def _parse_chart_series(data):
+    """將 Yahoo Finance chart 回應整理為完整的價格序列（依時間排序），無資料時回傳 None"""
+    if not data.get('chart') or not data['chart'].get('result'):
+        return None
+        
+    result = data['chart']['result'][0]
+    timestamps = result.get('timestamp', [])
+    quotes = result.get('indicators', {}).get('quote', [{}])[0]
+    
+    if not timestamps or not quotes:
+        return None
+        
+    # 整理圖表資料
+    series = []
+    close_prices = quotes.get('close', [])
+    
+    for i, timestamp in enumerate(timestamps):
+        if i < len(close_prices):
+            close_price = close_prices[i]
+            # 確保價格有效（不是None、NaN或0）
+            if close_price is not None and str(close_price).lower() != 'nan' and close_price > 0:
+                try:
+                    dt = datetime.fromtimestamp(timestamp)
+                    series.append({
+                        'time': dt.strftime('%Y-%m-%d %H:%M'),
+                        'price': round(float(close_price), 2),
+                        'timestamp': timestamp,
+                    })
+                except (ValueError, OSError) as e:
+                    # 時間戳轉換失敗，跳過這筆資料
+                    print(f"時間戳轉換錯誤: {timestamp}, {e}")
+                    continue
+    
+    # 按時間排序
+    series.sort(key=lambda x: x['timestamp'])
+    return series
+
+
+def _slice_chart_series(stock_code, yahoo_symbol, days, series):
+    """從完整序列切出最近 N 天的圖表資料"""
+    start_timestamp = (datetime.now() - timedelta(days=days)).timestamp()
+    return {
+        'success': True,
+        'data': [point for point in series if point['timestamp'] >= start_timestamp],
+        'stock_code': stock_code,
+        'symbol': yahoo_symbol,
+        'period': f"{days}天"
+    }
+
+
+def chart_series_key(stock_code, days):
+    """圖表序列的快取 key：同一 (代碼, range, interval) 的各種天數共用一份序列"""
+    params = _chart_params(days)
+    return f"{_yahoo_symbol(stock_code)}_{params['range']}_{params['interval']}"
+
+
+def get_cached_chart(stock_code, days):
+    """由快取的完整序列切出圖表資料（只讀快取），未命中時回傳 None"""
+    series = chart_cache.get(chart_series_key(stock_code, days))
+    if series is None:
+        return None
+    return _slice_chart_series(stock_code, _yahoo_symbol(stock_code), days, series)
+
+
+def store_chart_series(stock_code, days, data):
+    """
+    解析 Yahoo Finance chart 回應並快取完整序列
+    :return: 完整序列，無資料時回傳 None（空序列不寫入快取）
+    """
+    series = _parse_chart_series(data)
+    if series:
+        chart_cache.set(chart_series_key(stock_code, days), series)
+    return series
+
+
+# 補齊日線歷史時依缺口天數選擇的 Yahoo Finance 期間
+HISTORY_GAP_RANGES = [(5, '5d'), (28, '1mo'), (90, '3mo'), (180, '6mo'), (365, '1y'), (730, '2y')]
+
+_history_checked = {}  # {股票代碼: 最近一次向上游補齊日線的 monotonic 時間}
+
+
+def _bar_day(timestamp):
+    return datetime.fromtimestamp(timestamp, TAIPEI_TZ).date()
+
+
+def history_is_current(stock_code):
+    """日線歷史是否已包含最近一個已定稿的交易日"""
+    store = get_history_store()
+    last = store.last_date(stock_code) if store else None
+    return last is not None and _bar_day(last) >= last_settled_day()
+
+
+def sync_price_history(stock_code):
+    """
+    將日線歷史補齊到最近一個已定稿的交易日：沒有歷史時整段回補，否則只取缺口期間並附加
+    （盤中尚未定稿的當日日線不寫入；同一股票在 history_check_interval 內只向上游檢查一次）
+    :return: 歷史是否已補齊
+    """
+    store = get_history_store()
+    if store is None:
+        return False
+    if history_is_current(stock_code):
+        return True
+    checked_at = _history_checked.get(stock_code)
+    if checked_at is not None and time.monotonic() - checked_at < CONFIG['history_check_interval']:
+        return False
+    _history_checked[stock_code] = time.monotonic()
+
+    last = store.last_date(stock_code)
+    settled = last_settled_day()
+    if last is None:
+        history_range = PRICE_HISTORY_CONFIG['backfill_range']
+    else:
+        gap = (settled - _bar_day(last)).days
+        history_range = next((name for limit, name in HISTORY_GAP_RANGES if gap <= limit),
+                             PRICE_HISTORY_CONFIG['backfill_range'])
+
+    url = f"https://query1.finance.yahoo.com/v8/finance/chart/{_yahoo_symbol(stock_code)}"
+    try:
+        resp = http_get(url, params={'range': history_range, 'interval': '1d'},
+                        timeout=CONFIG['timeout'], headers=HEADERS)
+        resp.raise_for_status()
+        bars = bars_from_yahoo(resp.json())
+    except Exception as e:
+        print(f"❌ 日線歷史更新失敗 {stock_code}: {e}")
+        return False
+    if bars is None:
+        return False
+
+    settled_mask = [_bar_day(timestamp) <= settled for timestamp in bars['date']]
+    bars = {column: values[settled_mask] for column, values in bars.items()}
+    if last is None:
+        count = store.backfill(stock_code, bars)
+        print(f"📚 回補 {stock_code} 日線歷史 {count} 筆（{history_range}）")
+    else:
+        count = store.append(stock_code, bars)
+        if count:
+            print(f"📚 附加 {stock_code} 日線 {count} 筆")
+    return history_is_current(stock_code)
+
+
+def _live_bar_point(stock_code):
+    """盤中當日尚未定稿的日線：以報價快取的即時股價表示（只讀快取，不發出上游請求）"""
+    if not is_market_open():
+        return None
+    quote = quote_cache.get(stock_code)
+    try:
+        price = float(str((quote or {}).get('即時股價', '')).replace(',', ''))
+    except ValueError:
+        return None
+    if price <= 0:
+        return None
+    opened_at = datetime.combine(now_taipei().date(), CALENDAR_CONFIG['open_time'], tzinfo=TAIPEI_TZ)
+    timestamp = int(opened_at.timestamp())
+    return {
+        'time': datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M'),
+        'price': round(price, 2),
+        'timestamp': timestamp,
+    }
+
+
+def chart_from_history(stock_code, days, sync=True):
+    """
+    由本地日線歷史產生日線圖表資料（格式同 get_stock_chart_data）
+    :param sync: 歷史未補齊時是否先向上游補齊（False 時未補齊直接回傳 None）
+    :return: 圖表資料，無法使用歷史（非日線間隔、未安裝 NumPy、歷史不足）時回傳 None
+    """
+    store = get_history_store()
+    if store is None or _chart_params(days)['interval'] != '1d':
+        return None
+    if not (sync_price_history(stock_code) if sync else history_is_current(stock_code)):
+        return None
+
+    bars = store.read(stock_code, start=int((datetime.now() - timedelta(days=days)).timestamp()))
+    chart_data = [{
+        'time': datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M'),
+        'price': round(float(close), 2),
+        'timestamp': int(timestamp),
+    } for timestamp, close in zip(bars['date'].tolist(), bars['close'].tolist())]
+    live_point = _live_bar_point(stock_code)
+    if live_point and (not chart_data or live_point['timestamp'] > chart_data[-1]['timestamp']):
+        chart_data.append(live_point)
+    if not chart_data:
+        return None
+
+    return {
+        'success': True,
+        'data': chart_data,
+        'stock_code': stock_code,
+        'symbol': _yahoo_symbol(stock_code),
+        'period': f"{days}天"
+    }
+
+
+def get_stock_chart_data(stock_code, days=7):
+    """
+    獲取股票圖表資料（最近N天）- 同一股票與天數的並行請求合併為一次
+    日線間隔優先讀取本地日線歷史，無法使用時才向 Yahoo Finance 取得
+    """
+    return _flight.do(f"chart_{stock_code}_{days}",
+                      lambda: chart_from_history(stock_code, days) or _fetch_stock_chart_data(stock_code, days))
+
+
+def _fetch_stock_chart_data(stock_code, days):
+    """讀取快取的圖表序列並切出最近 N 天，未命中時向 Yahoo Finance 取得（同一序列的各種天數共用一次請求）"""
+    key = chart_series_key(stock_code, days)
+    series = chart_cache.get(key)
+    if series is None:
+        try:
+            series = _flight.do(f"chart_series_{key}", lambda: _fetch_chart_series(stock_code, days))
+        except Exception as e:
+            print(f"圖表資料獲取錯誤: {e}")
+            return {
+                'success': False,
+                'error': str(e),
+                'data': []
+            }
+    if series is None:
+        return None
+    return _slice_chart_series(stock_code, _yahoo_symbol(stock_code), days, series)
+
+
+def _fetch_chart_series(stock_code, days):
+    """從 Yahoo Finance 獲取完整圖表序列並寫入快取"""
+    yahoo_symbol = _yahoo_symbol(stock_code)
+    
+    # 使用預設期間而不是時間戳，避免時間問題
+    url = f"https://query1.finance.yahoo.com/v8/finance/chart/{yahoo_symbol}"
+    
+    resp = http_get(url, params=_chart_params(days), timeout=CONFIG['timeout'], headers=HEADERS)
+    resp.raise_for_status()
+    
+    return store_chart_series(stock_code, days, resp.json())
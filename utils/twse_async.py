@@ -0,0 +1,331 @@
+"""
+非同步資料來源引擎（aiohttp）
+提供 utils.twse 各資料來源的 async 版本，以有限併發同時解析多檔股票，
+讓多檔查詢在等待 I/O 時不再逐一排隊。解析邏輯與 utils.twse 共用。
+"""
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from utils.http_client import HTTP_CONFIG
+from utils.rate_limit import host_limiter
+from utils.source_health import order_sources_async
+from utils.cache import quotes as quote_cache, market as market_cache
+from utils.twse import (
+    CONFIG, HEADERS, MIS_HEADERS, MIS_URL,
+    has_valid_price, get_stock_basic_info, get_stock_chart_data, get_stock_name,
+    chart_from_history, get_cached_chart, store_chart_series,
+    is_known_missing, missing_stock_result, record_missing_stock,
+    _yahoo_symbol, _mis_channel, _parse_yahoo_quote, _needs_yahoo_quote_fallback, _apply_yahoo_quote_fallback,
+    _twse_stock_day_urls, _parse_twse_stock_day, _parse_alternative_quote,
+    _parse_twse_realtime_item, _parse_market_twse, _parse_market_yahoo,
+    _chart_params, _slice_chart_series,
+)
+
+# 非同步引擎設定
+ASYNC_CONFIG = {
+    'concurrency': 8,  # 同時進行中的股票數量上限
+}
+
+
+def is_available():
+    """是否已安裝 aiohttp"""
+    return aiohttp is not None
+
+
+def create_session(concurrency=None):
+    """建立 aiohttp Session（連線數與超時沿用 http_client 設定）"""
+    connector = aiohttp.TCPConnector(
+        limit=max(concurrency or ASYNC_CONFIG['concurrency'], HTTP_CONFIG['pool_maxsize']),
+        limit_per_host=HTTP_CONFIG['pool_maxsize'],
+    )
+    return aiohttp.ClientSession(connector=connector)
+
+
+def _client_timeout(timeout):
+    """將秒數轉換為 aiohttp 的 (連線, 讀取) 超時設定"""
+    return aiohttp.ClientTimeout(
+        total=None,
+        sock_connect=min(HTTP_CONFIG['connect_timeout'], timeout),
+        sock_read=timeout,
+    )
+
+
+async def _fetch_json(session, url, params=None, headers=None, timeout=None, missing_status=()):
+    """
+    GET 並解析 JSON（忽略 Content-Type，證交所常回傳 text/html），與同步請求共用主機的速率限制
+    連線錯誤、逾時與上游錯誤回應（aiohttp.ClientError、asyncio.TimeoutError）直接拋出，由呼叫端記為失敗；
+    :param missing_status: 表示「查無資料」的 HTTP 狀態碼（例如 Yahoo 對不存在代碼回應 404），回傳 None
+    :return: 解析後的 JSON，回應不是有效 JSON 時回傳 None
+    """
+    limiter = host_limiter(urlsplit(url).netloc)
+    while not limiter.try_acquire():
+        await asyncio.sleep(limiter.wait_time())
+    async with session.get(url, params=params, headers=headers or HEADERS,
+                           timeout=_client_timeout(timeout or CONFIG['timeout'])) as resp:
+        if resp.status in missing_status:
+            return None
+        resp.raise_for_status()
+        try:
+            return await resp.json(content_type=None)
+        except ValueError as e:
+            print(f"⚠️ 回應不是有效的 JSON: {url}: {e}")
+            return None
+
+
+# === 各資料來源的 async 版本（查無資料回傳 None，連線錯誤與上游錯誤回應拋出例外，與 utils.twse 相同） ===
+
+async def get_stock_from_twse_realtime_async(session, stock_code):
+    """從證交所即時報價獲取資料（async）"""
+    try:
+        data = await _fetch_json(session, f"{MIS_URL}?ex_ch={_mis_channel(stock_code)}", headers=MIS_HEADERS)
+    except Exception as e:
+        print(f"證交所即時報價獲取失敗: {e}")
+        raise
+    if not (data and data.get('msgArray')):
+        print(f"❌ 證交所即時報價無資料: {stock_code}")
+        return None
+    try:
+        return _parse_twse_realtime_item(stock_code, data['msgArray'][0], get_stock_name(stock_code))
+    except (ValueError, TypeError) as e:
+        print(f"⚠️ 證交所即時報價資料格式錯誤 {stock_code}: {e}")
+        return None
+
+
+async def get_stock_from_yahoo_async(session, stock_code):
+    """從 Yahoo Finance 獲取股票資料（async）"""
+    yahoo_symbol = _yahoo_symbol(stock_code)
+    try:
+        data = await _fetch_json(session, f"https://query1.finance.yahoo.com/v8/finance/chart/{yahoo_symbol}",
+                                 missing_status=(404,))
+    except Exception as e:
+        print(f"Yahoo Finance 獲取失敗: {e}")
+        raise
+    if not (data and data.get('chart') and data['chart'].get('result')):
+        print(f"❌ Yahoo Finance 查無資料: {stock_code}")
+        return None
+
+    stock_info = _parse_yahoo_quote(stock_code, data, get_stock_name(stock_code))
+
+    if _needs_yahoo_quote_fallback(stock_info):
+        try:
+            quote_url = f"https://query1.finance.yahoo.com/v7/finance/quote?symbols={yahoo_symbol}"
+            _apply_yahoo_quote_fallback(stock_info, await _fetch_json(session, quote_url, timeout=5) or {})
+        except Exception as e:
+            print(f"⚠️ 獲取 Quote 資料失敗: {e}")
+
+    return stock_info
+
+
+async def get_stock_from_twse_api_async(session, stock_code):
+    """從證交所 API 獲取股票資料（async）- 有任一路徑正常回應即不拋出例外"""
+    last_error = None
+    answered = False
+    for url in _twse_stock_day_urls(stock_code):
+        try:
+            data = await _fetch_json(session, url)
+        except Exception as e:
+            print(f"證交所 API 嘗試失敗: {e}")
+            last_error = e
+            continue
+        answered = True
+        if data and data.get('stat') == 'OK' and data.get('data'):
+            return _parse_twse_stock_day(stock_code, data, get_stock_name(stock_code))
+    if last_error is not None and not answered:
+        raise last_error
+    return None
+
+
+async def get_stock_from_alternative_api_async(session, stock_code):
+    """從其他金融 API 獲取資料（async）"""
+    try:
+        url = f"https://api.fugle.tw/realtime/v0.3/intraday/quote?symbolId={stock_code}"
+        data = await _fetch_json(session, url, missing_status=(404,))
+    except Exception as e:
+        print(f"替代 API 獲取失敗: {e}")
+        raise
+    if data and data.get('data'):
+        return _parse_alternative_quote(stock_code, data, get_stock_name(stock_code))
+    return None
+
+
+async def get_market_from_twse_async(session):
+    """從證交所獲取大盤即時資訊（async）"""
+    try:
+        data = await _fetch_json(session, f"{MIS_URL}?ex_ch=tse_t00.tw", headers=MIS_HEADERS)
+    except Exception as e:
+        print(f"證交所大盤獲取失敗: {e}")
+        raise
+    return _parse_market_twse(data) if data else None
+
+
+async def get_market_from_yahoo_async(session, url):
+    """從 Yahoo Finance 獲取大盤資料（async）"""
+    try:
+        data = await _fetch_json(session, url)
+    except Exception as e:
+        print(f"Yahoo Finance 錯誤: {e}")
+        raise
+    return _parse_market_yahoo(data) if data else None
+
+
+async def get_stock_chart_data_async(session, stock_code, days=7):
+    """獲取股票圖表資料（async）- 日線間隔優先讀取本地日線歷史（補齊歷史的同步請求在執行緒池執行）"""
+    try:
+        if _chart_params(days)['interval'] == '1d':
+            chart_data = await asyncio.get_running_loop().run_in_executor(None, chart_from_history, stock_code, days)
+            if chart_data:
+                return chart_data
+        cached_chart = get_cached_chart(stock_code, days)
+        if cached_chart is not None:
+            return cached_chart
+        yahoo_symbol = _yahoo_symbol(stock_code)
+        url = f"https://query1.finance.yahoo.com/v8/finance/chart/{yahoo_symbol}"
+        data = await _fetch_json(session, url, params=_chart_params(days))
+        series = store_chart_series(stock_code, days, data)
+        if series is None:
+            return None
+        return _slice_chart_series(stock_code, yahoo_symbol, days, series)
+    except Exception as e:
+        print(f"圖表資料獲取錯誤: {e}")
+        return {
+            'success': False,
+            'error': str(e),
+            'data': []
+        }
+
+
+# === 多重資料來源解析 ===
+
+async def get_stock_basic_info_async(session, stock_code):
+    """獲取個股基本資訊（async）- 多重資料來源依健康度排序後依序嘗試，結果寫入快取"""
+    clean_code = re.sub(r'[^\w]', '', stock_code.strip())
+    if is_known_missing(clean_code):
+        return missing_stock_result(clean_code)
+    cached_data = quote_cache.get(clean_code)
+    if cached_data:
+        return cached_data
+
+    data_sources = [
+        ("證交所即時報價", lambda: get_stock_from_twse_realtime_async(session, clean_code)),
+        ("Yahoo Finance", lambda: get_stock_from_yahoo_async(session, clean_code)),
+        ("證交所 API", lambda: get_stock_from_twse_api_async(session, clean_code)),
+        ("替代 API", lambda: get_stock_from_alternative_api_async(session, clean_code)),
+    ]
+    # 與同步路徑共用健康度排序與斷路器（跳過斷路中的來源，並記錄成功與失敗）
+    data_sources = order_sources_async(data_sources, has_valid_price)
+    outcomes = {source_name: None for source_name, _ in data_sources}
+
+    for source_name, fetch in data_sources:
+        try:
+            stock_data = await fetch()
+            outcomes[source_name] = 'ok' if has_valid_price(stock_data) else 'empty'
+            if has_valid_price(stock_data):
+                stock_data['來源'] = source_name
+                quote_cache.set(clean_code, stock_data)
+                print(f"✅ 成功從 {source_name} 獲取資料並快取: {clean_code}")
+                return stock_data
+        except Exception as e:
+            outcomes[source_name] = 'error'
+            print(f"❌ {source_name} 發生異常: {e}")
+
+    return record_missing_stock(clean_code, outcomes)
+
+
+async def get_market_summary_async(session):
+    """獲取大盤摘要資訊（async）- 所有資料來源都失敗時回傳 None"""
+    cached_data = market_cache.get('summary')
+    if cached_data:
+        return cached_data
+
+    data_sources = [
+        ("證交所即時資料", lambda: get_market_from_twse_async(session)),
+        ("Yahoo Finance TWII", lambda: get_market_from_yahoo_async(session, "https://query1.finance.yahoo.com/v8/finance/chart/%5ETWII")),
+        ("Yahoo Finance TSE", lambda: get_market_from_yahoo_async(session, "https://query1.finance.yahoo.com/v8/finance/chart/^TWSE")),
+        ("Yahoo Finance Alternative", lambda: get_market_from_yahoo_async(session, "https://query1.finance.yahoo.com/v7/finance/quote?symbols=%5ETWII")),
+    ]
+    data_sources = order_sources_async(data_sources, lambda info: bool(info) and not info.get('錯誤'))
+
+    for source_name, fetch in data_sources:
+        try:
+            market_info = await fetch()
+        except Exception as e:
+            print(f"❌ {source_name} 獲取失敗: {e}")
+            continue
+        if market_info and not market_info.get('錯誤'):
+            market_cache.set('summary', market_info)
+            print(f"✅ 成功從 {source_name} 獲取大盤資料")
+            return market_info
+
+    return None
+
+
+async def _gather_bounded(stock_codes, worker, concurrency):
+    """以 Semaphore 限制併發數，對每檔股票執行 worker(session, code)"""
+    concurrency = max(1, concurrency or ASYNC_CONFIG['concurrency'])
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with create_session(concurrency) as session:
+        async def run(code):
+            async with semaphore:
+                try:
+                    return code, await worker(session, code)
+                except Exception as e:
+                    print(f"❌ 非同步處理 {code} 失敗: {e}")
+                    return code, None
+
+        pairs = await asyncio.gather(*(run(code) for code in stock_codes))
+    return dict(pairs)
+
+
+async def resolve_stocks_async(stock_codes, concurrency=None):
+    """
+    非同步入口：以有限併發同時解析多檔股票的基本資訊
+    :return: dict {股票代碼: 股票資訊}
+    """
+    codes = list(dict.fromkeys(stock_codes))
+    return await _gather_bounded(codes, get_stock_basic_info_async, concurrency)
+
+
+async def resolve_charts_async(stock_codes, days=7, concurrency=None):
+    """
+    非同步入口：以有限併發同時獲取多檔股票的圖表資料
+    :return: dict {股票代碼: 圖表資料}
+    """
+    codes = list(dict.fromkeys(stock_codes))
+    return await _gather_bounded(
+        codes, lambda session, code: get_stock_chart_data_async(session, code, days), concurrency)
+
+
+def run_sync(coro_factory):
+    """
+    在同步程式（例如 Flask view）中執行協程
+    若目前執行緒已有事件迴圈在執行，改在獨立執行緒中執行以免衝突
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro_factory())
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(lambda: asyncio.run(coro_factory())).result()
+
+
+def resolve_stocks(stock_codes, concurrency=None):
+    """同步包裝：同時解析多檔股票基本資訊；未安裝 aiohttp 時退回逐檔查詢"""
+    if not is_available():
+        return {code: get_stock_basic_info(code) for code in dict.fromkeys(stock_codes)}
+    return run_sync(lambda: resolve_stocks_async(stock_codes, concurrency))
+
+
+def resolve_charts(stock_codes, days=7, concurrency=None):
+    """同步包裝：同時獲取多檔股票圖表資料；未安裝 aiohttp 時退回逐檔查詢"""
+    if not is_available():
+        return {code: get_stock_chart_data(code, days) for code in dict.fromkeys(stock_codes)}
+    return run_sync(lambda: resolve_charts_async(stock_codes, days, concurrency))
@@ -0,0 +1,74 @@
+"""
+啟動時的快取暖機
+服務開始接受請求前，同時預先取得大盤摘要、熱門與預設股票、自選股最多人關注的股票報價以及新聞，
+讓第一批訪客不必承擔冷快取的上游請求。整體受時間預算限制，逾時的工作留在背景繼續完成。
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from utils.twse import get_market_summary, get_stock_basic_info_many
+from utils.news import get_yahoo_stock_top_news
+from utils.cache import quotes as quote_cache, market as market_cache, news as news_cache
+
+# 暖機設定
+WARMUP_CONFIG = {
+    'budget': 20,          # 時間預算（秒）
+    'chunk_size': 50,      # 每個報價工作處理的股票數（對應證交所即時報價單次批次上限）
+    'max_workers': 6,
+    'news_limit': 3,       # 與首頁顯示的新聞數量一致
+}
+
+
+def _chunks(codes, size):
+    for i in range(0, len(codes), size):
+        yield codes[i:i + size]
+
+
+def cache_warmth(stock_codes):
+    """
+    目前快取的暖度（不發出任何上游請求）
+    :return: {'quotes': 已快取檔數, 'quotes_total': 總檔數, 'market': bool, 'news': bool}
+    """
+    return {
+        'quotes': len(quote_cache.get_many(stock_codes)),
+        'quotes_total': len(stock_codes),
+        'market': bool(market_cache.get_entry('summary')[0]),
+        'news': bool(news_cache.get_entry('yahoo_top')[0]),
+    }
+
+
+def warm_up_cache(stock_codes, budget=None):
+    """
+    同時預先取得大盤、新聞與指定股票的報價
+    :param stock_codes: 要預先取得報價的股票代碼（依優先順序，重複者自動去除）
+    :param budget: 時間預算（秒），預設 WARMUP_CONFIG['budget']
+    :return: 暖機報告 dict（暖度、耗時、是否逾時）
+    """
+    budget = WARMUP_CONFIG['budget'] if budget is None else budget
+    stock_codes = list(dict.fromkeys(code for code in stock_codes if code))
+    started = time.monotonic()
+    print(f"🔥 快取暖機中（{len(stock_codes)} 檔股票、大盤、新聞，預算 {budget}s）...")
+
+    executor = ThreadPoolExecutor(max_workers=WARMUP_CONFIG['max_workers'], thread_name_prefix='warmup')
+    tasks = {
+        executor.submit(get_market_summary): '大盤摘要',
+        executor.submit(get_yahoo_stock_top_news, WARMUP_CONFIG['news_limit']): '新聞',
+    }
+    for chunk in _chunks(stock_codes, WARMUP_CONFIG['chunk_size']):
+        tasks[executor.submit(get_stock_basic_info_many, chunk)] = f"報價 {len(chunk)} 檔"
+
+    done, pending = wait(list(tasks), timeout=budget)
+    # 逾時的工作不取消，留在背景完成後仍會寫入快取
+    executor.shutdown(wait=False)
+
+    for future in done:
+        if future.exception() is not None:
+            print(f"❌ 暖機工作失敗 {tasks[future]}: {future.exception()}")
+    if pending:
+        print(f"⏰ 暖機超過時間預算，{len(pending)} 項工作在背景繼續: {', '.join(tasks[f] for f in pending)}")
+
+    warmth = cache_warmth(stock_codes)
+    elapsed = time.monotonic() - started
+    print(f"🔥 快取暖機完成（{elapsed:.1f}s）：報價 {warmth['quotes']}/{warmth['quotes_total']}、"
+          f"大盤 {'✅' if warmth['market'] else '❌'}、新聞 {'✅' if warmth['news'] else '❌'}")
+    return dict(warmth, elapsed=round(elapsed, 2), timed_out=bool(pending))